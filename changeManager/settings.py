@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "requestLogger.middleware.QueryMetricsMiddleware",  # outermost, so wall time covers the whole stack
+    "requestLogger.middleware.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -75,12 +77,100 @@ WSGI_APPLICATION = "changeManager.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# SQLite by default. DATABASE_ENGINE=postgresql selects PostgreSQL (needs psycopg2), set up
+# from the POSTGRES_* variables; with PGBOUNCER=1 connections go through a PgBouncer pool
+# in transaction mode, so point POSTGRES_PORT at the pooler.
+
+if os.environ.get('DATABASE_ENGINE') == 'postgresql':
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get('POSTGRES_DB', 'changemanager'),
+            "USER": os.environ.get('POSTGRES_USER', 'changemanager'),
+            "PASSWORD": os.environ.get('POSTGRES_PASSWORD', ''),
+            "HOST": os.environ.get('POSTGRES_HOST', 'localhost'),
+            "PORT": os.environ.get('POSTGRES_PORT', '5432'),
+            # Seconds to keep a connection open between requests instead of reconnecting each time
+            "CONN_MAX_AGE": int(os.environ.get('CONN_MAX_AGE', 60)),
+            # Ping reused connections at the start of each request (requestLogger.db)
+            "CONN_HEALTH_CHECKS": True,
+            # Transaction pooling can't keep a server-side cursor open across transactions
+            "DISABLE_SERVER_SIDE_CURSORS": os.environ.get('PGBOUNCER') == '1',
+            "OPTIONS": {
+                "connect_timeout": 5,
+                "application_name": "changeManager",
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        }
+    }
+
+# Read replicas (requestLogger.routers) for the list, dashboard and report pages; writes and
+# everything else use "default". POSTGRES_REPLICA_HOSTS=host[,host] adds streaming replicas
+# of the PostgreSQL primary (same database, user and port). For SQLite, SQLITE_REPLICAS=
+# path[,path] adds copies of db.sqlite3, refreshed with `manage.py sync_sqlite_replicas`.
+# Tests run them as mirrors of the test database.
+
+if os.environ.get('DATABASE_ENGINE') == 'postgresql':
+    _replicas = [{**DATABASES['default'], 'HOST': host.strip()}
+                 for host in os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',') if host.strip()]
+else:
+    _replicas = [{'ENGINE': 'django.db.backends.sqlite3', 'NAME': path.strip()}
+                 for path in os.environ.get('SQLITE_REPLICAS', '').split(',') if path.strip()]
+for _number, _replica in enumerate(_replicas, 1):
+    DATABASES[f'replica{_number}'] = {**_replica, 'TEST': {'MIRROR': 'default'}}
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['requestLogger.routers.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they write; keep it above the replicas' lag
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Run on every new SQLite connection (requestLogger.db). WAL lets readers carry on while a
+# worker writes and commits without rewriting the database file; writers queue behind
+# busy_timeout instead of failing with "database is locked". SQLITE_TUNING=0 turns it off.
+if os.environ.get('SQLITE_TUNING', '1') == '1':
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',  # durable at checkpoints; safe from corruption in WAL mode
+        'busy_timeout': 20000,  # ms
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'memory',
+    }
+else:
+    SQLITE_PRAGMAS = {}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory by default; set CACHE_DIR to share one file-based cache between worker processes
+
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ['CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Seconds a rendered template fragment is kept. Fragment keys are built from the columns the
+# fragment shows (last_updated, comment_count, last_activity_at, the requester's username...),
+# so a change gets a new key at once; the one thing left out is a comment author's username,
+# so a renamed user's old name can show in a comment thread for up to this long
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 600))
+
+# Comments per page of the thread on the request page; older pages load on demand
+COMMENT_PAGE_SIZE = int(os.environ.get('COMMENT_PAGE_SIZE', 20))
 
 
 # Password validation
@@ -129,3 +219,52 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = "requestLogger.User"
 
 LOGIN_REDIRECT_URL = 'home'
+
+# Per-view timing samples (see requestLogger.metrics): samples kept per view by each worker,
+# and how often each worker publishes its samples to the shared cache, in seconds
+METRICS_WINDOW = 1000
+METRICS_FLUSH_INTERVAL = 10
+
+# Default number of rows per page on the cursor-paginated list views (?page_size= overrides, up to 200)
+LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE', 50))
+
+# List pages and admin changelists show descriptions cut to this many characters in the
+# database (requestLogger.fields.text_preview); the full text is only loaded on detail pages
+LIST_PREVIEW_CHARS = int(os.environ.get('LIST_PREVIEW_CHARS', 120))
+
+# The recently active list shows requests submitted or commented on within this many days
+RECENT_ACTIVITY_DAYS = int(os.environ.get('RECENT_ACTIVITY_DAYS', 7))
+
+# Requests resolved within this many hours of submission count as meeting the SLA on the
+# analytics page. Rollups store the count, so run rollup_request_stats after changing it.
+REQUEST_SLA_HOURS = int(os.environ.get('REQUEST_SLA_HOURS', 72))
+
+# Request descriptions and comments of at least this many characters are stored zlib-compressed
+# (requestLogger.fields). Only on SQLite, whose FTS5 index searches the plain text; other
+# backends search with LIKE over the columns, so they keep all text plain
+COMPRESSED_TEXT_THRESHOLD = int(os.environ.get('COMPRESSED_TEXT_THRESHOLD', 2048))
+
+# Requests closed more than this many days ago are moved to the archive tables by
+# `manage.py archive_requests` (requestLogger.archive); `manage.py restore_requests` brings them back
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+
+# Background tasks (requestLogger.tasks), run by `manage.py run_tasks`. TASKS_ALWAYS_EAGER=1
+# runs them inline instead, for setups without a worker. A task still marked running after
+# TASK_LOCK_TIMEOUT seconds is assumed lost with its worker and requeued; finished tasks are
+# deleted after TASK_RETENTION_DAYS (dead ones are kept until requeued or deleted in the admin).
+TASKS_ALWAYS_EAGER = os.environ.get('TASKS_ALWAYS_EAGER', '0') == '1'
+TASK_LOCK_TIMEOUT = 300
+TASK_RETENTION_DAYS = 7
+
+# Email. Activity notifications are collected and sent as one digest per address at most
+# every NOTIFICATION_DIGEST_INTERVAL seconds (see requestLogger.notifications); links in
+# them point at SITE_URL.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '0') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'requests@localhost')
+NOTIFICATION_DIGEST_INTERVAL = int(os.environ.get('NOTIFICATION_DIGEST_INTERVAL', 900))
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
@@ -1,5 +1,42 @@
-from django.contrib import admin
-from .models import Company, User, Project, Request
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.utils.text import Truncator
+
+from . import archive, bulk
+from .fields import text_preview
+from .models import ArchivedRequest, Company, User, Project, Request, Notification, Task
+from .tasks import requeue
+
+
+class ListColumnsChangeList(ChangeList):
+    def get_results(self, request):
+        # Only the page of rows shown; actions still get whole rows from get_queryset()
+        self.queryset = self.model_admin.get_list_queryset(self.queryset)
+        super().get_results(request)
+
+
+class ListColumnsMixin:
+    """
+    Changelist rows load only ``list_columns`` (plus the primary key), so long text the list
+    doesn't show stays in the database; change pages and actions still load whole rows.
+    Related objects in list_display are joined by the changelist as usual, and only their
+    columns named here are selected.
+    """
+    list_columns = ()
+
+    def get_changelist(self, request, **kwargs):
+        return ListColumnsChangeList
+
+    def get_list_queryset(self, queryset):
+        return queryset.only(*self.list_columns) if self.list_columns else queryset
+
+
+REQUEST_LIST_COLUMNS = ('subject', 'request_type', 'status', 'date_submitted', 'project', 'project__name',
+                        'requester', 'requester__username')
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
@@ -12,13 +49,92 @@ class UserAdmin(admin.ModelAdmin):
     search_fields = ('username', 'email', 'phone_number')
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description', 'owner', 'version', 'status')
+class ProjectAdmin(ListColumnsMixin, admin.ModelAdmin):
+    list_display = ('name', 'description_preview', 'owner', 'version', 'status')
     list_filter = ('status',)
     search_fields = ('name', 'owner__username', 'version')
+    list_columns = ('name', 'owner', 'owner__username', 'version', 'status')
+
+    def get_list_queryset(self, queryset):
+        return super().get_list_queryset(queryset).annotate(description_preview=text_preview(Project, 'description'))
+
+    @admin.display(description='Description')
+    def description_preview(self, obj):
+        return Truncator(obj.description_preview).chars(settings.LIST_PREVIEW_CHARS)
+
+def status_action(status):
+    def action(modeladmin, request, queryset):
+        updated = bulk.change_status(queryset, status)
+        modeladmin.message_user(request, f'Moved {updated} requests to {status.label}.')
+    action.__name__ = f'mark_{status.value.lower().replace(" ", "_")}'
+    action.short_description = f'Mark selected requests as {status.label}'
+    return action
+
+
+class RequestActionForm(ActionForm):
+    project = forms.ModelChoiceField(queryset=Project.objects.all(), required=False, widget=forms.NumberInput,
+                                     label='Project id')
+
 
 @admin.register(Request)
-class RequestAdmin(admin.ModelAdmin):
-    list_display = ('subject', 'request_type', 'project', 'requester', 'status', 'date_submitted')
+class RequestAdmin(ListColumnsMixin, admin.ModelAdmin):
+    list_display = ('subject', 'request_type', 'project', 'requester', 'status', 'date_submitted', 'comment_count', 'last_activity_at')
     list_filter = ('request_type', 'project', 'status')
     search_fields = ('subject', 'project__name', 'requester__username')
+    list_columns = REQUEST_LIST_COLUMNS + ('comment_count', 'last_activity_at')
+    # One UPDATE per action, with status history and counters kept in step (see bulk.py)
+    actions = [status_action(status) for status in Request.Status] + ['move_to_project']
+    action_form = RequestActionForm
+
+    @admin.action(description='Move selected requests to the project id given')
+    def move_to_project(self, request, queryset):
+        try:
+            project = RequestActionForm.base_fields['project'].clean(request.POST.get('project'))
+            if project is None:
+                raise ValidationError('Enter the id of the project to move the requests to.')
+            moved = bulk.move_to_project(queryset, project)
+        except ValidationError as e:
+            self.message_user(request, ' '.join(e.messages), messages.ERROR)
+            return
+        self.message_user(request, f'Moved {moved} requests to {project}.')
+
+@admin.register(ArchivedRequest)
+class ArchivedRequestAdmin(ListColumnsMixin, admin.ModelAdmin):
+    list_display = ('subject', 'request_type', 'project', 'requester', 'status', 'date_completed', 'archived_at')
+    list_filter = ('request_type', 'status')
+    search_fields = ('subject', 'project__name', 'requester__username')
+    list_columns = REQUEST_LIST_COLUMNS + ('date_completed', 'archived_at')
+    actions = ['restore']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Restore selected requests')
+    def restore(self, request, queryset):
+        restored, _ = archive.restore_requests(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f'Restored {restored} requests.')
+
+@admin.register(Task)
+class TaskAdmin(ListColumnsMixin, admin.ModelAdmin):
+    list_display = ('name', 'key', 'status', 'attempts', 'run_after', 'locked_by', 'created_at')
+    list_columns = list_display
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('created_at', 'finished_at', 'last_error')
+    actions = ['requeue_tasks']
+
+    @admin.action(description='Requeue selected tasks')
+    def requeue_tasks(self, request, queryset):
+        self.message_user(request, f'Requeued {requeue(queryset)} tasks.')
+
+@admin.register(Notification)
+class NotificationAdmin(ListColumnsMixin, admin.ModelAdmin):
+    list_display = ('email', 'kind', 'message', 'request', 'created_at', 'sent_at')
+    list_columns = ('email', 'kind', 'message', 'created_at', 'sent_at', 'request', 'request__request_type',
+                    'request__project', 'request__project__name', 'request__requester', 'request__requester__username')
+    list_filter = ('kind', ('sent_at', admin.EmptyFieldListFilter))
+    search_fields = ('email', 'message')
+    raw_id_fields = ('request',)
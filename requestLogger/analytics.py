@@ -0,0 +1,213 @@
+"""
+Request lifecycle analytics: status events and daily rollups.
+
+Every change of Request.status is logged as a RequestStatusEvent. The daily rollups per
+project and per company are recomputed from a single day's events by a background task,
+so keeping them current costs one small indexed query per change, off the request path.
+Reports read one rollup row per day and project or company, whatever the size of the
+history behind them.
+"""
+import bisect
+import datetime
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import percentile
+from .models import Company, CompanyDailyRollup, Project, ProjectDailyRollup, Request, RequestStatusEvent
+from .tasks import enqueue, task
+
+# Upper bounds in seconds of the resolution time histogram buckets: 1h, 2h, 4h ... 4096h
+# (about 170 days), then one open-ended bucket
+HISTOGRAM_BOUNDS = [3600 * 2 ** i for i in range(13)]
+
+# Rollup model -> the event field it is keyed on
+SCOPES = {ProjectDailyRollup: 'project', CompanyDailyRollup: 'company'}
+
+EVENT_FIELDS = ('from_status', 'to_status', 'resolution_seconds')
+
+
+def day_of(moment):
+    return timezone.localtime(moment).date()
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def status_event(request, from_status, to_status, changed_at):
+    """An unsaved event for ``request`` moving from ``from_status`` (blank when created) to ``to_status``."""
+    resolution = None
+    if to_status == Request.Status.RESOLVED and request.date_submitted:
+        resolution = max(0, int((changed_at - request.date_submitted).total_seconds()))
+    return RequestStatusEvent(
+        request_id=request.pk, project_id=request.project_id, company_id=request.company_id,
+        from_status=from_status or '', to_status=to_status, changed_at=changed_at, resolution_seconds=resolution,
+    )
+
+
+def history_events(request):
+    """Events for a request inserted without signals (imports): its opening and, when dated, its closing."""
+    if request.status in Request.CLOSED_STATUSES and request.date_completed:
+        return [
+            status_event(request, '', Request.Status.NEW, request.date_submitted),
+            status_event(request, Request.Status.NEW, request.status, request.date_completed),
+        ]
+    return [status_event(request, '', request.status, request.date_submitted)]
+
+
+def record_status_change(request, from_status):
+    """Log a saved request's new status and queue a refresh of the rollups for the day it happened."""
+    changed_at = (request.last_updated if from_status else request.date_submitted) or timezone.now()
+    event = status_event(request, from_status, request.status, changed_at)
+    event.save()
+    queue_rollup_refresh(day_of(event.changed_at), event.project_id, event.company_id)
+    return event
+
+
+def queue_rollup_refresh(day, project_id, company_id):
+    day = day.isoformat()
+    # One queued refresh per day and scope covers any number of changes before it runs
+    enqueue('analytics.refresh_rollups', key=f'rollups:{day}:{project_id}:{company_id}',
+            day=day, project_id=project_id, company_id=company_id)
+
+
+def summarise(events):
+    """Rollup column values for an iterable of ``(from_status, to_status, resolution_seconds)``."""
+    values = dict(opened=0, resolved=0, rejected=0, resolved_within_sla=0, resolution_seconds_total=0)
+    histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    resolutions = []
+    sla = settings.REQUEST_SLA_HOURS * 3600
+    for from_status, to_status, seconds in events:
+        if not from_status:
+            values['opened'] += 1
+        if to_status == Request.Status.REJECTED:
+            values['rejected'] += 1
+        elif to_status == Request.Status.RESOLVED:
+            values['resolved'] += 1
+            if seconds is not None:
+                resolutions.append(seconds)
+                values['resolution_seconds_total'] += seconds
+                values['resolved_within_sla'] += seconds <= sla
+                histogram[bisect.bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+    resolutions.sort()
+    values['resolution_p90_seconds'] = percentile(resolutions, 0.90)
+    values['resolution_histogram'] = histogram
+    return values
+
+
+@task('analytics.refresh_rollups')
+def refresh_rollups(day, project_id=None, company_id=None):
+    """Recompute one day's rollup rows for a project and/or company from that day's events."""
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    start, end = day_bounds(day)
+    for model, field in SCOPES.items():
+        key = project_id if field == 'project' else company_id
+        # The project or company may have been deleted since the refresh was queued
+        if key is None or not model._meta.get_field(field).related_model.objects.filter(pk=key).exists():
+            continue
+        events = (RequestStatusEvent.objects.filter(**{field: key}, changed_at__gte=start, changed_at__lt=end)
+                  .values_list(*EVENT_FIELDS))
+        model.objects.update_or_create(**{f'{field}_id': key}, day=day, defaults=summarise(events))
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Rebuild every rollup row for the days from ``start`` to ``end`` (inclusive; open-ended
+    when None) from the event log, one day in memory at a time. Returns the rows written.
+    """
+    events = RequestStatusEvent.objects.order_by('changed_at')
+    rollups = {model: model.objects.all() for model in SCOPES}
+    if start is not None:
+        events = events.filter(changed_at__gte=day_bounds(start)[0])
+        rollups = {model: queryset.filter(day__gte=start) for model, queryset in rollups.items()}
+    if end is not None:
+        events = events.filter(changed_at__lt=day_bounds(end)[1])
+        rollups = {model: queryset.filter(day__lte=end) for model, queryset in rollups.items()}
+    # Events outlive deleted projects and companies; their rollups don't
+    existing = {'project': set(Project.objects.values_list('pk', flat=True)),
+                'company': set(Company.objects.values_list('pk', flat=True))}
+
+    def flush(day, groups):
+        written = 0
+        for model, field in SCOPES.items():
+            written += len(model.objects.bulk_create([
+                model(**{f'{field}_id': key}, day=day, **summarise(rows))
+                for key, rows in groups[field].items() if key in existing[field]
+            ], batch_size=500))
+        return written
+
+    with transaction.atomic():
+        for queryset in rollups.values():
+            queryset.delete()
+        day, groups, written = None, None, 0
+        for project_id, company_id, changed_at, *row in events.values_list(
+                'project', 'company', 'changed_at', *EVENT_FIELDS).iterator(chunk_size=5000):
+            if day_of(changed_at) != day:
+                if day is not None:
+                    written += flush(day, groups)
+                day, groups = day_of(changed_at), {'project': {}, 'company': {}}
+            groups['project'].setdefault(project_id, []).append(row)
+            if company_id is not None:
+                groups['company'].setdefault(company_id, []).append(row)
+        if day is not None:
+            written += flush(day, groups)
+    return written
+
+
+def histogram_percentile(histogram, fraction):
+    """Upper bound in seconds of the bucket holding the given percentile; None if it is the open bucket."""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = max(1, math.ceil(fraction * total))
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= rank:
+            return HISTOGRAM_BOUNDS[index] if index < len(HISTOGRAM_BOUNDS) else None
+    return None
+
+
+def report(rollups, group_by):
+    """
+    Totals over ``rollups`` (a rollup queryset) per ``group_by`` ('project' or 'company'),
+    busiest first, with mean resolution time, estimated p90 and the share resolved within SLA.
+    """
+    totals = {}
+    counters = ('opened', 'resolved', 'rejected', 'resolved_within_sla', 'resolution_seconds_total')
+    for row in rollups.values(group_by, f'{group_by}__name', *counters, 'resolution_histogram'):
+        entry = totals.setdefault(row[group_by], {
+            'id': row[group_by], 'name': row[f'{group_by}__name'],
+            'histogram': [0] * (len(HISTOGRAM_BOUNDS) + 1), **dict.fromkeys(counters, 0),
+        })
+        for counter in counters:
+            entry[counter] += row[counter]
+        for index, count in enumerate(row['resolution_histogram']):
+            entry['histogram'][index] += count
+    return sorted((finish(entry) for entry in totals.values()), key=lambda entry: (-entry['opened'], entry['name']))
+
+
+def finish(entry):
+    timed = sum(entry['histogram'])
+    entry['mean_resolution_hours'] = entry['resolution_seconds_total'] / timed / 3600 if timed else None
+    p90 = histogram_percentile(entry['histogram'], 0.90)
+    entry['p90_resolution_hours'] = p90 / 3600 if p90 is not None else None
+    entry['p90_beyond_histogram'] = timed > 0 and p90 is None
+    entry['sla_percent'] = 100 * entry['resolved_within_sla'] / timed if timed else None
+    return entry
+
+
+def overall(entries):
+    """One entry combining ``entries`` from report()."""
+    combined = {'id': None, 'name': 'All', 'histogram': [0] * (len(HISTOGRAM_BOUNDS) + 1)}
+    for counter in ('opened', 'resolved', 'rejected', 'resolved_within_sla', 'resolution_seconds_total'):
+        combined[counter] = sum(entry[counter] for entry in entries)
+    for entry in entries:
+        for index, count in enumerate(entry['histogram']):
+            combined['histogram'][index] += count
+    return finish(combined)
@@ -0,0 +1,439 @@
+"""
+JSON API over projects, requests and comments, for integrations (mounted under /api/).
+
+Clients sign in with a session like the HTML views do (and send the CSRF token back on
+writes), and see exactly the rows those views would show them (tenancy.py). Every list is
+cursor paginated (pagination.py) and can be narrowed with ``?fields=a,b``; rows are read
+with ``values()``, related names joined into the same query, so a page costs one query
+however many rows it has. GETs answer ``If-None-Match``/``If-Modified-Since`` from the same
+database state as the pages (conditional.py), and lists take ``?updated_since=`` (comments:
+``?created_since=``), so a client can sync what changed since its last poll.
+
+Writes go through the same forms as the HTML views, in one transaction with the tasks
+their signals queue.
+"""
+import json
+
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.views import generic
+
+from . import bulk
+from .conditional import ConditionalGetMixin, latest
+from .forms import ProjectForm, RequestForm
+from .models import Comment, Project, Request
+from .pagination import KeysetPaginationMixin
+from .routers import ReplicaReadMixin
+from .tenancy import tenant_of
+from .views import TenantListStateMixin, save_comment
+
+
+def error(status, detail, **extra):
+    return JsonResponse({'detail': detail, **extra}, status=status)
+
+
+class ApiView(generic.View):
+    """
+    Base for the API views: JSON errors instead of login redirects and error pages, and
+    the JSON request body. Subclasses implement ``read()`` for GET.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error(401, 'Authentication credentials were not provided.')
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except Http404 as exc:
+            return error(404, str(exc) or 'Not found.')
+        except PermissionDenied as exc:
+            return error(403, str(exc) or 'You do not have permission to do this.')
+        except BadRequest as exc:
+            return error(400, str(exc))
+
+    def http_method_not_allowed(self, request, *args, **kwargs):
+        response = error(405, f'Method "{request.method}" not allowed.')
+        response['Allow'] = ', '.join(method.upper() for method in self._allowed_methods())
+        return response
+
+    @cached_property
+    def tenant(self):
+        return tenant_of(self.request)
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(self.read())
+
+    def read(self):
+        raise NotImplementedError
+
+    def get_body(self):
+        try:
+            body = json.loads(self.request.body or b'{}')
+        except ValueError:
+            raise BadRequest('The request body is not valid JSON.')
+        if not isinstance(body, dict):
+            raise BadRequest('The request body must be a JSON object.')
+        return body
+
+
+def invalid(form):
+    return JsonResponse({'errors': form.errors}, status=400)
+
+
+class ResourceMixin:
+    """
+    The fields of a model the API exposes, and sparse reads of them.
+
+    ``api_fields`` maps each field name in the API to the lookup it is read from; related
+    names are lookups across a foreign key, so they are joined rather than fetched per row.
+    """
+    model = None
+    api_fields = {}
+    # Form fields a client may send on POST and PATCH
+    writable_fields = ()
+
+    def get_field_names(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return list(self.api_fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.api_fields]
+        if unknown:
+            raise BadRequest(f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(self.api_fields)}.')
+        return names
+
+    def base_queryset(self):
+        return self.model.objects.visible_to(self.tenant)
+
+    def sparse_values(self, queryset, names, extra=()):
+        """``queryset`` as dicts holding just the lookups behind ``names`` (and ``extra``)."""
+        lookups = dict.fromkeys([self.api_fields[name] for name in names] + list(extra))
+        return queryset.values(*lookups)
+
+    def serialise(self, row, names):
+        return {name: row[self.api_fields[name]] for name in names}
+
+    def read_one(self, pk, names=None):
+        names = names or self.get_field_names()
+        row = self.sparse_values(self.base_queryset().filter(pk=pk), names).first()
+        if row is None:
+            raise Http404(f'No {self.model._meta.verbose_name} found matching the query.')
+        return self.serialise(row, names)
+
+    def check_writable(self, body):
+        unknown = sorted(set(body) - set(self.writable_fields))
+        if unknown:
+            raise BadRequest(f'Fields that can not be written: {", ".join(unknown)}.')
+
+    def form_data(self, instance, body):
+        """The instance's current values with ``body`` over them, for a partial update."""
+        self.check_writable(body)
+        return {**model_to_dict(instance, fields=self.writable_fields), **body}
+
+
+class CollectionMixin(KeysetPaginationMixin):
+    """A cursor paginated list: ``{"results": [...], "next": url, "previous": url}``."""
+    # Rows changed after ?<since_param>= (an ISO 8601 time), for delta syncs
+    since_param = 'updated_since'
+    since_field = 'last_updated'
+
+    def get_since(self):
+        value = self.request.GET.get(self.since_param)
+        if not value:
+            return None
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise BadRequest(f'{self.since_param} must be an ISO 8601 date and time.')
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    def filter_queryset(self, queryset):
+        since = self.get_since()
+        if since is not None:
+            queryset = queryset.filter(**{f'{self.since_field}__gt': since})
+        return queryset
+
+    def get_queryset(self):
+        return self.filter_queryset(self.base_queryset())
+
+    def page_url(self, param, cursor):
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query[param] = cursor
+        return self.request.build_absolute_uri(f'{self.request.path}?{query.urlencode()}')
+
+    def read(self):
+        names = self.get_field_names()
+        queryset = self.sparse_values(self.get_queryset(), names, self.keyset_fields)
+        page = self.get_keyset_page(queryset)
+        return {
+            'results': [self.serialise(row, names) for row in page],
+            'next': self.page_url('after', page.next_cursor),
+            'previous': self.page_url('before', page.previous_cursor),
+        }
+
+
+class ProjectResource(ResourceMixin):
+    model = Project
+    api_fields = {
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'status': 'status',
+        'version': 'version',
+        'owner': 'owner',
+        'owner_username': 'owner__username',
+        'company': 'company',
+        'created_at': 'created_at',
+        'last_updated': 'last_updated',
+    }
+    writable_fields = ('name', 'description', 'owner', 'version', 'status')
+
+
+class ProjectCollectionView(ProjectResource, CollectionMixin, ReplicaReadMixin, TenantListStateMixin, ConditionalGetMixin, ApiView):
+    """GET lists the projects the user can see (``?status=``); POST creates one owned by the user."""
+    http_method_names = ['get', 'head', 'post']
+    keyset_fields = ('last_updated', 'id')
+    list_kind = 'projects'
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.GET.get('status'):
+            queryset = queryset.filter(status__in=self.request.GET.getlist('status'))
+        return queryset
+
+    def post(self, request, *args, **kwargs):
+        body = self.get_body()
+        self.check_writable(body)
+        # Like ProjectCreateView, the project belongs to whoever creates it
+        form = ProjectForm({**body, 'owner': request.user.pk})
+        if not form.is_valid():
+            return invalid(form)
+        form.instance.owner = request.user
+        with transaction.atomic():
+            project = form.save()
+        return JsonResponse(self.read_one(project.pk), status=201)
+
+
+class ProjectItemView(ProjectResource, ConditionalGetMixin, ApiView):
+    """One project: GET, PATCH (staff only) and DELETE (staff, or the project's owner)."""
+    http_method_names = ['get', 'head', 'patch', 'delete']
+
+    def get_conditional_state(self):
+        last_updated = self.base_queryset().filter(pk=self.kwargs['pk']).values_list('last_updated', flat=True).first()
+        if last_updated is None:
+            return None
+        return last_updated, [last_updated]
+
+    def read(self):
+        return self.read_one(self.kwargs['pk'])
+
+    def patch(self, request, *args, **kwargs):
+        project = get_visible(self.base_queryset(), self.kwargs['pk'])
+        if not self.tenant.is_staff:
+            raise PermissionDenied("You don't have permission to edit this project.")
+        form = ProjectForm(self.form_data(project, self.get_body()), instance=project)
+        if not form.is_valid():
+            return invalid(form)
+        with transaction.atomic():
+            form.save()
+        return JsonResponse(self.read_one(project.pk))
+
+    def delete(self, request, *args, **kwargs):
+        # Same rule as ProjectDeleteView: customers can only delete projects they own
+        queryset = self.base_queryset()
+        if not self.tenant.is_staff:
+            queryset = queryset.filter(owner=self.tenant.user_id)
+        project = get_visible(queryset, self.kwargs['pk'])
+        with transaction.atomic():
+            project.delete()
+        return HttpResponse(status=204)
+
+
+class RequestResource(ResourceMixin):
+    model = Request
+    api_fields = {
+        'id': 'id',
+        'subject': 'subject',
+        'request_type': 'request_type',
+        'status': 'status',
+        'description': 'description',
+        'project': 'project',
+        'project_name': 'project__name',
+        'requester': 'requester',
+        'requester_username': 'requester__username',
+        'company': 'company',
+        'date_submitted': 'date_submitted',
+        'last_updated': 'last_updated',
+        'date_completed': 'date_completed',
+        'comment_count': 'comment_count',
+        'last_activity_at': 'last_activity_at',
+    }
+    writable_fields = ('subject', 'request_type', 'project', 'description')
+
+
+class RequestCollectionView(RequestResource, CollectionMixin, ReplicaReadMixin, TenantListStateMixin, ConditionalGetMixin, ApiView):
+    """
+    GET lists the requests the user can see, most recently updated first (``?status=``,
+    ``?project=``); POST raises a new one.
+    """
+    http_method_names = ['get', 'head', 'post']
+    keyset_fields = ('last_updated', 'id')
+    list_kind = 'requests'
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.GET.get('status'):
+            queryset = queryset.filter(status__in=self.request.GET.getlist('status'))
+        if self.request.GET.get('project'):
+            queryset = queryset.filter(project=int_param(self.request, 'project'))
+        return queryset
+
+    def post(self, request, *args, **kwargs):
+        body = self.get_body()
+        self.check_writable(body)
+        form = RequestForm(body, user=request.user)
+        if not form.is_valid():
+            return invalid(form)
+        form.instance.requester = request.user
+        with transaction.atomic():
+            request_obj = form.save()
+        return JsonResponse(self.read_one(request_obj.pk), status=201)
+
+
+class RequestItemView(RequestResource, ConditionalGetMixin, ApiView):
+    """
+    One request: GET, PATCH and DELETE. ``status`` can also be patched, by staff only, and
+    goes through bulk.change_status so it is logged and notified like a triage change.
+    """
+    http_method_names = ['get', 'head', 'patch', 'delete']
+
+    def get_conditional_state(self):
+        row = (self.base_queryset().filter(pk=self.kwargs['pk'])
+               .values_list('last_updated', 'project__last_updated', 'last_activity_at', 'comment_count').first())
+        if row is None:
+            return None
+        # Comments move last_activity_at and comment_count (a delete only the count), not last_updated
+        return latest(*row[:3]), list(row)
+
+    def read(self):
+        return self.read_one(self.kwargs['pk'])
+
+    def patch(self, request, *args, **kwargs):
+        request_obj = get_visible(self.base_queryset(), self.kwargs['pk'])
+        body = self.get_body()
+        status = body.pop('status', None)
+        if status is not None:
+            if not self.tenant.is_staff:
+                raise PermissionDenied("You don't have permission to change the status of requests.")
+            if status not in Request.Status.values:
+                return JsonResponse({'errors': {'status': [f'"{status}" is not a valid status.']}}, status=400)
+        form = RequestForm(self.form_data(request_obj, body), instance=request_obj, user=request.user)
+        if not form.is_valid():
+            return invalid(form)
+        with transaction.atomic():
+            form.save()
+            if status is not None:
+                bulk.change_status(Request.objects.filter(pk=request_obj.pk), status)
+        return JsonResponse(self.read_one(request_obj.pk))
+
+    def delete(self, request, *args, **kwargs):
+        request_obj = get_visible(self.base_queryset(), self.kwargs['pk'])
+        with transaction.atomic():
+            request_obj.delete()
+        return HttpResponse(status=204)
+
+
+class CommentResource(ResourceMixin):
+    model = Comment
+    api_fields = {
+        'id': 'id',
+        'request': 'request',
+        'author': 'author',
+        'author_username': 'author__username',
+        'text': 'text',
+        'created_date': 'created_date',
+    }
+    writable_fields = ('text',)
+
+
+class CommentCollectionView(CommentResource, CollectionMixin, ReplicaReadMixin, ConditionalGetMixin, ApiView):
+    """Comments on every request the user can see, newest first (``?request=``)."""
+    http_method_names = ['get', 'head']
+    keyset_fields = ('created_date', 'id')
+    since_param = 'created_since'
+    since_field = 'created_date'
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.GET.get('request'):
+            queryset = queryset.filter(request=int_param(self.request, 'request'))
+        return queryset
+
+    def get_conditional_state(self):
+        # Only the page being served, walked on the keyset index like the page itself: its
+        # comments (one goes missing on a delete) and the cursors around it
+        page = self.get_keyset_page(self.get_queryset().values(*self.keyset_fields))
+        rows = [(row['id'], row['created_date']) for row in page]
+        return latest(*(created for _, created in rows)), [rows, page.next_cursor, page.previous_cursor]
+
+
+class RequestCommentsView(CommentResource, CollectionMixin, ConditionalGetMixin, ApiView):
+    """The comment thread of one request, newest first; POST adds a comment to it."""
+    http_method_names = ['get', 'head', 'post']
+    keyset_fields = ('created_date', 'id')
+    since_param = 'created_since'
+    since_field = 'created_date'
+
+    def request_is_visible(self):
+        return Request.objects.visible_to(self.tenant).filter(pk=self.kwargs['pk']).exists()
+
+    def get_conditional_state(self):
+        row = (Request.objects.visible_to(self.tenant).filter(pk=self.kwargs['pk'])
+               .values_list('last_activity_at', 'comment_count').first())
+        if row is None:
+            return None
+        # The count also moves when a comment is deleted
+        return row[0], list(row)
+
+    def base_queryset(self):
+        return Comment.objects.filter(request=self.kwargs['pk'])
+
+    def read(self):
+        # Checked here too, as conditional state isn't computed while messages are pending
+        if not self.request_is_visible():
+            raise Http404('No request found matching the query.')
+        return super().read()
+
+    def post(self, request, *args, **kwargs):
+        body = self.get_body()
+        self.check_writable(body)
+        comment, form = save_comment(request, self.kwargs['pk'], data=body)
+        if comment is None:
+            return invalid(form)
+        return JsonResponse(self.read_one(comment.pk), status=201)
+
+
+def get_visible(queryset, pk):
+    obj = queryset.filter(pk=pk).first()
+    if obj is None:
+        raise Http404(f'No {queryset.model._meta.verbose_name} found matching the query.')
+    return obj
+
+
+def int_param(request, name):
+    try:
+        return int(request.GET[name])
+    except ValueError:
+        raise BadRequest(f'{name} must be an id.')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RequestloggerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "requestLogger"
+
+    def ready(self):
+        from . import db, signals  # noqa: F401 (connects the signal receivers)
@@ -0,0 +1,124 @@
+"""
+Archival of long-closed requests into cold tables.
+
+Requests that were closed (Resolved, Rejected or Cancelled) more than ARCHIVE_AFTER_DAYS
+ago move, with their comments, to ArchivedRequest and ArchivedComment, in batches of one
+transaction each, so the Request and Comment tables only hold live work and recent history.
+Rows keep their ids: request pages find archived requests through find_request(), and
+restore_requests() moves them back unchanged.
+
+Moving a request is not a change to it, so the rows are deleted without signals: status
+events stay (they never reference the request table), company counters keep counting
+archived requests (see stats.py), and no notifications or rollups are queued. Search index
+entries are dropped on archival and rebuilt on restore.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.http import Http404
+from django.utils import timezone
+
+from . import search
+from .models import ArchivedComment, ArchivedRequest, Comment, Notification, Request
+
+# Columns shared by the live and archive tables, by attribute name (project_id, ...)
+REQUEST_FIELDS = [field.attname for field in Request._meta.concrete_fields]
+COMMENT_FIELDS = [field.attname for field in Comment._meta.concrete_fields]
+
+
+def archivable(cutoff):
+    """Requests closed before ``cutoff``; ones closed without a completion date go by their last update."""
+    return Request.objects.filter(status__in=Request.CLOSED_STATUSES).filter(
+        Q(date_completed__lt=cutoff) | Q(date_completed__isnull=True, last_updated__lt=cutoff))
+
+
+def raw_delete(queryset):
+    # A plain DELETE: no instances loaded, no post_delete signals, no cascades (the
+    # dependent rows are moved or deleted first)
+    return queryset._raw_delete(queryset.db)
+
+
+def archive_batch(ids, now):
+    """Move the requests ``ids`` and their comments to the archive tables; returns the counts moved."""
+    requests = list(Request.objects.filter(pk__in=ids).select_for_update().values(*REQUEST_FIELDS))
+    comments = list(Comment.objects.filter(request__in=ids).values(*COMMENT_FIELDS))
+    ArchivedRequest.objects.bulk_create([ArchivedRequest(archived_at=now, **row) for row in requests])
+    ArchivedComment.objects.bulk_create([ArchivedComment(**row) for row in comments], batch_size=1000)
+
+    raw_delete(Notification.objects.filter(request__in=ids))
+    raw_delete(Comment.objects.filter(request__in=ids))
+    raw_delete(Request.objects.filter(pk__in=ids))
+    search.unindex_many(ids, [row['id'] for row in comments])
+    return len(requests), len(comments)
+
+
+def archive_closed(days=None, batch_size=500, now=None, on_batch=None):
+    """
+    Archive every request closed more than ``days`` (default ARCHIVE_AFTER_DAYS) ago.
+    Returns ``(requests, comments)`` archived; ``on_batch`` is called with the running totals.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.ARCHIVE_AFTER_DAYS if days is None else days)
+    requests, comments = 0, 0
+    while True:
+        with transaction.atomic():
+            ids = list(archivable(cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            moved_requests, moved_comments = archive_batch(ids, now)
+        requests += moved_requests
+        comments += moved_comments
+        if on_batch:
+            on_batch(requests, comments)
+    return requests, comments
+
+
+def restore_requests(ids):
+    """Move the archived requests ``ids`` and their comments back; returns the counts restored."""
+    with transaction.atomic():
+        archived = list(ArchivedRequest.objects.filter(pk__in=ids).select_for_update().values(*REQUEST_FIELDS))
+        ids = [row['id'] for row in archived]
+        comment_rows = list(ArchivedComment.objects.filter(request__in=ids).values(*COMMENT_FIELDS))
+        requests = [Request(**row) for row in archived]
+        comments = [Comment(**row) for row in comment_rows]
+        Request.objects.bulk_create(requests, batch_size=500)
+        Comment.objects.bulk_create(comments, batch_size=1000)
+
+        # bulk_create stamps the auto_now/auto_now_add fields; put the archived times back
+        for request, row in zip(requests, archived):
+            request.date_submitted, request.last_updated = row['date_submitted'], row['last_updated']
+        for comment, row in zip(comments, comment_rows):
+            comment.created_date = row['created_date']
+        Request.objects.bulk_update(requests, ['date_submitted', 'last_updated'], batch_size=500)
+        Comment.objects.bulk_update(comments, ['created_date'], batch_size=1000)
+
+        raw_delete(ArchivedComment.objects.filter(request__in=ids))
+        raw_delete(ArchivedRequest.objects.filter(pk__in=ids))
+        search.index_many(requests, comments)
+    return len(requests), len(comments)
+
+
+def next_ids():
+    """
+    The first free request and comment ids, counting archived rows, for code that assigns
+    ids itself (imports.py); otherwise a restore could collide with a newer row.
+    """
+    request_ids = [Request.objects.aggregate(last=Max('pk'))['last'], ArchivedRequest.objects.aggregate(last=Max('pk'))['last']]
+    comment_ids = [Comment.objects.aggregate(last=Max('pk'))['last'], ArchivedComment.objects.aggregate(last=Max('pk'))['last']]
+    return (max(pk or 0 for pk in request_ids) + 1, max(pk or 0 for pk in comment_ids) + 1)
+
+
+def find_request(tenant, pk, queryset=None):
+    """
+    Request ``pk`` from ``queryset`` (default all requests) if ``tenant`` may see it, or
+    else the archived request with that id; 404 if neither.
+    """
+    queryset = Request.objects.all() if queryset is None else queryset
+    request = queryset.visible_to(tenant).filter(pk=pk).first()
+    if request is None:
+        request = ArchivedRequest.objects.visible_to(tenant).select_related('project', 'requester').filter(pk=pk).first()
+    if request is None:
+        raise Http404('No request found matching the query')
+    return request
@@ -0,0 +1,285 @@
+"""
+Benchmark harness that drives every URL in requestLogger.urls through the test client.
+
+Each URL is requested a fixed number of times as a staff user and as a customer from the
+busiest company, after a warm-up. Latency is measured around the whole request (including
+streamed bodies) and queries are counted on every connection, so the numbers hold with
+DEBUG off. A URL that answers with an error status is flagged (``error``) and reported
+without timings, since they would measure the error page rather than the view. Results are
+plain dicts that can be saved as JSON and compared with compare().
+
+run_writes() is the concurrent write benchmark: several threads post comments the way
+separate workers would, each write wrapped in the request_started/request_finished signals
+so connection reuse (CONN_MAX_AGE) and health checks behave as they do under a server.
+
+compression_report() weighs the storage CompressedTextField saves against what it costs to
+read the text back, for a range of thresholds, over a sample of the stored text.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import urls
+from .db import SQLITE_DEFAULT_PRAGMAS
+from .fields import compress_text, decompress_text
+from .metrics import percentile
+from .middleware import QueryTimer
+from .models import Comment, Company, Project, Request, User
+
+# Extra request data per URL name: (method, data). Anything not listed is a plain GET.
+TARGET_DATA = {
+    'request_search': ('get', {'q': 'error'}),
+    'request_export': ('get', {'format': 'csv'}),
+    'comment_create': ('post', {'text': 'Benchmark comment'}),
+    # No requests ticked: measures the staff check and form validation only
+    'request_bulk_action': ('post', {'action': 'status', 'status': 'In Progress'}),
+}
+WRITE_METHODS = ('post',)
+# The model whose pk a URL takes, where it isn't the model of the view behind it
+PK_MODELS = {
+    'comment_create': Request,
+    'comment_page': Request,
+    'api_request_comments': Request,
+}
+
+
+def sample_users():
+    staff = User.objects.filter(role='staff').order_by('pk').first()
+    # The customer with the most company data sees the slowest pages
+    customer = (User.objects.filter(role='customer', company__isnull=False)
+                .annotate(company_requests=Count('company__requests')).order_by('-company_requests', 'pk').first())
+    return [(role, user) for role, user in (('staff', staff), ('customer', customer)) if user]
+
+
+def sample_objects(user):
+    """The project and request whose URLs are benchmarked for ``user``: the busiest ones it can see."""
+    project = Project.objects.visible_to(user).annotate(total=Count('requests')).order_by('-total', 'pk').first()
+    busiest = (Comment.objects.visible_to(user).values('request').annotate(total=Count('pk'))
+               .order_by('-total', 'request').first())
+    if busiest:
+        request = Request.objects.get(pk=busiest['request'])
+    else:
+        request = Request.objects.visible_to(user).first()
+    return project, request
+
+
+def pk_model(pattern):
+    """The model whose pk ``pattern`` takes: PK_MODELS, or else the model of its view."""
+    model = PK_MODELS.get(pattern.name) or getattr(getattr(pattern.callback, 'view_class', None), 'model', None)
+    if model is None:
+        raise ValueError(f'No sample object for the URL {pattern.name!r}; add its model to PK_MODELS.')
+    return model
+
+
+def targets(user, read_only=False):
+    """``(name, method, path, data)`` for every named URL pattern, as seen by ``user``."""
+    project, request = sample_objects(user)
+    samples = {Project: project, Request: request}
+    for pattern in urls.urlpatterns:
+        method, data = TARGET_DATA.get(pattern.name, ('get', {}))
+        if read_only and method in WRITE_METHODS:
+            continue
+        kwargs = {}
+        if 'pk' in pattern.pattern.converters:
+            sample = samples.get(pk_model(pattern))
+            if sample is None:
+                continue
+            kwargs['pk'] = sample.pk
+        yield pattern.name, method, reverse(pattern.name, kwargs=kwargs), data
+
+
+def measure(client, method, path, data):
+    timer = QueryTimer()
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(timer))
+        response = getattr(client, method)(path, data)
+        if response.streaming:
+            # Streamed bodies run their queries as they are consumed
+            for _ in response.streaming_content:
+                pass
+    return response.status_code, (time.perf_counter() - start) * 1000, timer.queries
+
+
+def run(iterations=20, warmup=2, read_only=False, users=None):
+    results = {}
+    for role, user in users or sample_users():
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        for name, method, path, data in targets(user, read_only):
+            for _ in range(warmup):
+                measure(client, method, path, data)
+            samples = [measure(client, method, path, data) for _ in range(iterations)]
+            failed = sorted({status for status, _, _ in samples if status >= 400})
+            if failed:
+                # An error page is not the view; flag the row rather than report its timings
+                samples = []
+            latencies = sorted(latency for _, latency, _ in samples)
+            queries = sorted(count for _, _, count in samples)
+            results[f'{name} ({role})'] = {
+                'method': method.upper(),
+                'path': path,
+                'status': failed[0] if failed else Counter(status for status, _, _ in samples).most_common(1)[0][0],
+                'error': bool(failed),
+                'requests': iterations,
+                'throughput_rps': iterations / (sum(latencies) / 1000) if sum(latencies) else None,
+                'latency_ms': {
+                    'p50': percentile(latencies, 0.50),
+                    'p95': percentile(latencies, 0.95),
+                    'p99': percentile(latencies, 0.99),
+                },
+                'queries': {'p50': percentile(queries, 0.50), 'max': queries[-1] if queries else None},
+            }
+    return {
+        'created': timezone.now().isoformat(),
+        'vendor': connection.vendor,
+        'iterations': iterations,
+        'rows': {model.__name__: model.objects.count() for model in (Company, User, Project, Request, Comment)},
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=1.2, noise_ms=1.0):
+    """
+    Regressions from ``baseline`` to ``current`` as ``(name, measure, before, after)``.
+
+    A p95 latency counts when it grew by more than ``threshold`` times and by more than
+    ``noise_ms``; any change of status code and any extra query counts too.
+    """
+    regressions = []
+    for name, after in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        if after['status'] != before['status']:
+            regressions.append((name, 'status', before['status'], after['status']))
+        old, new = before['latency_ms']['p95'], after['latency_ms']['p95']
+        if old is not None and new is not None and new > old * threshold and new - old > noise_ms:
+            regressions.append((name, 'p95 ms', old, new))
+        if (after['queries']['max'] or 0) > (before['queries']['max'] or 0):
+            regressions.append((name, 'queries', before['queries']['max'], after['queries']['max']))
+    return regressions
+
+
+@contextmanager
+def untuned_database():
+    """Backend defaults for a baseline: SQLite's own PRAGMAs, elsewhere a new connection per request."""
+    database = connections.databases['default']
+    saved = {key: database.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+    database.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+    connections.close_all()
+    try:
+        with override_settings(SQLITE_PRAGMAS=SQLITE_DEFAULT_PRAGMAS):
+            yield
+    finally:
+        database.update(saved)
+        connections.close_all()
+
+
+def write_worker(request_ids, author_id, writes, seed, latencies, errors):
+    rng = random.Random(seed)
+    try:
+        for _ in range(writes):
+            request_started.send(sender=None)
+            start = time.perf_counter()
+            try:
+                # As in the views: the comment commits together with the tasks it queues
+                with transaction.atomic():
+                    Comment.objects.create(request_id=rng.choice(request_ids), author_id=author_id, text='Benchmark write')
+            except OperationalError as e:
+                errors.append(str(e))
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                request_finished.send(sender=None)
+    finally:
+        connections.close_all()
+
+
+def run_writes(threads=8, writes=100, seed=0):
+    """Post ``writes`` comments from each of ``threads`` threads at once; throughput and latency."""
+    author = User.objects.filter(role='staff').order_by('pk').first()
+    request_ids = list(Request.objects.order_by('-pk').values_list('pk', flat=True)[:1000])
+    if author is None or not request_ids:
+        raise ValueError('Need a staff user and some requests to write comments on; run generate_data first.')
+    # Start from closed connections so every thread connects with the current settings
+    connections.close_all()
+
+    latencies, errors = [], []
+    workers = [threading.Thread(target=write_worker, args=(request_ids, author.pk, writes, seed + n, latencies, errors))
+               for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'threads': threads,
+        'writes': threads * writes,
+        'succeeded': len(latencies),
+        'failed': len(errors),
+        'errors': sorted(set(errors)),
+        'elapsed_s': elapsed,
+        'throughput_wps': len(latencies) / elapsed if elapsed else None,
+        'latency_ms': {
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+        },
+    }
+
+
+def database_profile():
+    """The settings that matter for write concurrency, as the current connection sees them."""
+    profile = {'vendor': connection.vendor, 'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE')}
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for name in SQLITE_DEFAULT_PRAGMAS:
+                cursor.execute(f'PRAGMA {name}')
+                row = cursor.fetchone()  # mmap_size returns nothing for in-memory databases
+                profile[name] = row[0] if row else None
+    return profile
+
+
+def compression_report(thresholds, sample=2000):
+    """
+    For each threshold: the bytes a sample of request descriptions and comments takes plain
+    and as stored, how many rows it compresses, and the time to load the sample back
+    (expanding what is compressed) against reading the plain text.
+    """
+    texts = list(Request.objects.order_by('-pk').values_list('description', flat=True)[:sample])
+    texts += list(Comment.objects.order_by('-pk').values_list('text', flat=True)[:sample])
+    plain_bytes = sum(len(text.encode()) for text in texts)
+    report = {'rows': len(texts), 'plain_bytes': plain_bytes, 'thresholds': {}}
+    for threshold in thresholds:
+        stored = [compress_text(text, threshold) for text in texts]
+        start = time.perf_counter()
+        for value in stored:
+            decompress_text(value)
+        read_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for value in texts:
+            decompress_text(value)
+        baseline_time = time.perf_counter() - start
+        stored_bytes = sum(len(value.encode()) for value in stored)
+        report['thresholds'][threshold] = {
+            'compressed_rows': sum(value is not text for value, text in zip(stored, texts)),
+            'stored_bytes': stored_bytes,
+            'saved_pct': round(100 * (1 - stored_bytes / plain_bytes), 1) if plain_bytes else 0.0,
+            'read_us_per_row': round(read_time / max(len(texts), 1) * 1e6, 2),
+            'extra_read_us_per_row': round((read_time - baseline_time) / max(len(texts), 1) * 1e6, 2),
+        }
+    return report
@@ -0,0 +1,75 @@
+"""
+Set-based changes to many requests at once, for staff triage (RequestBulkActionView and
+the RequestAdmin actions).
+
+Each action is a single UPDATE over the selected rows, so save() and its signals don't
+run; the bookkeeping they would do per row is done here in bulk instead: one status event
+per changed request, company counter deltas, and the queued rollup refreshes and
+notifications.
+"""
+from collections import Counter, defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import analytics
+from .models import Request, RequestStatusEvent
+from .stats import adjust_company_stats, rebuild_company_stats, status_delta
+from .tasks import enqueue
+
+
+def change_status(requests, status, now=None):
+    """
+    Move the requests in ``requests`` (a queryset) to ``status``. Closing statuses stamp
+    date_completed, open ones clear it. Returns the number of requests changed.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(requests.exclude(status=status).select_for_update()
+                    .only('status', 'project', 'company', 'date_submitted').order_by())
+        if not rows:
+            return 0
+        Request.objects.filter(pk__in=[row.pk for row in rows]).update(
+            status=status, last_updated=now, date_completed=now if status in Request.CLOSED_STATUSES else None,
+        )
+        RequestStatusEvent.objects.bulk_create(
+            [analytics.status_event(row, row.status, status, now) for row in rows], batch_size=500)
+
+        deltas = defaultdict(Counter)
+        for row in rows:
+            deltas[row.company_id].update(status_delta(row.status, -1))
+            deltas[row.company_id].update(status_delta(status, 1))
+        for company_id, delta in deltas.items():
+            adjust_company_stats(company_id, **delta)
+        for project_id, company_id in {(row.project_id, row.company_id) for row in rows}:
+            analytics.queue_rollup_refresh(analytics.day_of(now), project_id, company_id)
+        for row in rows:
+            enqueue('notifications.status_change', request_id=row.pk, from_status=row.status, to_status=status)
+    return len(rows)
+
+
+def move_to_project(requests, project, now=None):
+    """
+    Move the requests in ``requests`` (a queryset) to ``project``. Returns the number moved.
+
+    A request stays with its requester's company, so customers' requests can only move to
+    projects of their own company (ValidationError otherwise); requests raised by staff
+    follow the project to its company. Status history stays with the old project.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        requests = requests.exclude(project=project)
+        crossing = requests.filter(requester__company__isnull=False).exclude(requester__company=project.company_id)
+        if crossing.exists():
+            raise ValidationError(
+                'Requests raised by customers can only move to projects of their own company.', code='tenant')
+        rows = list(requests.select_for_update().only('company').order_by())
+        if not rows:
+            return 0
+        Request.objects.filter(pk__in=[row.pk for row in rows]).update(
+            project=project, company=project.company_id, last_updated=now)
+        moved = {row.company_id for row in rows if row.company_id != project.company_id}
+        if moved:
+            rebuild_company_stats([pk for pk in moved | {project.company_id} if pk])
+    return len(rows)
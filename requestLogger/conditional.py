@@ -0,0 +1,70 @@
+"""
+Conditional GET for the project and request pages.
+
+A view with ConditionalGetMixin describes its page by ``get_conditional_state()``: the
+page's last modification time and whatever else it depends on (timestamps, counts), read
+from the database in one small query, so every worker agrees. The ETag hashes that with
+the user, the CSRF cookie the page's forms carry and the full URL, so a client revalidating
+an unchanged page gets a 304 before the object is loaded or a template rendered.
+
+ETags are weak: the masked CSRF token makes every rendering differ byte for byte. Pages read
+from a replica that changed within REPLICA_PIN_SECONDS get no validators at all, since the
+replica may not have the change yet and the stale page would be cached as the new one.
+"""
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .routers import reading_from_replica
+
+
+class ConditionalGetMixin:
+    def get_conditional_state(self):
+        """
+        ``(last_modified, parts)`` for the page, or None to always render it (e.g. when
+        the object doesn't exist, so the view can raise its 404).
+        """
+        raise NotImplementedError
+
+    def conditional_state(self):
+        if not hasattr(self, '_conditional_state'):
+            self._conditional_state = None
+            # Pending messages are shown on the next page, so it must be sent in full
+            if not len(get_messages(self.request)):
+                state = self.get_conditional_state()
+                if state is None or not (reading_from_replica() and is_recent(state[0])):
+                    self._conditional_state = state
+        return self._conditional_state
+
+    def compute_etag(self, request, *args, **kwargs):
+        state = self.conditional_state()
+        if state is None:
+            return None
+        key = repr((
+            request.user.pk, request.COOKIES.get(settings.CSRF_COOKIE_NAME), request.get_full_path(),
+            [value.isoformat() if isinstance(value, datetime.datetime) else value for value in state[1]],
+        ))
+        return f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+
+    def compute_last_modified(self, request, *args, **kwargs):
+        state = self.conditional_state()
+        return state[0] if state else None
+
+    def get(self, request, *args, **kwargs):
+        view = condition(etag_func=self.compute_etag, last_modified_func=self.compute_last_modified)(super().get)
+        return view(request, *args, **kwargs)
+
+
+def is_recent(moment):
+    """Whether ``moment`` is within the time replicas may lag behind the primary."""
+    window = datetime.timedelta(seconds=getattr(settings, 'REPLICA_PIN_SECONDS', 0))
+    return moment is not None and moment > timezone.now() - window
+
+
+def latest(*moments):
+    """The latest of ``moments``, ignoring Nones."""
+    return max((moment for moment in moments if moment is not None), default=None)
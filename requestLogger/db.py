@@ -0,0 +1,42 @@
+"""
+Connection setup for the database profiles in changeManager/settings.py.
+
+New SQLite connections get the PRAGMAs in settings.SQLITE_PRAGMAS. Connections whose
+settings enable CONN_HEALTH_CHECKS are checked at the start of each request, and closed
+if the server dropped them while they sat idle. Django only gained that option in 4.1.
+"""
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# SQLite's own defaults, plus Python's 5 second busy timeout
+SQLITE_DEFAULT_PRAGMAS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+    'busy_timeout': 5000,
+    'mmap_size': 0,
+}
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def close_unhealthy_connections(conns=None):
+    """Close idle persistent connections that no longer answer a ping."""
+    for conn in conns if conns is not None else connections.all():
+        if (conn.settings_dict.get('CONN_HEALTH_CHECKS') and conn.connection is not None
+                and not conn.in_atomic_block and not conn.is_usable()):
+            conn.close()
+
+
+@receiver(request_started)
+def check_connection_health(sender, **kwargs):
+    close_unhealthy_connections()
@@ -0,0 +1,93 @@
+"""
+Model fields.
+
+CompressedTextField stores long text zlib-compressed, in the same text column: a value of
+``threshold`` characters or more is saved as COMPRESSED_MARKER followed by the base64 of
+its compressed UTF-8, when that comes out shorter. Values are compressed as they are saved
+and expanded as they are loaded, so instances, forms and templates only ever see plain
+text. Text that itself starts with the marker is always stored compressed, so anything
+read back with the marker is unambiguous.
+
+Database-side lookups (LIKE, ``__icontains``) only see the stored form and so don't match
+inside compressed values. Text is therefore only compressed on SQLite, where search reads the
+plain text from its FTS5 index (search.py); other backends search with LIKE over the columns
+and store text plain. For the same reason text_preview() can't cut compressed values in the
+database and returns them whole.
+"""
+import base64
+import math
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Case, F, When
+from django.db.models.functions import Substr
+
+COMPRESSED_MARKER = '\x1ezlib:'
+
+
+def compress_text(value, threshold):
+    """The stored form of ``value``: itself, or the marker and its compressed text."""
+    if not isinstance(value, str):
+        return value
+    marked = value.startswith(COMPRESSED_MARKER)
+    if len(value) < threshold and not marked:
+        return value
+    packed = COMPRESSED_MARKER + base64.b64encode(zlib.compress(value.encode())).decode('ascii')
+    return packed if marked or len(packed) < len(value) else value
+
+
+def compression_enabled(connection):
+    """Whether text is stored compressed on ``connection``: only where search has FTS5."""
+    return connection.vendor == 'sqlite'
+
+
+def decompress_text(value):
+    if not isinstance(value, str) or not value.startswith(COMPRESSED_MARKER):
+        return value
+    return zlib.decompress(base64.b64decode(value[len(COMPRESSED_MARKER):])).decode()
+
+
+class CompressedTextField(models.TextField):
+    """
+    A TextField stored compressed once it reaches ``threshold`` characters (default
+    settings.COMPRESSED_TEXT_THRESHOLD); see the module docstring.
+    """
+
+    def __init__(self, *args, threshold=None, **kwargs):
+        self.threshold = threshold
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold is not None:
+            kwargs['threshold'] = self.threshold
+        return name, path, args, kwargs
+
+    def get_threshold(self):
+        return settings.COMPRESSED_TEXT_THRESHOLD if self.threshold is None else self.threshold
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def get_db_prep_save(self, value, connection):
+        # Only saved values are compressed; lookups compare against the text as given. Without
+        # compression only text starting with the marker is packed, so it still reads back as is
+        threshold = self.get_threshold() if compression_enabled(connection) else math.inf
+        return compress_text(super().get_db_prep_save(value, connection), threshold)
+
+
+def text_preview(model, field_name, length=None):
+    """
+    An expression for the start of ``model.field_name``, for list pages that annotate it
+    instead of loading the whole column: the first ``length`` (default
+    settings.LIST_PREVIEW_CHARS) characters plus one, so ``|truncatechars:length`` still
+    shows that there is more. Compressed values can't be cut in the database; they come back
+    whole, already shorter than the text they stand for, and are expanded on load.
+    """
+    length = settings.LIST_PREVIEW_CHARS if length is None else length
+    head = Substr(field_name, 1, length + 1)
+    if not isinstance(model._meta.get_field(field_name), CompressedTextField):
+        return head
+    return Case(When(**{f'{field_name}__startswith': COMPRESSED_MARKER}, then=F(field_name)),
+                default=head, output_field=CompressedTextField())
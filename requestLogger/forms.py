@@ -9,8 +9,7 @@ class RequestForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user')
         super().__init__(*args, **kwargs)
-        if not user.is_staff:
-            self.fields['project'].queryset = Project.objects.filter(owner__company=user.company)
+        self.fields['project'].queryset = Project.objects.visible_to(user)
 
 class ProjectForm(forms.ModelForm):
     class Meta:
@@ -21,4 +20,33 @@ class ProjectForm(forms.ModelForm):
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
-        fields = ('text',)
\ No newline at end of file
+        fields = ('text',)
+
+
+class RequestBulkActionForm(forms.Form):
+    """Staff bulk action over the requests ticked on a request list."""
+    ACTIONS = [
+        ('status', 'Change status'),
+        ('project', 'Move to project'),
+    ]
+
+    requests = forms.ModelMultipleChoiceField(queryset=Request.objects.none())
+    action = forms.ChoiceField(choices=ACTIONS)
+    status = forms.ChoiceField(choices=Request.Status.choices, required=False)
+    # An id rather than a select: staff see every project
+    project = forms.ModelChoiceField(queryset=Project.objects.none(), required=False, widget=forms.NumberInput)
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        self.fields['requests'].queryset = Request.objects.visible_to(user)
+        self.fields['project'].queryset = Project.objects.visible_to(user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+        if action == 'status' and not cleaned_data.get('status'):
+            self.add_error('status', 'Choose the new status.')
+        if action == 'project' and not cleaned_data.get('project'):
+            self.add_error('project', 'Choose the project to move the requests to.')
+        return cleaned_data
@@ -0,0 +1,243 @@
+"""
+Bulk import of historical requests and comments from JSON lines.
+
+Each line is one request in the layout written by exports.py (``subject``, ``description``,
+``project``, ``requester``, ``status``, ...), optionally with a ``comments`` list of
+``{"author", "text", "created_date"}`` objects. ``title``/``body`` are accepted in place of
+``subject``/``description``. Projects are matched by name (and ``company`` name if given),
+users by username.
+
+Ids are reserved from the tables' own sequences (reserve_ids) rather than counted from the
+rows present, so requests and comments created while an import runs never get the same id.
+"""
+import json
+
+from django.db import NotSupportedError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import analytics, archive, search
+from .models import Comment, ImportCheckpoint, Project, Request, RequestStatusEvent, User
+from .stats import rebuild_company_stats
+
+
+def reserve_ids(model, count, floor=1):
+    """
+    Take ``count`` ids from ``model``'s primary key sequence, for rows inserted with their
+    ids set. Concurrent inserts numbered by the database can't be given the same ids.
+    ``floor`` is the lowest id to hand out (archive.next_ids() counts archived rows).
+    """
+    if not count:
+        return []
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                           [connection.ops.quote_name(table), model._meta.pk.column, count])
+            return sorted(row[0] for row in cursor.fetchall())
+        if connection.vendor == 'sqlite':
+            # Takes the database write lock, held until the batch commits
+            cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, %s) + %s WHERE name = %s', [floor - 1, count, table])
+            if not cursor.rowcount:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, floor - 1 + count])
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+            last = cursor.fetchone()[0]
+            return list(range(last - count + 1, last + 1))
+    raise NotSupportedError(f'Reserving ids is not supported on {connection.vendor}.')
+
+
+def can_reserve_ids():
+    """Whether reserve_ids() works on the database in use; commands check before importing."""
+    return connection.vendor in ('postgresql', 'sqlite')
+
+
+def checkpoint_line(name):
+    """The last line committed by the import checkpointed as ``name``, or 0."""
+    return ImportCheckpoint.objects.filter(name=name).values_list('line', flat=True).first() or 0
+
+
+class InvalidRow(ValueError):
+    def __init__(self, line_number, message):
+        super().__init__(f'line {line_number}: {message}')
+        self.line_number = line_number
+
+
+class RequestImporter:
+    """
+    Reads request records and inserts them with bulk_create, one transaction per batch.
+
+    Primary keys are reserved up front for each batch so comments can point at their
+    request without a round trip. With ``checkpoint``, the last line of each batch is
+    recorded under that name in the batch's transaction; see checkpoint_line().
+    """
+
+    def __init__(self, batch_size=1000, default_project=None, default_requester=None, dry_run=False, checkpoint=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.checkpoint = checkpoint
+        self.default_project = default_project
+        self.default_requester = default_requester
+        self.batches_committed = 0
+        self.requests_imported = 0
+        self.comments_imported = 0
+        self.companies = set()
+        self.event_days = set()
+
+        # name lookups, loaded once: (company name, project name) -> (pk, company id)
+        self.projects = {}
+        for pk, name, company_id, company_name in Project.objects.values_list('pk', 'name', 'company', 'company__name'):
+            self.projects.setdefault((None, name), (pk, company_id))
+            self.projects[(company_name, name)] = (pk, company_id)
+        self.users = {username: (pk, company_id)
+                      for pk, username, company_id in User.objects.values_list('pk', 'username', 'company')}
+
+    def parse_date(self, line_number, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise InvalidRow(line_number, f'invalid date {value!r}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def lookup_user(self, line_number, username):
+        if username not in self.users:
+            raise InvalidRow(line_number, f'unknown user {username!r}')
+        return self.users[username]
+
+    def build(self, line_number, record):
+        """Turn one record into an unsaved Request, its Comments and the timestamps to keep."""
+        subject = record.get('subject', record.get('title'))
+        if not subject:
+            raise InvalidRow(line_number, 'missing subject')
+        max_length = Request._meta.get_field('subject').max_length
+        if len(subject) > max_length:
+            raise InvalidRow(line_number, f'subject is longer than {max_length} characters')
+        status = record.get('status') or Request.Status.NEW
+        if status not in Request.Status.values:
+            raise InvalidRow(line_number, f'unknown status {status!r}')
+        request_type = record.get('request_type') or Request.RequestType.SERVICE_REQUEST
+        if request_type not in Request.RequestType.values:
+            raise InvalidRow(line_number, f'unknown request type {request_type!r}')
+
+        project_name = record.get('project') or self.default_project
+        project = self.projects.get((record.get('company'), project_name)) or self.projects.get((None, project_name))
+        if project is None:
+            raise InvalidRow(line_number, f'unknown project {project_name!r}')
+        requester_id, requester_company = self.lookup_user(line_number, record.get('requester') or self.default_requester)
+
+        request = Request(
+            subject=subject,
+            description=record.get('description', record.get('body', '')),
+            request_type=request_type,
+            status=status,
+            project_id=project[0],
+            requester_id=requester_id,
+            company_id=requester_company or project[1],
+            date_completed=self.parse_date(line_number, record.get('date_completed')),
+        )
+        submitted = self.parse_date(line_number, record.get('date_submitted'))
+        updated = self.parse_date(line_number, record.get('last_updated')) or submitted
+
+        comments = []
+        for item in record.get('comments') or ():
+            comment = Comment(author_id=self.lookup_user(line_number, item.get('author'))[0], text=item.get('text', ''))
+            comments.append((comment, self.parse_date(line_number, item.get('created_date'))))
+        return request, (submitted, updated), comments
+
+    def run(self, lines, skip=0, on_batch=None):
+        """
+        Import every JSON record in ``lines`` after the first ``skip`` lines.
+
+        ``on_batch(line_number)`` is called after each batch commits with the number of the
+        last line it contained, for progress reports.
+        """
+        def records():
+            for line_number, line in enumerate(lines, 1):
+                if line_number <= skip or not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as e:
+                    raise InvalidRow(line_number, f'invalid JSON ({e})')
+
+        self.import_records(records(), on_batch)
+
+    def import_records(self, records, on_batch=None):
+        """Import ``(line_number, record)`` pairs, as parsed from a file or built in memory."""
+        batch = []
+        line_number = 0
+        try:
+            for line_number, record in records:
+                batch.append(self.build(line_number, record))
+                if len(batch) >= self.batch_size:
+                    self.flush(batch, line_number, on_batch)
+                    batch = []
+            if batch:
+                self.flush(batch, line_number, on_batch)
+        finally:
+            # bulk_create skips the signals that maintain the dashboard counters and rollups
+            if self.companies:
+                rebuild_company_stats(self.companies)
+            if self.event_days:
+                analytics.rebuild_rollups(min(self.event_days), max(self.event_days))
+
+    def flush(self, batch, line_number, on_batch):
+        requests = [request for request, _, _ in batch]
+        comments = [comment for _, _, comment_rows in batch for comment, _ in comment_rows]
+        if not self.dry_run:
+            with transaction.atomic():
+                self.insert(batch, requests, comments)
+                if self.checkpoint:
+                    ImportCheckpoint.objects.update_or_create(name=self.checkpoint, defaults={'line': line_number})
+            self.batches_committed += 1
+            self.companies.update(request.company_id for request in requests if request.company_id)
+        self.requests_imported += len(requests)
+        self.comments_imported += len(comments)
+        if on_batch and not self.dry_run:
+            on_batch(line_number)
+
+    def insert(self, batch, requests, comments):
+        # Past archived rows too, so they can always be restored
+        first_request, first_comment = archive.next_ids()
+        request_ids = iter(reserve_ids(Request, len(requests), first_request))
+        comment_ids = iter(reserve_ids(Comment, len(comments), first_comment))
+        for request, _, comment_rows in batch:
+            request.pk = next(request_ids)
+            for comment, _ in comment_rows:
+                comment.pk = next(comment_ids)
+                comment.request_id = request.pk
+
+        # bulk_create sends no signals, so the comment counters are filled in here
+        now = timezone.now()
+        for request, (submitted, _), comment_rows in batch:
+            request.comment_count = len(comment_rows)
+            request.last_activity_at = max([submitted or now] + [created or now for _, created in comment_rows])
+
+        Request.objects.bulk_create(requests, batch_size=self.batch_size)
+        Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+
+        # bulk_create stamps auto_now/auto_now_add fields with the current time; put the
+        # historical timestamps back where the input had them
+        dated = []
+        for request, (submitted, updated), _ in batch:
+            if submitted:
+                request.date_submitted, request.last_updated = submitted, updated
+                dated.append(request)
+        if dated:
+            Request.objects.bulk_update(dated, ['date_submitted', 'last_updated'], batch_size=self.batch_size)
+        dated = []
+        for _, _, comment_rows in batch:
+            for comment, created in comment_rows:
+                if created:
+                    comment.created_date = created
+                    dated.append(comment)
+        if dated:
+            Comment.objects.bulk_update(dated, ['created_date'], batch_size=self.batch_size)
+
+        events = [event for request in requests for event in analytics.history_events(request)]
+        RequestStatusEvent.objects.bulk_create(events, batch_size=self.batch_size)
+        self.event_days.update(analytics.day_of(event.changed_at) for event in events)
+
+        search.index_many(requests, comments)
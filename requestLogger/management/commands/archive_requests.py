@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from requestLogger.archive import archive_closed
+
+
+class Command(BaseCommand):
+    help = ('Move requests closed more than --days ago, with their comments, to the archive tables. '
+            'Archived requests stay readable on their request page; restore_requests brings them back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive requests closed more than this many days ago (default: ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Requests moved per transaction.')
+
+    def handle(self, *args, **options):
+        def progress(requests, comments):
+            if options['verbosity'] > 1:
+                self.stderr.write(f'  {requests} requests, {comments} comments archived')
+
+        requests, comments = archive_closed(options['days'], options['batch_size'], on_batch=progress)
+        self.stdout.write(self.style.SUCCESS(f'Archived {requests} requests and {comments} comments.'))
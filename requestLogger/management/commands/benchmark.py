@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from requestLogger import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every URL in requestLogger.urls as a staff and a customer user and report '
+        'throughput, p50/p95/p99 latency and query counts. Save a run with --output and '
+        '--compare a later run against it to catch regressions. Run it against generate_data '
+        'output, not production: comment posts are included unless --read-only is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per URL and user.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per URL and user first.')
+        parser.add_argument('--read-only', action='store_true', help='Skip URLs that write (comment posts).')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='A previous --output file to check for regressions against.')
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help='p95 growth factor that counts as a regression (default 1.2).')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error if anything regressed.')
+        parser.add_argument('--fail-on-error', action='store_true',
+                            help='Exit with an error if any URL answered with a 4xx/5xx status.')
+
+    def handle(self, *args, **options):
+        if not benchmark.sample_users():
+            raise CommandError('No users to benchmark as; run generate_data first.')
+        report = benchmark.run(iterations=options['iterations'], warmup=options['warmup'], read_only=options['read_only'])
+
+        self.stdout.write(f'{"url":<32}{"status":>7}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}')
+        errors = []
+        for name, row in report['results'].items():
+            if row['error']:
+                errors.append(name)
+                self.stdout.write(self.style.ERROR(f'{name:<32}{row["status"]:>7}  not timed: the URL answered with an error'))
+                continue
+            latency = row['latency_ms']
+            self.stdout.write(
+                f'{name:<32}{row["status"]:>7}{row["throughput_rps"] or 0:>9.1f}'
+                f'{latency["p50"]:>9.1f}{latency["p95"]:>9.1f}{latency["p99"]:>9.1f}{row["queries"]["max"]:>9}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(report["results"])} results to {options["output"]}'))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = benchmark.compare(report, baseline, threshold=options['threshold'])
+            for name, measure, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'  {name}: {measure} {self.format(before)} -> {self.format(after)}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regressions against {options["compare"]}')
+
+        if errors and options['fail_on_error']:
+            raise CommandError(f'{len(errors)} URLs answered with an error: {", ".join(errors)}')
+
+    def format(self, value):
+        return f'{value:.1f}' if isinstance(value, float) else str(value)
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from requestLogger import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the storage CompressedTextField saves on the stored request descriptions and '
+        'comments against the time it adds to reading them, for several size thresholds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--thresholds', default=f'256,1024,{settings.COMPRESSED_TEXT_THRESHOLD},8192',
+                            help='Comma-separated thresholds in characters to compare.')
+        parser.add_argument('--sample', type=int, default=2000, help='Newest descriptions and comments to sample (each).')
+
+    def handle(self, *args, **options):
+        try:
+            thresholds = sorted({int(value) for value in options['thresholds'].split(',')})
+        except ValueError:
+            raise CommandError('--thresholds takes comma-separated whole numbers.')
+        report = benchmark.compression_report(thresholds, sample=options['sample'])
+        if not report['rows']:
+            raise CommandError('No text to sample; run generate_data first.')
+
+        self.stdout.write(f'{report["rows"]} texts, {report["plain_bytes"]} bytes plain')
+        self.stdout.write(f'{"threshold":>10}{"compressed":>12}{"stored":>12}{"saved %":>9}{"read us":>9}{"+read us":>10}')
+        for threshold, row in report['thresholds'].items():
+            self.stdout.write(
+                f'{threshold:>10}{row["compressed_rows"]:>12}{row["stored_bytes"]:>12}{row["saved_pct"]:>9.1f}'
+                f'{row["read_us_per_row"]:>9.2f}{row["extra_read_us_per_row"]:>10.2f}'
+            )
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from requestLogger import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure concurrent write throughput: several threads post comments at once, each '
+        'write treated as one request. With --baseline the run is repeated with the backend '
+        'defaults first (SQLite rollback journal, or a new PostgreSQL connection per request) '
+        'to show what the database profile in settings buys. Comments are really written, so '
+        'run it against generate_data output.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=100, help='Comments posted by each thread.')
+        parser.add_argument('--baseline', action='store_true', help='Also run with the backend defaults, first.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        runs = {}
+        try:
+            if options['baseline']:
+                with benchmark.untuned_database():
+                    runs['defaults'] = self.run(options)
+            runs['configured'] = self.run(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f'{"profile":<12}{"writes":>8}{"failed":>8}{"writes/s":>10}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+        for name, run in runs.items():
+            latency = run['latency_ms']
+            self.stdout.write(
+                f'{name:<12}{run["writes"]:>8}{run["failed"]:>8}{run["throughput_wps"] or 0:>10.1f}'
+                + ''.join(f'{latency[p] or 0:>9.1f}' for p in ('p50', 'p95', 'p99'))
+            )
+            self.stdout.write(f'    {run["database"]}')
+            for error in run['errors']:
+                self.stdout.write(self.style.ERROR(f'    {error}'))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(runs, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(runs)} runs to {options["output"]}'))
+
+    def run(self, options):
+        result = benchmark.run_writes(threads=options['threads'], writes=options['writes'])
+        result['database'] = benchmark.database_profile()
+        return result
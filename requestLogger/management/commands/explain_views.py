@@ -0,0 +1,82 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from requestLogger.models import Comment, Project, Request, User
+from requestLogger.views import OpenRequestListView, ProjectListView, RecentlyActiveRequestListView, RequestListView
+
+
+class Command(BaseCommand):
+    help = (
+        'Record the database query plan behind each list and detail view, for a staff and a '
+        'customer user. Run it before and after a schema change with --output, then --compare '
+        'the two files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write the plans to this JSON file.')
+        parser.add_argument('--compare', help='A previous --output file to diff the plans against.')
+
+    def handle(self, *args, **options):
+        plans = {}
+        for role, user in self.sample_users():
+            for name, queryset in self.view_queries(user):
+                plans[f'{name} ({role})'] = {
+                    'sql': str(queryset.query),
+                    'plan': queryset.explain().splitlines(),
+                }
+
+        if not plans:
+            raise CommandError('No users to explain queries for; create a staff and a customer user first.')
+
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)['plans']
+
+        for name, entry in plans.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            if name in previous and previous[name]['plan'] != entry['plan']:
+                for line in previous[name]['plan']:
+                    self.stdout.write(self.style.ERROR(f'  - {line}'))
+                for line in entry['plan']:
+                    self.stdout.write(self.style.SUCCESS(f'  + {line}'))
+            else:
+                for line in entry['plan']:
+                    self.stdout.write(f'    {line}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'vendor': connection.vendor, 'plans': plans}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(plans)} plans to {options["output"]}'))
+
+    def sample_users(self):
+        staff = User.objects.filter(role='staff').first()
+        customer = User.objects.filter(role='customer', company__isnull=False).first()
+        return [(role, user) for role, user in (('staff', staff), ('customer', customer)) if user]
+
+    def view_queries(self, user):
+        """The queries each view actually issues for ``user``, built from the views themselves."""
+        request = RequestFactory().get('/')
+        request.user = user
+        page_size = getattr(settings, 'LIST_PAGE_SIZE', 50)
+
+        def list_view_query(view_class):
+            view = view_class()
+            view.setup(request)
+            return view.get_queryset()
+
+        yield 'project_list', list_view_query(ProjectListView)
+        for name, view_class in (('request_list', RequestListView), ('request_list_open', OpenRequestListView),
+                                 ('request_list_active', RecentlyActiveRequestListView)):
+            ordering = ['-%s' % field for field in view_class.keyset_fields]
+            yield name, list_view_query(view_class).order_by(*ordering)[:page_size + 1]
+
+        project = list_view_query(ProjectListView).first() or Project(pk=0)
+        yield 'project_detail', Request.objects.filter(project=project)
+
+        sample = list_view_query(RequestListView).first() or Request(pk=0)
+        yield 'request_detail', Comment.objects.filter(request=sample).order_by('-created_date')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from requestLogger import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream requests to CSV or JSON lines, reading the table in fixed-size chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='jsonl')
+        parser.add_argument('--output', help='File to write to (default: stdout).')
+        parser.add_argument('--open', action='store_true', help='Only New and In Progress requests.')
+        parser.add_argument('--company', type=int, help='Only requests belonging to this company id.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset = exports.export_queryset(open_only=options['open'], company_id=options['company'])
+        lines = exports.export_lines(queryset, options['format'], chunk_size=options['chunk_size'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        written = 0
+        with open(options['output'], 'w', newline='') as out:
+            for line in lines:
+                out.write(line)
+                written += 1
+        if options['format'] == 'csv':
+            written -= 1  # header row
+        self.stderr.write(self.style.SUCCESS(f'Exported {written} requests to {options["output"]}'))
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from requestLogger.imports import can_reserve_ids
+from requestLogger.synthetic import DataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic companies, users, projects, requests and comments for load testing. '
+        'Volumes are Zipf-skewed across companies, projects and comment threads, and the same '
+        '--seed always produces the same data. Every generated user has the password given by --password.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=10)
+        parser.add_argument('--users', type=int, default=200, help='Customer users, spread over the companies.')
+        parser.add_argument('--staff', type=int, default=5)
+        parser.add_argument('--projects', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--days', type=int, default=365, help='How far back submission dates go.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='load', help='Prefix for generated names, so several data sets can coexist.')
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not can_reserve_ids():
+            raise CommandError(f'Generating data needs PostgreSQL or SQLite, to reserve ids; this database is {connection.vendor}.')
+        generator = DataGenerator(
+            companies=options['companies'], users=options['users'], staff=options['staff'],
+            projects=options['projects'], requests=options['requests'], comments=options['comments'],
+            days=options['days'], seed=options['seed'], prefix=options['prefix'],
+            password=options['password'], batch_size=options['batch_size'],
+        )
+        started = time.monotonic()
+
+        def on_batch(line_number):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {line_number} requests')
+
+        try:
+            importer = generator.generate(on_batch)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {options["companies"]} companies, {options["users"] + options["staff"]} users, '
+            f'{options["projects"]} projects, {importer.requests_imported} requests and '
+            f'{importer.comments_imported} comments in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from requestLogger.imports import InvalidRow, RequestImporter, can_reserve_ids, checkpoint_line
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import requests (and their comments) from a JSON lines file, in the layout '
+        'written by export_requests. Inserts are batched, one transaction per batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON lines file to import.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--project', help='Project name for records that do not give one.')
+        parser.add_argument('--requester', help='Username for records that do not give one.')
+        parser.add_argument('--checkpoint', help='Name (the file path, say) under which the last committed line is recorded in '
+                                                 'the database, with each batch; an interrupted import resumes from it.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and resolve every record without writing anything.')
+
+    def handle(self, *args, **options):
+        if not options['dry_run'] and not can_reserve_ids():
+            raise CommandError(f'Importing needs PostgreSQL or SQLite, to reserve ids; this database is {connection.vendor}.')
+        checkpoint = options['checkpoint']
+        skip = checkpoint_line(checkpoint) if checkpoint else 0
+        if skip:
+            self.stdout.write(f'Resuming after line {skip}')
+
+        importer = RequestImporter(
+            batch_size=options['batch_size'],
+            default_project=options['project'],
+            default_requester=options['requester'],
+            dry_run=options['dry_run'],
+            checkpoint=checkpoint,
+        )
+        started = time.monotonic()
+
+        def on_batch(line_number):
+            if options['verbosity'] > 1:
+                rate = importer.requests_imported / max(time.monotonic() - started, 1e-9)
+                self.stdout.write(f'  line {line_number}: {importer.requests_imported} requests ({rate:.0f} rows/sec)')
+
+        try:
+            with open(options['path']) as lines:
+                importer.run(lines, skip=skip, on_batch=on_batch)
+        except InvalidRow as e:
+            if options['dry_run']:
+                raise CommandError(str(e))
+            if checkpoint:
+                raise CommandError(f'{e} (batches before this line were committed; rerun with the same --checkpoint to resume)')
+            batches = importer.batches_committed
+            raise CommandError(
+                f'{e} ({batches} batch{"es" if batches != 1 else ""} with {importer.requests_imported} requests '
+                f'committed before this line; without --checkpoint a rerun imports them again)'
+            )
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {importer.requests_imported} requests and {importer.comments_imported} comments '
+            f'in {elapsed:.2f}s ({importer.requests_imported / elapsed:.0f} rows/sec)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from requestLogger.stats import rebuild_company_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-company dashboard counters from the Project and Request tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_ids', nargs='*', type=int, help='Only rebuild these companies (default: all).')
+
+    def handle(self, *args, **options):
+        count = rebuild_company_stats(options['company_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} companies.'))
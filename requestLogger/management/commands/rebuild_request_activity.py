@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from requestLogger.stats import rebuild_request_activity
+
+
+class Command(BaseCommand):
+    help = 'Recount comment_count and last_activity_at on requests from the Comment table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('request_ids', nargs='*', type=int, help='Only rebuild these requests (default: all).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Requests updated per statement (by id range).')
+
+    def handle(self, *args, **options):
+        count = rebuild_request_activity(
+            options['request_ids'] or None, batch_size=options['batch_size'],
+            on_batch=lambda updated: self.stdout.write(f'{updated} requests...') if options['verbosity'] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt activity for {count} requests.'))
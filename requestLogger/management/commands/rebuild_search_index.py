@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from requestLogger import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the Request and Comment tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            self.stdout.write('Full-text index is only used on SQLite; nothing to rebuild.')
+            return
+        requests, comments = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {requests} requests and {comments} comments.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from requestLogger.archive import restore_requests
+from requestLogger.models import ArchivedRequest
+
+
+class Command(BaseCommand):
+    help = 'Move archived requests and their comments back to the live tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('request_ids', nargs='*', type=int, help='Ids of the archived requests to restore.')
+        parser.add_argument('--project', type=int, help='Restore every archived request of this project id.')
+
+    def handle(self, *args, **options):
+        ids = list(options['request_ids'])
+        if options['project']:
+            ids += ArchivedRequest.objects.filter(project=options['project']).values_list('pk', flat=True)
+        if not ids:
+            raise CommandError('Give the ids of the requests to restore, or --project.')
+        requests, comments = restore_requests(ids)
+        self.stdout.write(self.style.SUCCESS(f'Restored {requests} requests and {comments} comments.'))
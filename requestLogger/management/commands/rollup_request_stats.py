@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from requestLogger.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the daily project and company request rollups behind the analytics page from '
+        'the status event log. The rollups are kept current as statuses change; run this after '
+        'changing REQUEST_SLA_HOURS or to repair a range of days.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD; default: the first event).')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD; default: the last event).')
+
+    def handle(self, *args, **options):
+        days = {}
+        for option in ('start', 'end'):
+            if options[option]:
+                days[option] = parse_date(options[option])
+                if days[option] is None:
+                    raise CommandError(f'Invalid --{option} date {options[option]!r}; use YYYY-MM-DD.')
+        written = rebuild_rollups(**days)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily rollup rows.'))
@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from requestLogger.tasks import Worker, purge_done, recover_stale, run_pending
+
+# How often the worker requeues stale tasks and purges finished ones, in seconds
+HOUSEKEEPING_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background tasks (search indexing, analytics rollups). Start as many '
+        'workers as needed; each claims its own tasks. Stops cleanly on SIGTERM/SIGINT after '
+        'the task in hand.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run everything that is due, then exit.')
+        parser.add_argument('--batch-size', type=int, default=10, help='Tasks claimed per poll.')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--name', help='Worker name recorded on claimed tasks (default: host:pid).')
+
+    def handle(self, *args, **options):
+        worker = Worker(name=options['name'], batch_size=options['batch_size'])
+        if options['once']:
+            recover_stale()
+            ran = run_pending(worker)
+            self.stdout.write(self.style.SUCCESS(f'Ran {ran} tasks.'))
+            return
+
+        self.stopping = False
+
+        def stop(signum, frame):
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(f'Worker {worker.name} waiting for tasks.')
+        housekept = 0
+        while not self.stopping:
+            # Long-running process: treat each poll like a request for connection handling
+            close_old_connections()
+            if time.monotonic() - housekept > HOUSEKEEPING_INTERVAL:
+                recover_stale()
+                purge_done()
+                housekept = time.monotonic()
+            if not worker.run_batch():
+                time.sleep(options['sleep'])
+        self.stdout.write(f'Worker {worker.name} stopped.')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from requestLogger.notifications import send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'Send every pending activity notification now, as one digest email per address. The '
+        'run_tasks worker does this on its own every NOTIFICATION_DIGEST_INTERVAL seconds while '
+        'there is activity; use this from cron when no worker runs, or to flush the queue.'
+    )
+
+    def handle(self, *args, **options):
+        sent = send_digests()
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} digest emails.'))
@@ -0,0 +1,31 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the SQLite primary database over the SQLite replicas in REPLICA_DATABASES, '
+            'to try read replica routing locally (run it again, or on a timer, to catch them up).')
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        replicas = [alias for alias in settings.REPLICA_DATABASES
+                    if settings.DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3']
+        if primary['ENGINE'] != 'django.db.backends.sqlite3' or not replicas:
+            raise CommandError('Needs an SQLite primary and at least one SQLite replica (SQLITE_REPLICAS).')
+
+        source = sqlite3.connect(str(primary['NAME']))
+        try:
+            for alias in replicas:
+                connections[alias].close()
+                target = sqlite3.connect(str(settings.DATABASES[alias]['NAME']))
+                try:
+                    # The online backup API copies a consistent snapshot while the primary stays writable
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(self.style.SUCCESS(f'Copied the primary to {alias} ({settings.DATABASES[alias]["NAME"]}).'))
+        finally:
+            source.close()
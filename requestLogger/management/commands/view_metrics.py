@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from requestLogger import metrics
+
+
+class Command(BaseCommand):
+    help = 'Show rolling p50/p95/p99 wall time, DB time, template time and query counts per view.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the raw report as JSON.')
+        parser.add_argument('--reset', action='store_true', help='Discard the collected samples afterwards.')
+
+    def handle(self, *args, **options):
+        report = metrics.summary()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif not report:
+            self.stdout.write('No samples yet. Metrics are shared between processes only with a cross-process cache (CACHE_DIR).')
+        else:
+            header = f'{"view":<24}{"count":>7}' + ''.join(f'{field + " p50/p95/p99":>30}' for field in metrics.FIELDS)
+            self.stdout.write(header)
+            for name, row in report.items():
+                cells = ''.join(
+                    f'{"/".join(self.format(row[field][p]) for p in ("p50", "p95", "p99")):>30}'
+                    for field in metrics.FIELDS
+                )
+                self.stdout.write(f'{name:<24}{row["count"]:>7}{cells}')
+        if options['reset']:
+            metrics.reset()
+
+    def format(self, value):
+        return f'{value:.1f}' if isinstance(value, float) else str(value)
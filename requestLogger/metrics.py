@@ -0,0 +1,123 @@
+"""
+Rolling per-view timing samples collected by QueryMetricsMiddleware.
+
+Each process keeps a window of its last METRICS_WINDOW samples per URL name and publishes
+it to the shared cache every METRICS_FLUSH_INTERVAL seconds, under a key only that process
+writes; reports add up the windows of every worker. Nothing is read-modified-written, so
+workers flushing at the same time can't drop each other's samples. With a cross-process
+cache (CACHE_DIR) the staff report and the view_metrics command see every worker; with the
+local-memory cache only the current process.
+"""
+import math
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Order of the values in a sample tuple
+FIELDS = ('wall_ms', 'db_ms', 'template_ms', 'queries')
+WORKERS_KEY = 'metrics:workers'
+GENERATION_KEY = 'metrics:generation'
+# A worker's windows outlive it by this long, in seconds
+WORKER_TTL = 24 * 60 * 60
+
+_lock = threading.Lock()
+_pending = defaultdict(list)
+_windows = {}
+_generation = None
+_last_flush = time.monotonic()
+
+
+def worker_id():
+    # Worked out at each flush, so forked workers don't share their parent's id
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _key(worker):
+    return f'metrics:worker:{worker}'
+
+
+def record(name, wall_ms, db_ms, template_ms, queries):
+    global _last_flush
+    with _lock:
+        _pending[name].append((wall_ms, db_ms, template_ms, queries))
+        due = time.monotonic() - _last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+    if due:
+        flush()
+
+
+def flush():
+    """Add this process's buffered samples to its windows and publish them."""
+    global _generation, _last_flush
+    window = getattr(settings, 'METRICS_WINDOW', 1000)
+    generation = cache.get(GENERATION_KEY)
+    with _lock:
+        if generation != _generation:
+            # reset() ran (perhaps in another process): start the windows afresh
+            _windows.clear()
+            _generation = generation
+        for name, samples in _pending.items():
+            _windows[name] = (_windows.get(name, []) + samples)[-window:]
+        changed = bool(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+        windows = dict(_windows)
+    if not changed:
+        return
+    worker = worker_id()
+    cache.set(_key(worker), windows, timeout=WORKER_TTL)
+    # Checked on every flush, so a registration lost to a concurrent one comes back
+    workers = cache.get(WORKERS_KEY, set())
+    if worker not in workers:
+        cache.set(WORKERS_KEY, workers | {worker}, timeout=None)
+
+
+def reset():
+    global _generation
+    with _lock:
+        _pending.clear()
+        _windows.clear()
+        _generation = time.time_ns()
+    cache.set(GENERATION_KEY, _generation, timeout=None)
+    cache.delete_many([_key(worker) for worker in cache.get(WORKERS_KEY, set())])
+    cache.delete(WORKERS_KEY)
+
+
+def collect():
+    """Every worker's samples, by URL name."""
+    samples = defaultdict(list)
+    for windows in cache.get_many([_key(worker) for worker in cache.get(WORKERS_KEY, set())]).values():
+        for name, window in windows.items():
+            samples[name].extend(window)
+    return samples
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # nearest-rank method
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarise(samples):
+    """``{'count': n, 'wall_ms': {'p50': ..., 'p95': ..., 'p99': ...}, ...}`` for a list of samples."""
+    report = {'count': len(samples)}
+    for i, field in enumerate(FIELDS):
+        values = sorted(sample[i] for sample in samples)
+        report[field] = {
+            'p50': percentile(values, 0.50),
+            'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99),
+        }
+    return report
+
+
+def summary():
+    """Percentiles for every URL name that has samples, slowest p95 first."""
+    flush()
+    report = {name: summarise(samples) for name, samples in collect().items() if samples}
+    return dict(sorted(report.items(), key=lambda item: item[1]['wall_ms']['p95'], reverse=True))
@@ -0,0 +1,91 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+
+
+class QueryTimer:
+    """Database execute wrapper that counts queries and adds up their time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+class QueryMetricsMiddleware:
+    """
+    Measure query count, DB time, template render time and wall time for every request.
+
+    The numbers are sent back in a Server-Timing header (plus X-Query-Count) and recorded
+    against the resolved URL name for the rolling percentiles in requestLogger.metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        request.query_timer = timer
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        wall = time.perf_counter() - start
+
+        response['Server-Timing'] = (
+            f'db;dur={timer.db_time * 1000:.1f};desc="{timer.queries} queries", '
+            f'tpl;dur={timer.template_time * 1000:.1f}, '
+            f'total;dur={wall * 1000:.1f}'
+        )
+        response['X-Query-Count'] = str(timer.queries)
+
+        match = getattr(request, 'resolver_match', None)
+        name = (match.url_name or match.view_name) if match else 'unresolved'
+        metrics.record(name, wall * 1000, timer.db_time * 1000, timer.template_time * 1000, timer.queries)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called just before a TemplateResponse is rendered; the callback fires once it is
+        timer = getattr(request, 'query_timer', None)
+        if timer is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                timer.template_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Keep a user's reads on the primary database for REPLICA_PIN_SECONDS after a request of
+    theirs wrote to it, so they never see a replica that hasn't caught up with their change
+    (see routers.py). Goes before SessionMiddleware, whose session saves count as writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not routers.replica_aliases():
+            return self.get_response(request)
+        with routers.routing_state(pinned=routers.PIN_COOKIE in request.COOKIES) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            response.set_cookie(routers.PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
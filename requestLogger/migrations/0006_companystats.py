@@ -0,0 +1,37 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0005_alter_request_status_comment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompanyStats",
+            fields=[
+                (
+                    "company",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="requestLogger.company",
+                    ),
+                ),
+                ("project_count", models.IntegerField(default=0)),
+                ("new_count", models.IntegerField(default=0)),
+                ("in_progress_count", models.IntegerField(default=0)),
+                ("resolved_count", models.IntegerField(default=0)),
+                ("rejected_count", models.IntegerField(default=0)),
+                ("cancelled_count", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "company stats",
+            },
+        ),
+    ]
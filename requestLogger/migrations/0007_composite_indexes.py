@@ -0,0 +1,42 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0006_companystats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["request", "created_date"], name="comment_request_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["owner", "status"], name="project_owner_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["status", "date_submitted"], name="request_status_submitted_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["project", "status"], name="request_project_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["date_submitted", "id"], name="request_submitted_id_idx"
+            ),
+        ),
+    ]
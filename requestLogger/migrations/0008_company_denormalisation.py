@@ -0,0 +1,52 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0007_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="company",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="projects",
+                to="requestLogger.company",
+            ),
+        ),
+        migrations.AddField(
+            model_name="request",
+            name="company",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="requests",
+                to="requestLogger.company",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["company", "date_submitted", "id"],
+                name="request_company_submitted_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["company", "status", "date_submitted"],
+                name="request_company_status_idx",
+            ),
+        ),
+    ]
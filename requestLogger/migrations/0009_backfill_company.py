@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def in_batches(queryset):
+    """Yield pk-range slices of ``queryset`` so each UPDATE touches at most BATCH_SIZE rows."""
+    last = queryset.aggregate(last=Max("pk"))["last"] or 0
+    for start in range(0, last + 1, BATCH_SIZE):
+        yield queryset.filter(pk__gte=start, pk__lt=start + BATCH_SIZE)
+
+
+def backfill_company(apps, schema_editor):
+    User = apps.get_model("requestLogger", "User")
+    Project = apps.get_model("requestLogger", "Project")
+    Request = apps.get_model("requestLogger", "Request")
+
+    owner_company = User.objects.filter(pk=OuterRef("owner")).values("company")[:1]
+    for batch in in_batches(Project.objects.all()):
+        batch.update(company=Subquery(owner_company))
+
+    requester_company = User.objects.filter(pk=OuterRef("requester")).values("company")[:1]
+    project_company = Project.objects.filter(pk=OuterRef("project")).values("company")[:1]
+    for batch in in_batches(Request.objects.all()):
+        batch.update(company=Coalesce(Subquery(requester_company), Subquery(project_company)))
+
+
+class Migration(migrations.Migration):
+    # Commit each batch separately rather than holding one long write lock
+    atomic = False
+
+    dependencies = [
+        ("requestLogger", "0008_company_denormalisation"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_company, migrations.RunPython.noop),
+    ]
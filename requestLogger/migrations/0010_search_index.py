@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends use the LIKE fallback in requestLogger.search
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS requestLogger_request_fts "
+        "USING fts5(subject, description, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS requestLogger_comment_fts "
+        "USING fts5(text, request_id UNINDEXED, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        "INSERT INTO requestLogger_request_fts (rowid, subject, description) "
+        'SELECT id, subject, description FROM "requestLogger_request"'
+    )
+    schema_editor.execute(
+        "INSERT INTO requestLogger_comment_fts (rowid, text, request_id) "
+        'SELECT id, text, request_id FROM "requestLogger_comment"'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS requestLogger_request_fts")
+    schema_editor.execute("DROP TABLE IF EXISTS requestLogger_comment_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0009_backfill_company"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,179 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0010_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestStatusEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "from_status",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("New", "New"),
+                            ("In Progress", "In Progress"),
+                            ("Resolved", "Resolved"),
+                            ("Rejected", "Rejected"),
+                            ("Cancelled", "Cancelled"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "to_status",
+                    models.CharField(
+                        choices=[
+                            ("New", "New"),
+                            ("In Progress", "In Progress"),
+                            ("Resolved", "Resolved"),
+                            ("Rejected", "Rejected"),
+                            ("Cancelled", "Cancelled"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("changed_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "resolution_seconds",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                (
+                    "company",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="requestLogger.company",
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="requestLogger.project",
+                    ),
+                ),
+                (
+                    "request",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="status_events",
+                        to="requestLogger.request",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ProjectDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("opened", models.PositiveIntegerField(default=0)),
+                ("resolved", models.PositiveIntegerField(default=0)),
+                ("rejected", models.PositiveIntegerField(default=0)),
+                ("resolved_within_sla", models.PositiveIntegerField(default=0)),
+                ("resolution_seconds_total", models.BigIntegerField(default=0)),
+                (
+                    "resolution_p90_seconds",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                ("resolution_histogram", models.JSONField(default=list)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_rollups",
+                        to="requestLogger.project",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CompanyDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("opened", models.PositiveIntegerField(default=0)),
+                ("resolved", models.PositiveIntegerField(default=0)),
+                ("rejected", models.PositiveIntegerField(default=0)),
+                ("resolved_within_sla", models.PositiveIntegerField(default=0)),
+                ("resolution_seconds_total", models.BigIntegerField(default=0)),
+                (
+                    "resolution_p90_seconds",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                ("resolution_histogram", models.JSONField(default=list)),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_rollups",
+                        to="requestLogger.company",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="requeststatusevent",
+            index=models.Index(
+                fields=["project", "changed_at"], name="status_event_project_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="requeststatusevent",
+            index=models.Index(
+                fields=["company", "changed_at"], name="status_event_company_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="requeststatusevent",
+            index=models.Index(fields=["changed_at"], name="status_event_changed_idx"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="projectdailyrollup",
+            unique_together={("project", "day")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="companydailyrollup",
+            unique_together={("company", "day")},
+        ),
+    ]
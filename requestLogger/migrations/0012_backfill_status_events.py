@@ -0,0 +1,141 @@
+import bisect
+import math
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+CLOSED_STATUSES = ("Resolved", "Rejected", "Cancelled")
+# Same buckets as analytics.HISTOGRAM_BOUNDS when this migration was written
+HISTOGRAM_BOUNDS = [3600 * 2**i for i in range(13)]
+
+
+def backfill_events(apps, schema_editor):
+    """An opening event per existing request, plus a closing one where it has a completion date."""
+    Request = apps.get_model("requestLogger", "Request")
+    RequestStatusEvent = apps.get_model("requestLogger", "RequestStatusEvent")
+
+    def event(request, from_status, to_status, changed_at):
+        resolution = None
+        if to_status == "Resolved":
+            resolution = max(
+                0, int((changed_at - request.date_submitted).total_seconds())
+            )
+        return RequestStatusEvent(
+            request_id=request.pk,
+            project_id=request.project_id,
+            company_id=request.company_id,
+            from_status=from_status,
+            to_status=to_status,
+            changed_at=changed_at,
+            resolution_seconds=resolution,
+        )
+
+    events = []
+    for request in Request.objects.order_by("pk").iterator(chunk_size=BATCH_SIZE):
+        if request.status in CLOSED_STATUSES and request.date_completed:
+            events.append(event(request, "", "New", request.date_submitted))
+            events.append(event(request, "New", request.status, request.date_completed))
+        else:
+            events.append(event(request, "", request.status, request.date_submitted))
+        if len(events) >= BATCH_SIZE:
+            RequestStatusEvent.objects.bulk_create(events)
+            events = []
+    RequestStatusEvent.objects.bulk_create(events)
+
+
+def summarise(rows):
+    values = dict(
+        opened=0,
+        resolved=0,
+        rejected=0,
+        resolved_within_sla=0,
+        resolution_seconds_total=0,
+    )
+    histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    resolutions = []
+    sla = getattr(settings, "REQUEST_SLA_HOURS", 72) * 3600
+    for from_status, to_status, seconds in rows:
+        values["opened"] += not from_status
+        values["rejected"] += to_status == "Rejected"
+        if to_status == "Resolved":
+            values["resolved"] += 1
+            if seconds is not None:
+                resolutions.append(seconds)
+                values["resolution_seconds_total"] += seconds
+                values["resolved_within_sla"] += seconds <= sla
+                histogram[bisect.bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+    resolutions.sort()
+    values["resolution_p90_seconds"] = (
+        resolutions[max(0, math.ceil(0.9 * len(resolutions)) - 1)]
+        if resolutions
+        else None
+    )
+    values["resolution_histogram"] = histogram
+    return values
+
+
+def build_rollups(apps, schema_editor):
+    """Daily rollups from the backfilled events, one day in memory at a time."""
+    RequestStatusEvent = apps.get_model("requestLogger", "RequestStatusEvent")
+    ProjectDailyRollup = apps.get_model("requestLogger", "ProjectDailyRollup")
+    CompanyDailyRollup = apps.get_model("requestLogger", "CompanyDailyRollup")
+
+    def flush(day, projects, companies):
+        ProjectDailyRollup.objects.bulk_create(
+            [
+                ProjectDailyRollup(project_id=key, day=day, **summarise(rows))
+                for key, rows in projects.items()
+            ],
+            batch_size=500,
+        )
+        CompanyDailyRollup.objects.bulk_create(
+            [
+                CompanyDailyRollup(company_id=key, day=day, **summarise(rows))
+                for key, rows in companies.items()
+            ],
+            batch_size=500,
+        )
+
+    day, projects, companies = None, {}, {}
+    rows = RequestStatusEvent.objects.order_by("changed_at").values_list(
+        "project",
+        "company",
+        "changed_at",
+        "from_status",
+        "to_status",
+        "resolution_seconds",
+    )
+    for project_id, company_id, changed_at, *row in rows.iterator(chunk_size=5000):
+        event_day = (
+            timezone.localtime(changed_at).date()
+            if settings.USE_TZ
+            else changed_at.date()
+        )
+        if event_day != day:
+            if day is not None:
+                flush(day, projects, companies)
+            day, projects, companies = event_day, {}, {}
+        projects.setdefault(project_id, []).append(row)
+        if company_id is not None:
+            companies.setdefault(company_id, []).append(row)
+    if day is not None:
+        flush(day, projects, companies)
+
+
+def remove_rollups(apps, schema_editor):
+    apps.get_model("requestLogger", "ProjectDailyRollup").objects.all().delete()
+    apps.get_model("requestLogger", "CompanyDailyRollup").objects.all().delete()
+    apps.get_model("requestLogger", "RequestStatusEvent").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0011_status_events_and_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+        migrations.RunPython(build_rollups, remove_rollups),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.5 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0014_notifications"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["request", "created_date", "id"],
+                name="comment_request_thread_idx",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="comment",
+            name="comment_request_created_idx",
+        ),
+    ]
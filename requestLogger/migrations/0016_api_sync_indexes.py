@@ -0,0 +1,31 @@
+# Generated by Django 3.2.5 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0015_comment_thread_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["created_date", "id"], name="comment_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["last_updated", "id"], name="request_updated_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["company", "last_updated", "id"],
+                name="request_company_updated_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 3.2.5 on 2026-10-18 11:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0016_api_sync_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedRequest",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("subject", models.CharField(max_length=100)),
+                (
+                    "request_type",
+                    models.CharField(
+                        choices=[
+                            ("Change", "Change"),
+                            ("Service Request", "Service Request"),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                ("description", models.TextField()),
+                ("date_submitted", models.DateTimeField()),
+                ("last_updated", models.DateTimeField()),
+                ("date_completed", models.DateTimeField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("New", "New"),
+                            ("In Progress", "In Progress"),
+                            ("Resolved", "Resolved"),
+                            ("Rejected", "Rejected"),
+                            ("Cancelled", "Cancelled"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "company",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_requests",
+                        to="requestLogger.company",
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_requests",
+                        to="requestLogger.project",
+                    ),
+                ),
+                (
+                    "requester",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_requests",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedComment",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("text", models.TextField()),
+                ("created_date", models.DateTimeField()),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "request",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="comments",
+                        to="requestLogger.archivedrequest",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="archivedcomment",
+            index=models.Index(
+                fields=["request", "created_date", "id"],
+                name="archived_comment_thread_idx",
+            ),
+        ),
+    ]
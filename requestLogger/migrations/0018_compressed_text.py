@@ -0,0 +1,84 @@
+from django.db import migrations, models
+from django.db.models import Max, Value
+from django.db.models.functions import Length
+
+import requestLogger.fields
+
+BATCH_SIZE = 1000
+
+# (model, field) pairs stored with CompressedTextField
+COMPRESSED_FIELDS = [
+    ("Request", "description"),
+    ("Comment", "text"),
+    ("ArchivedRequest", "description"),
+    ("ArchivedComment", "text"),
+]
+
+
+def in_batches(queryset):
+    """Yield pk-range slices of ``queryset`` so each UPDATE touches at most BATCH_SIZE rows."""
+    last = queryset.aggregate(last=Max("pk"))["last"] or 0
+    for start in range(0, last + 1, BATCH_SIZE):
+        yield queryset.filter(pk__gte=start, pk__lt=start + BATCH_SIZE)
+
+
+def compress_existing(apps, schema_editor):
+    for model_name, field_name in COMPRESSED_FIELDS:
+        Model = apps.get_model("requestLogger", model_name)
+        threshold = Model._meta.get_field(field_name).get_threshold()
+        long_rows = Model.objects.annotate(stored_length=Length(field_name)).filter(stored_length__gte=threshold)
+        for batch in in_batches(long_rows):
+            # Loading expands any already compressed text; saving compresses it all
+            rows = list(batch.only("pk", field_name))
+            if rows:
+                Model.objects.bulk_update(rows, [field_name])
+
+
+def expand_existing(apps, schema_editor):
+    marker = requestLogger.fields.COMPRESSED_MARKER
+    for model_name, field_name in COMPRESSED_FIELDS:
+        Model = apps.get_model("requestLogger", model_name)
+        compressed = Model.objects.filter(**{f"{field_name}__startswith": marker})
+        for batch in in_batches(compressed):
+            for row in batch.only("pk", field_name):
+                # A plain TextField value, so it is written as given
+                text = Value(getattr(row, field_name), output_field=models.TextField())
+                Model.objects.filter(pk=row.pk).update(**{field_name: text})
+
+
+class Migration(migrations.Migration):
+    # Commit each batch separately rather than holding one long write lock
+    atomic = False
+
+    dependencies = [
+        ("requestLogger", "0017_request_archive"),
+    ]
+
+    operations = [
+        # Still a text column, so only the state changes; no table rebuild on SQLite
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="archivedcomment",
+                    name="text",
+                    field=requestLogger.fields.CompressedTextField(threshold=0),
+                ),
+                migrations.AlterField(
+                    model_name="archivedrequest",
+                    name="description",
+                    field=requestLogger.fields.CompressedTextField(threshold=0),
+                ),
+                migrations.AlterField(
+                    model_name="comment",
+                    name="text",
+                    field=requestLogger.fields.CompressedTextField(),
+                ),
+                migrations.AlterField(
+                    model_name="request",
+                    name="description",
+                    field=requestLogger.fields.CompressedTextField(),
+                ),
+            ],
+        ),
+        migrations.RunPython(compress_existing, expand_existing),
+    ]
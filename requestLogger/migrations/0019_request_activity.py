@@ -0,0 +1,82 @@
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+import django.utils.timezone
+
+BATCH_SIZE = 1000
+
+
+def fill_activity(apps, schema_editor):
+    # Same values as stats.rebuild_request_activity(), for live and archived requests
+    for request_model, comment_model in [
+        ("Request", "Comment"),
+        ("ArchivedRequest", "ArchivedComment"),
+    ]:
+        Model = apps.get_model("requestLogger", request_model)
+        comments = (
+            apps.get_model("requestLogger", comment_model)
+            .objects.filter(request=OuterRef("pk"))
+            .order_by()
+            .values("request")
+        )
+        count = comments.annotate(total=Count("pk")).values("total")
+        newest = comments.annotate(newest=Max("created_date")).values("newest")
+        last = Model.objects.aggregate(last=Max("pk"))["last"] or 0
+        for start in range(0, last + 1, BATCH_SIZE):
+            Model.objects.filter(pk__gte=start, pk__lt=start + BATCH_SIZE).update(
+                comment_count=Coalesce(
+                    Subquery(count, output_field=models.IntegerField()), 0
+                ),
+                last_activity_at=Greatest(
+                    "date_submitted",
+                    Coalesce(
+                        Subquery(newest, output_field=models.DateTimeField()),
+                        "date_submitted",
+                    ),
+                ),
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("requestLogger", "0018_compressed_text"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedrequest",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="archivedrequest",
+            name="last_activity_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name="request",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="request",
+            name="last_activity_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.RunPython(fill_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["last_activity_at", "id"], name="request_activity_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["company", "last_activity_at", "id"],
+                name="request_company_activity_idx",
+            ),
+        ),
+    ]
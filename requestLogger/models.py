@@ -4,6 +4,10 @@ from django.utils.translation import gettext as _
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
+from django.utils import timezone
+
+from .fields import CompressedTextField
+from .tenancy import CommentQuerySet, TenantQuerySet
 
 
 class Company(models.Model):
@@ -39,6 +43,8 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
     version = models.CharField(max_length=50)
+    # Copy of owner.company, so tenant filters don't need to join through User
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='projects', null=True, blank=True, editable=False)
 
     class Status(models.TextChoices):
         ACTIVE = 'Active', _('Active')
@@ -47,6 +53,17 @@ class Project(models.Model):
     
     status = models.CharField(max_length=50, choices=Status.choices, default=Status.ACTIVE,)
 
+    objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'status'], name='project_owner_status_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.company_id = self.owner.company_id
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('project_detail', args=[str(self.id)])
 
@@ -65,10 +82,19 @@ class Request(models.Model):
     request_type = models.CharField(max_length=15, choices=RequestType.choices, default=RequestType.SERVICE_REQUEST)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='requests')
     requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name='requests')
-    description = models.TextField()
+    # Pasted logs and stack traces can run long; stored compressed past a size threshold
+    description = CompressedTextField()
     date_submitted = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
     date_completed = models.DateTimeField(null=True, blank=True)
+    # The requester's company (or the project's, for requests raised by staff), so tenant
+    # filters don't need to join through User. Indexed by the composite indexes below.
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='requests', null=True, blank=True, editable=False, db_index=False)
+    # Kept by the Comment signals (stats.py) so lists can show and sort by activity without
+    # aggregating comments: the number of comments, and when the request was submitted or
+    # last commented on, whichever is later
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
     class Status(models.TextChoices):
         NEW = 'New', _('New')
         IN_PROGRESS = 'In Progress', _('In Progress')
@@ -82,6 +108,45 @@ class Request(models.Model):
         default=Status.NEW,
     )
 
+    # Statuses shown on the open requests list
+    OPEN_STATUSES = (Status.NEW, Status.IN_PROGRESS)
+    CLOSED_STATUSES = (Status.RESOLVED, Status.REJECTED, Status.CANCELLED)
+
+    objects = TenantQuerySet.as_manager()
+
+    # Long-closed requests are moved to ArchivedRequest (archive.py)
+    is_archived = False
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'date_submitted'], name='request_status_submitted_idx'),
+            models.Index(fields=['project', 'status'], name='request_project_status_idx'),
+            # Keyset pagination order used by the request list views
+            models.Index(fields=['date_submitted', 'id'], name='request_submitted_id_idx'),
+            # Tenant-scoped list and open-list pages
+            models.Index(fields=['company', 'date_submitted', 'id'], name='request_company_submitted_idx'),
+            models.Index(fields=['company', 'status', 'date_submitted'], name='request_company_status_idx'),
+            # Most recently updated first, for API clients syncing changes (api.py)
+            models.Index(fields=['last_updated', 'id'], name='request_updated_id_idx'),
+            models.Index(fields=['company', 'last_updated', 'id'], name='request_company_updated_idx'),
+            # Most recently active first, for the recently active list
+            models.Index(fields=['last_activity_at', 'id'], name='request_activity_id_idx'),
+            models.Index(fields=['company', 'last_activity_at', 'id'], name='request_company_activity_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.company_id = self.requester.company_id or self.project.company_id
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The Comment signals keep comment_count and last_activity_at with update(); an
+            # instance loaded before a comment came in would otherwise write its old values back
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and field.name not in ('comment_count', 'last_activity_at')
+            ]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('request_detail', args=[str(self.id)])
 
@@ -91,5 +156,232 @@ class Request(models.Model):
 class Comment(models.Model):
     request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
-    text = models.TextField()
-    created_date = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    text = CompressedTextField()
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # The paginated thread on the request page: one request's comments, newest first
+            models.Index(fields=['request', 'created_date', 'id'], name='comment_request_thread_idx'),
+            # Every thread's comments, newest first, for the API comment list
+            models.Index(fields=['created_date', 'id'], name='comment_created_id_idx'),
+        ]
+
+
+class ArchivedRequest(models.Model):
+    """
+    A request closed long ago, moved out of the Request table by archive.py with its id
+    and columns unchanged. Read-only: archive.restore_requests() moves it back to be changed.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    subject = models.CharField(max_length=100)
+    request_type = models.CharField(max_length=15, choices=Request.RequestType.choices)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='archived_requests')
+    requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_requests')
+    # Rarely read, so compressed whenever that saves space
+    description = CompressedTextField(threshold=0)
+    date_submitted = models.DateTimeField()
+    last_updated = models.DateTimeField()
+    date_completed = models.DateTimeField(null=True, blank=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='archived_requests', null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Request.Status.choices)
+    comment_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    objects = TenantQuerySet.as_manager()
+
+    is_archived = True
+
+    def get_absolute_url(self):
+        return reverse('request_detail', args=[str(self.id)])
+
+    def __str__(self):
+        return f'{self.request_type} for {self.project} by {self.requester}'
+
+
+class ArchivedComment(models.Model):
+    """A comment of an ArchivedRequest, with its id and columns unchanged."""
+    id = models.BigIntegerField(primary_key=True)
+    request = models.ForeignKey(ArchivedRequest, on_delete=models.CASCADE, related_name='comments')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    text = CompressedTextField(threshold=0)
+    created_date = models.DateTimeField()
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['request', 'created_date', 'id'], name='archived_comment_thread_idx'),
+        ]
+
+class CompanyStats(models.Model):
+    """
+    Denormalised dashboard counters for a company, one row per company.
+
+    Kept current incrementally by the signal handlers in signals.py and rebuilt from
+    scratch by the rebuild_company_stats management command.
+    """
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    project_count = models.IntegerField(default=0)
+    new_count = models.IntegerField(default=0)
+    in_progress_count = models.IntegerField(default=0)
+    resolved_count = models.IntegerField(default=0)
+    rejected_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+
+    # Maps each Request.Status to the counter column that tracks it
+    STATUS_FIELDS = {
+        Request.Status.NEW: 'new_count',
+        Request.Status.IN_PROGRESS: 'in_progress_count',
+        Request.Status.RESOLVED: 'resolved_count',
+        Request.Status.REJECTED: 'rejected_count',
+        Request.Status.CANCELLED: 'cancelled_count',
+    }
+
+    class Meta:
+        verbose_name_plural = 'company stats'
+
+    def __str__(self):
+        return f'Stats for {self.company_id}'
+
+
+class RequestStatusEvent(models.Model):
+    """
+    One row per change of Request.status, including the initial status on creation
+    (``from_status`` blank). Written by signals.py and by bulk imports, never updated.
+
+    The request, project and company are plain references without database constraints,
+    so the history outlives deleted requests; the project and company are copied so the
+    rollups in analytics.py never join.
+    """
+    request = models.ForeignKey(Request, on_delete=models.DO_NOTHING, db_constraint=False, related_name='status_events')
+    project = models.ForeignKey(Project, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    company = models.ForeignKey(Company, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', null=True, blank=True)
+    from_status = models.CharField(max_length=20, choices=Request.Status.choices, blank=True)
+    to_status = models.CharField(max_length=20, choices=Request.Status.choices)
+    changed_at = models.DateTimeField(default=timezone.now)
+    # Seconds from submission, on transitions to Resolved
+    resolution_seconds = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'changed_at'], name='status_event_project_idx'),
+            models.Index(fields=['company', 'changed_at'], name='status_event_company_idx'),
+            models.Index(fields=['changed_at'], name='status_event_changed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.request_id}: {self.from_status or "created"} -> {self.to_status}'
+
+
+class DailyRollup(models.Model):
+    """Request lifecycle totals for one day, built from RequestStatusEvent by analytics.py."""
+    day = models.DateField()
+    opened = models.PositiveIntegerField(default=0)
+    resolved = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    resolved_within_sla = models.PositiveIntegerField(default=0)
+    resolution_seconds_total = models.BigIntegerField(default=0)
+    resolution_p90_seconds = models.PositiveIntegerField(null=True, blank=True)
+    # Resolution counts per analytics.HISTOGRAM_BOUNDS bucket, so percentiles can be
+    # estimated over any range of days without going back to the events
+    resolution_histogram = models.JSONField(default=list)
+
+    class Meta:
+        abstract = True
+
+
+class ProjectDailyRollup(DailyRollup):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='daily_rollups')
+
+    class Meta:
+        unique_together = [('project', 'day')]
+
+
+class CompanyDailyRollup(DailyRollup):
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='daily_rollups')
+
+    class Meta:
+        unique_together = [('company', 'day')]
+
+
+class ImportCheckpoint(models.Model):
+    """
+    The last input line committed by a named import (imports.RequestImporter), written in the
+    same transaction as the batch so a resumed import never skips or repeats rows.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    line = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: line {self.line}'
+
+
+class Task(models.Model):
+    """
+    A unit of background work for the run_tasks worker; see tasks.py.
+
+    ``key`` is an optional idempotency key: while a task with a given key is still queued,
+    enqueueing another with the same key is a no-op, since the queued one will see the
+    latest data when it runs.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('Queued')
+        RUNNING = 'running', _('Running')
+        DONE = 'done', _('Done')
+        DEAD = 'dead', _('Dead')
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's poll: due tasks, oldest first
+            models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='queued'), name='task_queued_key_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+class Notification(models.Model):
+    """
+    One line of a recipient's next email digest, written by the notification tasks and
+    marked sent by notifications.send_digests(); see notifications.py.
+    """
+    class Kind(models.TextChoices):
+        STATUS = 'status', _('Status change')
+        COMMENT = 'comment', _('Comment')
+
+    email = models.EmailField()
+    request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    message = models.CharField(max_length=300)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The digest run only ever reads unsent rows
+            models.Index(fields=['email', 'created_at'], condition=models.Q(sent_at__isnull=True), name='notification_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.email}: {self.message}'
@@ -0,0 +1,115 @@
+"""
+Email digests of request activity.
+
+Status changes and new comments queue a task that writes one Notification row per
+interested address: the requester, the project owner, the company's contact address and
+staff who have commented on the request, minus the author of a new comment. The first
+notification also queues a digest run NOTIFICATION_DIGEST_INTERVAL seconds later (one
+run covers everything queued until then); it sends one email per address listing all its
+pending notifications, over a single SMTP connection.
+"""
+import logging
+import smtplib
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from .models import Comment, Notification, Request, User
+from .tasks import enqueue, task
+
+logger = logging.getLogger(__name__)
+
+
+def recipients(request, exclude_user_id=None):
+    """Addresses to notify about activity on ``request``, without the one of ``exclude_user_id``."""
+    users = {request.requester_id, request.project.owner_id}
+    users.update(Comment.objects.filter(request=request, author__role='staff').values_list('author', flat=True))
+    users.discard(exclude_user_id)
+    emails = set(User.objects.filter(pk__in=users, is_active=True).values_list('email', flat=True))
+    if request.company_id:
+        emails.add(request.company.contact_email)
+    excluded = User.objects.filter(pk=exclude_user_id).values_list('email', flat=True).first()
+    return sorted({email.lower() for email in emails if email} - {(excluded or '').lower()})
+
+
+def notify(request, kind, message, exclude_user_id=None):
+    Notification.objects.bulk_create([
+        Notification(email=email, request=request, kind=kind, message=message)
+        for email in recipients(request, exclude_user_id)
+    ])
+    enqueue('notifications.send_digests', key='notifications:digest', delay=settings.NOTIFICATION_DIGEST_INTERVAL)
+
+
+@task('notifications.status_change')
+def notify_status_change(request_id, from_status, to_status):
+    request = Request.objects.select_related('project', 'company').filter(pk=request_id).first()
+    if request is None:
+        return
+    if from_status:
+        message = f'Status changed from {from_status} to {to_status}'
+    else:
+        message = f'New request ({to_status})'
+    notify(request, Notification.Kind.STATUS, message)
+
+
+@task('notifications.comment')
+def notify_comment(comment_id):
+    comment = Comment.objects.select_related('author', 'request__project', 'request__company').filter(pk=comment_id).first()
+    if comment is None:
+        return
+    message = f'{comment.author} commented: {Truncator(comment.text).chars(200)}'
+    notify(comment.request, Notification.Kind.COMMENT, message, exclude_user_id=comment.author_id)
+
+
+def digest_message(email, notifications, connection):
+    """One email to ``email`` listing ``notifications``, grouped by request."""
+    requests = {}
+    for notification in notifications:
+        requests.setdefault(notification.request, []).append(notification)
+    context = {'requests': requests.items(), 'site_url': settings.SITE_URL.rstrip('/')}
+    count = len(notifications)
+    return EmailMessage(
+        subject=f'{count} update{"s" if count != 1 else ""} on your requests',
+        body=render_to_string('requestLogger/email/digest.txt', context),
+        to=[email],
+        connection=connection,
+    )
+
+
+# Not run in one transaction: each address's claim is committed on its own, so no write lock
+# is held while the SMTP server answers, and a failure can't undo claims already mailed
+@task('notifications.send_digests', atomic=False)
+def send_digests():
+    """Email every address with pending notifications its digest; returns the number of emails sent."""
+    stamp = timezone.now()
+    pending = Notification.objects.filter(sent_at__isnull=True, created_at__lte=stamp)
+    emails = list(pending.values_list('email', flat=True).distinct().order_by('email'))
+    sent, failed = 0, 0
+    with get_connection() as connection:
+        for email in emails:
+            # Claim the rows first, so a concurrent run doesn't send them again
+            with transaction.atomic():
+                ids = list(pending.filter(email=email).values_list('pk', flat=True))
+                Notification.objects.filter(pk__in=ids, sent_at__isnull=True).update(sent_at=stamp)
+            claimed = list(Notification.objects.filter(pk__in=ids, sent_at=stamp)
+                           .select_related('request').order_by('created_at', 'pk'))
+            if not claimed:
+                continue
+            try:
+                connection.send_messages([digest_message(email, claimed, connection)])
+                sent += 1
+            except Exception as error:
+                # Give the rows back, so a later run sends them
+                Notification.objects.filter(pk__in=ids, sent_at=stamp).update(sent_at=None)
+                if not isinstance(error, (smtplib.SMTPException, OSError)):
+                    raise
+                logger.exception('Could not send the notification digest to %s', email)
+                failed += 1
+    if failed:
+        # The failed addresses keep their notifications for the next run
+        enqueue('notifications.send_digests', key='notifications:digest', delay=settings.NOTIFICATION_DIGEST_INTERVAL)
+    return sent
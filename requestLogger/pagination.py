@@ -0,0 +1,149 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    """
+    One page of ``queryset`` in keyset (cursor) order, newest first on ``fields``.
+
+    Each page is fetched with a ``WHERE (a, b) < (x, y)`` style filter, so the cost of a
+    page does not grow with how deep into the table it is. The last field must be unique.
+    Nothing is queried until ``rows`` or a cursor is first used, so a page inside a cached
+    template fragment costs nothing on a cache hit.
+    """
+
+    def __init__(self, queryset, fields, size, after=None, before=None):
+        self.queryset = queryset
+        self.fields = tuple(fields)
+        self.size = size
+        self.after = after
+        self.before = before
+
+    def encode_cursor(self, obj):
+        # Rows are model instances, or dicts for a values() queryset
+        if isinstance(obj, dict):
+            values = [obj[field] for field in self.fields]
+        else:
+            values = [getattr(obj, field) for field in self.fields]
+        raw = json.dumps(values, default=lambda value: value.isoformat())
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        model = self.queryset.model
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return [model._meta.get_field(field).to_python(value)
+                    for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            raise Http404('Invalid cursor.')
+
+    def keyset_filter(self, values, lookup):
+        # (a, b, c) < (x, y, z)  ==  a < x OR (a = x AND b < y) OR (a = x AND b = y AND c < z)
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            branch = Q(**{field: value for field, value in zip(self.fields[:i], values)})
+            branch &= Q(**{'%s__%s' % (field, lookup): values[i]})
+            condition |= branch
+        return condition
+
+    @cached_property
+    def _page(self):
+        size, queryset = self.size, self.queryset
+        descending = ['-%s' % field for field in self.fields]
+
+        if self.before:
+            # Walk backwards from the cursor, then flip the page back into display order
+            queryset = queryset.filter(self.keyset_filter(self.decode_cursor(self.before), 'gt'))
+            rows = list(queryset.order_by(*self.fields)[:size + 1])
+            has_more_before = len(rows) > size
+            rows = rows[:size][::-1]
+            has_more_after = True
+        else:
+            if self.after:
+                queryset = queryset.filter(self.keyset_filter(self.decode_cursor(self.after), 'lt'))
+            rows = list(queryset.order_by(*descending)[:size + 1])
+            has_more_after = len(rows) > size
+            rows = rows[:size]
+            has_more_before = bool(self.after)
+
+        next_cursor = self.encode_cursor(rows[-1]) if rows and has_more_after else None
+        previous_cursor = self.encode_cursor(rows[0]) if rows and has_more_before else None
+        return rows, next_cursor, previous_cursor
+
+    @property
+    def rows(self):
+        return self._page[0]
+
+    @property
+    def next_cursor(self):
+        """Cursor for the (older) page after this one; None on the last page."""
+        return self._page[1]
+
+    @property
+    def previous_cursor(self):
+        return self._page[2]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class KeysetPaginationMixin:
+    """
+    Cursor (keyset) pagination for list views, newest first on ``keyset_fields``; see
+    KeysetPage. ``?after=`` and ``?before=`` take the cursors of the neighbouring pages.
+    """
+    keyset_fields = ('date_submitted', 'id')
+    page_size = None  # defaults to settings.LIST_PAGE_SIZE
+    max_page_size = 200
+
+    def get_page_size(self):
+        default = self.page_size or getattr(settings, 'LIST_PAGE_SIZE', 50)
+        try:
+            size = int(self.request.GET.get('page_size', default))
+        except ValueError:
+            size = default
+        return max(1, min(size, self.max_page_size))
+
+    def get_keyset_page(self, queryset):
+        return KeysetPage(queryset, self.keyset_fields, self.get_page_size(),
+                          after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+
+    def paginate_keyset(self, queryset):
+        """Return ``(rows, next_cursor, previous_cursor)`` for the current request."""
+        page = self.get_keyset_page(queryset)
+        return page.rows, page.next_cursor, page.previous_cursor
+
+    def page_query(self, param=None, cursor=None):
+        """
+        The current query string with the cursor replaced by ``param=cursor`` (dropped for
+        the first page), so page links keep the list's other parameters.
+        """
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query['page_size'] = self.get_page_size()
+        if param:
+            query[param] = cursor
+        return query.urlencode()
+
+    def get_context_data(self, **kwargs):
+        rows, next_cursor, previous_cursor = self.paginate_keyset(self.object_list)
+        context = super().get_context_data(object_list=rows, **kwargs)
+        context.update({
+            'next_cursor': next_cursor,
+            'previous_cursor': previous_cursor,
+            'is_paginated': bool(next_cursor or previous_cursor),
+            'page_size': self.get_page_size(),
+            'first_page_query': self.page_query(),
+            'next_page_query': next_cursor and self.page_query('after', next_cursor),
+            'previous_page_query': previous_cursor and self.page_query('before', previous_cursor),
+        })
+        return context
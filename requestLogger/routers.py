@@ -0,0 +1,106 @@
+"""
+Read replicas for the list, dashboard and report pages.
+
+Views with ReplicaReadMixin read from one of settings.REPLICA_DATABASES on GET and HEAD;
+everything else, and every write, uses the primary ("default"). Within a request, reads go
+back to the primary once anything has been written, and inside a transaction.
+
+Replicas lag behind the primary, so a user who has just changed something must not be sent
+to one: ReplicaPinMiddleware (middleware.py) sets a cookie on any response to a request
+that wrote, and for REPLICA_PIN_SECONDS after that the user's reads stay on the primary.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'replica_pin'
+
+_state = contextvars.ContextVar('database_routing', default=None)
+
+
+class RoutingState:
+    """Where the current request reads from, and whether it has written."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+def replica_aliases():
+    return list(getattr(settings, 'REPLICA_DATABASES', ()))
+
+
+@contextmanager
+def routing_state(pinned=False):
+    """A fresh RoutingState for the duration of one request."""
+    state = RoutingState(pinned)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def use_replica():
+    """
+    Send the rest of the current request's reads to a replica picked at random, unless the
+    user is pinned to the primary or something has been written. Returns the alias chosen.
+    """
+    state, aliases = _state.get(), replica_aliases()
+    if state is None or not aliases or state.pinned or state.wrote:
+        return DEFAULT_DB_ALIAS
+    if state.replica is None:
+        state.replica = random.choice(aliases)
+    return state.replica
+
+
+def reading_from_replica():
+    """Whether reads made now would go to a replica."""
+    state = _state.get()
+    return (state is not None and state.replica is not None and not state.wrote
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Always an alias, never None: Django would otherwise fall back to the database an
+        # instance was loaded from, and keep reading related rows from the replica
+        if reading_from_replica():
+            return _state.get().replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Read from a replica on GET and HEAD, up to the end of the request (templates render
+    after the view returns). ``self.read_alias`` is the database chosen, for querysets
+    evaluated after the request (streamed responses), which must pass it to ``using()``.
+    """
+    read_alias = DEFAULT_DB_ALIAS
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            self.read_alias = use_replica()
+        return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,217 @@
+"""
+Full-text search over request subjects, descriptions and comments.
+
+On SQLite the text is copied into two FTS5 tables (rowid = request id / comment id,
+created by migration 0010) that background tasks queued by the signals keep current, and
+results are ranked with bm25.
+Other backends fall back to a case-insensitive LIKE search ordered by date.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Comment, Request
+from .tasks import task
+from .tenancy import as_tenant
+
+REQUEST_FTS_TABLE = 'requestLogger_request_fts'
+COMMENT_FTS_TABLE = 'requestLogger_comment_fts'
+
+# Subject matches count for more than description matches
+SUBJECT_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def index_request(request):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {REQUEST_FTS_TABLE} WHERE rowid = %s', [request.pk])
+        cursor.execute(
+            f'INSERT INTO {REQUEST_FTS_TABLE} (rowid, subject, description) VALUES (%s, %s, %s)',
+            [request.pk, request.subject, request.description],
+        )
+
+
+def unindex_request(request_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {REQUEST_FTS_TABLE} WHERE rowid = %s', [request_id])
+
+
+def index_comment(comment):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {COMMENT_FTS_TABLE} WHERE rowid = %s', [comment.pk])
+        cursor.execute(
+            f'INSERT INTO {COMMENT_FTS_TABLE} (rowid, text, request_id) VALUES (%s, %s, %s)',
+            [comment.pk, comment.text, comment.request_id],
+        )
+
+
+def unindex_comment(comment_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {COMMENT_FTS_TABLE} WHERE rowid = %s', [comment_id])
+
+
+@task('search.reindex_request')
+def reindex_request(request_id):
+    """Bring a request's index entry up to date with the row, whatever happened to it since it was queued."""
+    request = Request.objects.filter(pk=request_id).only('subject', 'description').first()
+    if request is None:
+        unindex_request(request_id)
+    else:
+        index_request(request)
+
+
+@task('search.reindex_comment')
+def reindex_comment(comment_id):
+    comment = Comment.objects.filter(pk=comment_id).only('text', 'request').first()
+    if comment is None:
+        unindex_comment(comment_id)
+    else:
+        index_comment(comment)
+
+
+def index_many(requests=(), comments=()):
+    """Index freshly bulk-inserted rows, which never went through the post_save signals."""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {REQUEST_FTS_TABLE} (rowid, subject, description) VALUES (%s, %s, %s)',
+            [(request.pk, request.subject, request.description) for request in requests],
+        )
+        cursor.executemany(
+            f'INSERT INTO {COMMENT_FTS_TABLE} (rowid, text, request_id) VALUES (%s, %s, %s)',
+            [(comment.pk, comment.text, comment.request_id) for comment in comments],
+        )
+
+
+def unindex_many(request_ids=(), comment_ids=()):
+    """Drop the index entries of rows removed in bulk (archive.py), which never sent post_delete."""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {REQUEST_FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in request_ids])
+        cursor.executemany(f'DELETE FROM {COMMENT_FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in comment_ids])
+
+
+def rebuild_index(batch_size=2000):
+    """Repopulate both FTS tables from the Request and Comment tables. Returns the row counts."""
+    if not fts_enabled():
+        return 0, 0
+    counts = []
+    with connection.cursor() as cursor:
+        for table, queryset, columns in (
+            (REQUEST_FTS_TABLE, Request.objects.values_list('pk', 'subject', 'description'), 'rowid, subject, description'),
+            (COMMENT_FTS_TABLE, Comment.objects.values_list('pk', 'text', 'request_id'), 'rowid, text, request_id'),
+        ):
+            cursor.execute(f'DELETE FROM {table}')
+            rows, count = [], 0
+            for row in queryset.iterator(chunk_size=batch_size):
+                rows.append(row)
+                if len(rows) == batch_size:
+                    cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s)', rows)
+                    count, rows = count + len(rows), []
+            if rows:
+                cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s)', rows)
+                count += len(rows)
+            counts.append(count)
+    return tuple(counts)
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    return ' '.join('"%s"*' % word for word in re.findall(r'\w+', query))
+
+
+class SearchResults:
+    """
+    Lazily evaluated, ranked FTS results that Django's Paginator can slice and count.
+
+    Only the requested page of ids is fetched from the index; the matching requests are
+    then loaded in one query with their project and requester.
+    """
+    model = Request
+
+    def __init__(self, query, company_id=None, restrict_to_company=False):
+        self.expression = match_expression(query)
+        self.company_id = company_id
+        self.restrict_to_company = restrict_to_company
+        self._count = None
+
+    def _hits_sql(self):
+        request_table = connection.ops.quote_name(Request._meta.db_table)
+        sql = (
+            f'SELECT hits.request_id, MIN(hits.score) AS score FROM ('
+            f'  SELECT rowid AS request_id, bm25({REQUEST_FTS_TABLE}, {SUBJECT_WEIGHT}, {DESCRIPTION_WEIGHT}) AS score'
+            f'  FROM {REQUEST_FTS_TABLE} WHERE {REQUEST_FTS_TABLE} MATCH %s'
+            f'  UNION ALL'
+            f'  SELECT request_id, bm25({COMMENT_FTS_TABLE}) AS score'
+            f'  FROM {COMMENT_FTS_TABLE} WHERE {COMMENT_FTS_TABLE} MATCH %s'
+            f') AS hits JOIN {request_table} AS r ON r.id = hits.request_id'
+        )
+        params = [self.expression, self.expression]
+        if self.restrict_to_company:
+            sql += ' WHERE r.company_id IS %s'
+            params.append(self.company_id)
+        return sql + ' GROUP BY hits.request_id', params
+
+    def count(self):
+        if self._count is None:
+            if not self.expression:
+                self._count = 0
+            else:
+                sql, params = self._hits_sql()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT COUNT(*) FROM ({sql})', params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.expression:
+            return []
+        start, stop = key.start or 0, key.stop
+        sql, params = self._hits_sql()
+        sql += ' ORDER BY score, hits.request_id DESC LIMIT %s OFFSET %s'
+        params += [-1 if stop is None else stop - start, start]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ids = [row[0] for row in cursor.fetchall()]
+        # Results only show subjects; descriptions can be long and compressed (fields.py)
+        requests = Request.objects.select_related('project', 'requester').defer('description').in_bulk(ids)
+        return [requests[pk] for pk in ids if pk in requests]
+
+
+def search_requests(query, user):
+    """Ranked requests matching ``query`` that ``user`` (a User or Tenant) is allowed to see."""
+    tenant = as_tenant(user)
+    if not tenant.is_staff and tenant.company_id is None:
+        return Request.objects.none()
+    if fts_enabled():
+        return SearchResults(query, company_id=tenant.company_id, restrict_to_company=not tenant.is_staff)
+
+    words = re.findall(r'\w+', query)
+    if not words:
+        return Request.objects.none()
+    queryset = Request.objects.select_related('project', 'requester').defer('description').visible_to(tenant)
+    for word in words:
+        queryset = queryset.filter(
+            Q(subject__icontains=word) | Q(description__icontains=word) | Q(comments__text__icontains=word)
+        )
+    return queryset.distinct().order_by('-date_submitted', '-id')
@@ -0,0 +1,129 @@
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import analytics, notifications, search  # noqa: F401 (notifications registers its tasks)
+from .models import Comment, Project, Request, User
+from .stats import adjust_company_stats, count_comment, rebuild_company_stats, status_delta, uncount_comment
+from .tasks import enqueue
+
+
+# Counters and status events are updated inline, in the transaction of the change itself;
+# search indexing, rollups and notifications are queued as background tasks (see tasks.py).
+
+
+# Remember the values each row was loaded with, so post_save can work out what changed
+# without re-reading the row. Reads go through __dict__ so deferred fields stay deferred.
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Project)
+def remember_company(sender, instance, **kwargs):
+    instance._loaded_company_id = instance.__dict__.get('company_id')
+
+
+@receiver(post_init, sender=Request)
+def remember_request_status(sender, instance, **kwargs):
+    instance._loaded_company_id = instance.__dict__.get('company_id')
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=User)
+def move_user_rows(sender, instance, created, **kwargs):
+    if not created and instance._loaded_company_id != instance.company_id:
+        # Projects and requests follow their owner to the new company
+        Project.objects.filter(owner=instance).update(company=instance.company_id)
+        if instance.company_id:
+            Request.objects.filter(requester=instance).update(company=instance.company_id)
+        else:
+            project_company = Project.objects.filter(pk=OuterRef('project')).values('company')[:1]
+            Request.objects.filter(requester=instance).update(company=Subquery(project_company))
+        Request.objects.filter(project__owner=instance, requester__company__isnull=True).update(company=instance.company_id)
+        rebuild_company_stats([pk for pk in (instance._loaded_company_id, instance.company_id) if pk])
+    instance._loaded_company_id = instance.company_id
+
+
+@receiver(post_save, sender=Project)
+def count_project(sender, instance, created, **kwargs):
+    if created:
+        adjust_company_stats(instance.company_id, project_count=1)
+    elif instance._loaded_company_id != instance.company_id:
+        adjust_company_stats(instance._loaded_company_id, project_count=-1)
+        adjust_company_stats(instance.company_id, project_count=1)
+        # Requests raised by staff belong to the project's company, so they move with it
+        moved = Request.objects.filter(project=instance, requester__company__isnull=True).update(company=instance.company_id)
+        if moved:
+            rebuild_company_stats([pk for pk in (instance._loaded_company_id, instance.company_id) if pk])
+    instance._loaded_company_id = instance.company_id
+
+
+@receiver(post_delete, sender=Project)
+def uncount_project(sender, instance, **kwargs):
+    adjust_company_stats(instance.company_id, project_count=-1)
+
+
+@receiver(post_save, sender=Request)
+def log_status_change(sender, instance, created, **kwargs):
+    # Connected before count_request, which moves _loaded_status on to the saved status
+    if created:
+        event = analytics.record_status_change(instance, None)
+    elif instance._loaded_status is not None and instance._loaded_status != instance.status:
+        event = analytics.record_status_change(instance, instance._loaded_status)
+    else:
+        return
+    enqueue('notifications.status_change', request_id=instance.pk, from_status=event.from_status, to_status=event.to_status)
+
+
+@receiver(post_save, sender=Request)
+def count_request(sender, instance, created, **kwargs):
+    if created:
+        adjust_company_stats(instance.company_id, **status_delta(instance.status, 1))
+    elif instance._loaded_status is None:
+        # Loaded with a deferred status: we can't tell what changed, so recount
+        rebuild_company_stats([instance.company_id])
+    elif instance._loaded_company_id == instance.company_id:
+        if instance._loaded_status != instance.status:
+            adjust_company_stats(instance.company_id, **{
+                **status_delta(instance._loaded_status, -1),
+                **status_delta(instance.status, 1),
+            })
+    else:
+        adjust_company_stats(instance._loaded_company_id, **status_delta(instance._loaded_status, -1))
+        adjust_company_stats(instance.company_id, **status_delta(instance.status, 1))
+    instance._loaded_company_id = instance.company_id
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Request)
+def uncount_request(sender, instance, **kwargs):
+    adjust_company_stats(instance.company_id, **status_delta(instance.status, -1))
+
+
+@receiver(post_save, sender=Request)
+@receiver(post_delete, sender=Request)
+def index_request(sender, instance, **kwargs):
+    if search.fts_enabled():
+        enqueue('search.reindex_request', key=f'search:request:{instance.pk}', request_id=instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    if search.fts_enabled():
+        enqueue('search.reindex_comment', key=f'search:comment:{instance.pk}', comment_id=instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        count_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_deleted_comment(sender, instance, **kwargs):
+    uncount_comment(instance)
+
+
+@receiver(post_save, sender=Comment)
+def notify_comment(sender, instance, created, **kwargs):
+    if created:
+        enqueue('notifications.comment', comment_id=instance.pk)
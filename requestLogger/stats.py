@@ -0,0 +1,104 @@
+from django.db import transaction
+from django.db.models import Count, DateTimeField, F, IntegerField, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import ArchivedRequest, Comment, Company, CompanyStats, Project, Request
+
+
+def status_delta(status, delta):
+    """Counter delta for one request entering (``delta=1``) or leaving (``-1``) ``status``."""
+    field = CompanyStats.STATUS_FIELDS.get(status)
+    return {field: delta} if field else {}
+
+
+def adjust_company_stats(company_id, **deltas):
+    """Apply counter deltas (e.g. ``new_count=1, resolved_count=-1``) to a company's stats row."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if company_id is None or not deltas:
+        return
+    updated = CompanyStats.objects.filter(pk=company_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        # No row yet (new company, or stats never built): count from scratch, which
+        # already includes the change being applied.
+        rebuild_company_stats([company_id])
+
+
+def rebuild_company_stats(company_ids=None):
+    """Recount the stats rows for the given companies, or for every company."""
+    companies = Company.objects.all()
+    projects = Project.objects.all()
+    # Archived requests (archive.py) still count towards their closing status
+    requests = [Request.objects.all(), ArchivedRequest.objects.all()]
+    if company_ids is not None:
+        companies = companies.filter(pk__in=company_ids)
+        projects = projects.filter(company__in=company_ids)
+        requests = [queryset.filter(company__in=company_ids) for queryset in requests]
+
+    # Counted inside the transaction, so the reads come from the primary (routers.py) even
+    # when called from a view reading from a replica, whose lag would otherwise be stored
+    with transaction.atomic():
+        stats = {pk: CompanyStats(company_id=pk) for pk in companies.values_list('pk', flat=True)}
+        for row in projects.values('company').annotate(total=Count('id')):
+            if row['company'] in stats:
+                stats[row['company']].project_count = row['total']
+        for queryset in requests:
+            for row in queryset.values('company', 'status').annotate(total=Count('id')):
+                field = CompanyStats.STATUS_FIELDS.get(row['status'])
+                if field and row['company'] in stats:
+                    counter = stats[row['company']]
+                    setattr(counter, field, getattr(counter, field) + row['total'])
+
+        existing = CompanyStats.objects.all()
+        if company_ids is not None:
+            existing = existing.filter(pk__in=company_ids)
+        existing.delete()
+        CompanyStats.objects.bulk_create(stats.values(), batch_size=500)
+    return len(stats)
+
+
+def count_comment(comment):
+    """Count a new comment on its request, and move the request's last activity up to it."""
+    Request.objects.filter(pk=comment.request_id).update(
+        comment_count=F('comment_count') + 1,
+        last_activity_at=Greatest('last_activity_at', Value(comment.created_date, output_field=DateTimeField())),
+    )
+
+
+def activity_columns():
+    """
+    comment_count and last_activity_at worked out from the Comment table, as update()
+    arguments for Request rows.
+    """
+    comments = Comment.objects.filter(request=OuterRef('pk')).order_by().values('request')
+    count = comments.annotate(total=Count('pk')).values('total')
+    newest = comments.annotate(newest=Max('created_date')).values('newest')
+    return {
+        'comment_count': Coalesce(Subquery(count, output_field=IntegerField()), 0),
+        'last_activity_at': Greatest('date_submitted', Coalesce(Subquery(newest, output_field=DateTimeField()), 'date_submitted')),
+    }
+
+
+def uncount_comment(comment):
+    # Recounted rather than decremented: the newest remaining comment has to be looked up anyway
+    Request.objects.filter(pk=comment.request_id).update(**activity_columns())
+
+
+def rebuild_request_activity(request_ids=None, batch_size=1000, on_batch=None):
+    """
+    Recount comment_count and last_activity_at for the given requests, or for every request
+    in pk ranges of ``batch_size``; returns the number of requests updated.
+    """
+    requests = Request.objects.all()
+    if request_ids is not None:
+        requests = requests.filter(pk__in=request_ids)
+    bounds = requests.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        updated += requests.filter(pk__gte=start, pk__lt=start + batch_size).update(**activity_columns())
+        if on_batch:
+            on_batch(updated)
+    return updated
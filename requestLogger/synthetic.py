@@ -0,0 +1,181 @@
+"""
+Synthetic companies, users, projects, requests and comments for load testing.
+
+Volumes are skewed the way real tenants are: a few companies own most of the users,
+projects and requests (Zipf-distributed), a handful of requests attract most of the
+comments, and submissions cluster towards the recent end of the date range. The same seed
+always produces the same data. Rows are written with bulk_create; requests and comments go
+through RequestImporter so they get the same pk allocation, dates, counters and search
+index as an import.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .imports import RequestImporter
+from .models import Company, Project, Request, User
+from .stats import rebuild_company_stats
+
+# Relative frequency of each status among generated requests
+STATUS_WEIGHTS = {
+    Request.Status.NEW: 25,
+    Request.Status.IN_PROGRESS: 20,
+    Request.Status.RESOLVED: 40,
+    Request.Status.REJECTED: 7,
+    Request.Status.CANCELLED: 8,
+}
+
+WORDS = (
+    'login password reset account invoice billing export report dashboard email '
+    'notification server database backup restore timeout error crash slow upgrade '
+    'release deploy firewall network printer laptop licence renewal access permission '
+    'group project milestone deadline migration integration api webhook token certificate '
+    'storage quota search filter archive audit policy mobile browser layout font '
+    'translation calendar meeting schedule payment refund contract vendor onboarding'
+).split()
+
+
+def zipf_weights(n, exponent=1.1):
+    """Weights for ranks 1..n where rank k is 1/k**exponent as likely as rank 1."""
+    return [1 / rank ** exponent for rank in range(1, n + 1)]
+
+
+class DataGenerator:
+    def __init__(self, companies=10, users=200, staff=5, projects=100, requests=10000, comments=30000,
+                 days=365, seed=0, prefix='load', password='password', batch_size=2000):
+        if companies < 1 or users < companies or projects < companies:
+            raise ValueError('Need at least one company, and one user and one project per company.')
+        self.counts = {
+            'companies': companies, 'users': users, 'staff': staff,
+            'projects': projects, 'requests': requests, 'comments': comments,
+        }
+        self.days = days
+        self.prefix = prefix
+        self.password = password
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+
+    def words(self, low, high):
+        return ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(low, high)))
+
+    def spread(self, total, buckets):
+        """Split ``total`` over ``buckets`` Zipf-style, at least one each."""
+        sizes = [1] * buckets
+        for bucket in self.random.choices(range(buckets), weights=zipf_weights(buckets), k=total - buckets):
+            sizes[bucket] += 1
+        return sizes
+
+    def generate(self, on_batch=None):
+        if Company.objects.filter(name__startswith=f'{self.prefix} ').exists():
+            raise ValueError(f'Data with the prefix {self.prefix!r} already exists; pick another prefix.')
+
+        companies = self.create_companies()
+        staff, customers = self.create_users(companies)
+        projects = self.create_projects(customers)
+        importer = RequestImporter(batch_size=self.batch_size)
+        importer.import_records(enumerate(self.request_records(customers, projects, staff), 1), on_batch)
+        # Companies without requests still need their project counts
+        rebuild_company_stats([company.pk for company in companies])
+        return importer
+
+    def create_companies(self):
+        Company.objects.bulk_create([
+            Company(name=f'{self.prefix} company {i:03d}', address=f'{i} Load Test Street',
+                    contact_email=f'company{i}@{self.prefix}.example.com')
+            for i in range(self.counts['companies'])
+        ], batch_size=self.batch_size)
+        # Reload for the pks, which bulk_create does not set on every backend
+        return list(Company.objects.filter(name__startswith=f'{self.prefix} company ').order_by('name'))
+
+    def create_users(self, companies):
+        # One hash for everyone: hashing each password would dominate the run
+        password = make_password(self.password)
+        users = [User(username=f'{self.prefix}-staff{i:03d}', role='staff', is_staff=True, password=password)
+                 for i in range(self.counts['staff'])]
+        for n, (company, size) in enumerate(zip(companies, self.spread(self.counts['users'], len(companies)))):
+            users += [User(username=f'{self.prefix}-c{n:03d}-u{i:04d}', role='customer',
+                           company=company, password=password)
+                      for i in range(size)]
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+
+        users = User.objects.filter(username__startswith=f'{self.prefix}-').order_by('username')
+        staff = [user for user in users if user.role == 'staff']
+        customers = {}
+        for user in users:
+            if user.role == 'customer':
+                customers.setdefault(user.company_id, []).append(user)
+        return staff, customers
+
+    def create_projects(self, customers):
+        company_ids = sorted(customers)
+        projects = []
+        for company_id, size in zip(company_ids, self.spread(self.counts['projects'], len(company_ids))):
+            for _ in range(size):
+                owner = self.random.choice(customers[company_id])
+                projects.append(Project(
+                    name=f'{self.prefix} project {len(projects):05d}', description=self.words(10, 40),
+                    owner=owner, company_id=company_id, version=f'{self.random.randint(1, 5)}.0',
+                    status=self.random.choices(Project.Status.values, weights=(80, 15, 5))[0],
+                ))
+        Project.objects.bulk_create(projects, batch_size=self.batch_size)
+
+        by_company = {}
+        for project in Project.objects.filter(name__startswith=f'{self.prefix} project ').order_by('name'):
+            by_company.setdefault(project.company_id, []).append(project)
+        return by_company
+
+    def date_between(self, start, end):
+        return start + (end - start) * self.random.random()
+
+    def request_records(self, customers, projects, staff):
+        """Records in the layout RequestImporter reads, oldest first."""
+        total = self.counts['requests']
+        company_ids = sorted(projects)
+        company_weights = zipf_weights(len(company_ids))
+        project_weights = {company_id: zipf_weights(len(projects[company_id])) for company_id in company_ids}
+
+        # Comment counts follow a Zipf curve over requests in a random order, so the hot
+        # threads are spread across companies and dates
+        hot = list(range(total))
+        self.random.shuffle(hot)
+        comment_counts = [0] * total
+        if total:
+            for rank in self.random.choices(range(total), weights=zipf_weights(total, 0.8), k=self.counts['comments']):
+                comment_counts[hot[rank]] += 1
+
+        # Squaring the fraction crowds submissions towards the present
+        ages = sorted((self.days * self.random.random() ** 2 for _ in range(total)), reverse=True)
+        statuses = list(STATUS_WEIGHTS)
+        status_weights = list(STATUS_WEIGHTS.values())
+
+        for index, age in enumerate(ages):
+            company_id = self.random.choices(company_ids, weights=company_weights)[0]
+            project = self.random.choices(projects[company_id], weights=project_weights[company_id])[0]
+            requester = self.random.choice(customers[company_id])
+            status = self.random.choices(statuses, weights=status_weights)[0]
+            submitted = self.now - timedelta(days=age)
+
+            comments = []
+            for _ in range(comment_counts[index]):
+                author = self.random.choice(staff) if staff and self.random.random() < 0.5 else requester
+                comments.append((self.date_between(submitted, self.now), author.username, self.words(5, 60)))
+            comments.sort()
+
+            completed = self.date_between(submitted, self.now) if status in Request.CLOSED_STATUSES else None
+            last_updated = max([submitted, completed or submitted] + [created for created, _, _ in comments[-1:]])
+            yield {
+                'subject': self.words(3, 8).capitalize()[:100],
+                'description': self.words(20, 120),
+                'request_type': self.random.choice(Request.RequestType.values),
+                'status': status,
+                'project': project.name,
+                'requester': requester.username,
+                'date_submitted': submitted.isoformat(),
+                'last_updated': last_updated.isoformat(),
+                'date_completed': completed.isoformat() if completed else None,
+                'comments': [{'author': author, 'text': text, 'created_date': created.isoformat()}
+                             for created, author, text in comments],
+            }
@@ -0,0 +1,154 @@
+"""
+A small task queue kept in the application database.
+
+Functions are registered with ``@task('name')`` and queued with ``enqueue('name', **kwargs)``
+(keyword arguments must be JSON-serialisable). Because the Task row is written in the
+same transaction as the change that caused it, a rolled-back change never leaves a task
+behind. ``run_tasks`` worker processes claim due tasks with a conditional UPDATE, so any
+number of them can share the table. A failed task is retried with exponential backoff
+and moved to the ``dead`` status once it has used its attempts; dead tasks stay in the
+table for inspection and can be requeued from the admin.
+
+With TASKS_ALWAYS_EAGER the task runs inline at enqueue time instead.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name, max_attempts=5, atomic=True):
+    """
+    Register the decorated function as the task ``name``. Workers run it in a transaction,
+    unless ``atomic`` is False for tasks that commit their own steps (e.g. around sending mail).
+    """
+    def register(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        func.atomic = atomic
+        _registry[name] = func
+        return func
+    return register
+
+
+def enqueue(name, key=None, delay=0, **kwargs):
+    """
+    Queue the task ``name`` to run with ``kwargs``, no sooner than ``delay`` seconds from now.
+
+    With an idempotency ``key``, nothing is added while a task with the same key is
+    still queued.
+    """
+    func = _registry[name]
+    kwargs = json.loads(json.dumps(kwargs))  # what the worker will see
+    if getattr(settings, 'TASKS_ALWAYS_EAGER', False):
+        func(**kwargs)
+        return
+    # ignore_conflicts turns a duplicate queued key into a no-op (INSERT OR IGNORE / ON
+    # CONFLICT DO NOTHING) without the cost of a savepoint
+    Task.objects.bulk_create([Task(
+        name=name, kwargs=kwargs, key=key, max_attempts=func.max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )], ignore_conflicts=True)
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a task that has failed ``attempts`` times."""
+    base = getattr(settings, 'TASK_BACKOFF_BASE', 10)
+    cap = getattr(settings, 'TASK_BACKOFF_MAX', 3600)
+    # Jitter, so tasks that failed together don't all retry together
+    return min(base * 2 ** (attempts - 1), cap) * random.uniform(0.75, 1.25)
+
+
+class Worker:
+    def __init__(self, name=None, batch_size=10):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.batch_size = batch_size
+
+    def claim(self):
+        """Mark up to batch_size due tasks as running for this worker and return them."""
+        now = timezone.now()
+        due = (Task.objects.filter(status=Task.Status.QUEUED, run_after__lte=now)
+               .order_by('run_after', 'pk').values_list('pk', flat=True)[:self.batch_size])
+        claimed = [
+            pk for pk in due
+            # Only one worker's UPDATE can match while the task is still queued
+            if Task.objects.filter(pk=pk, status=Task.Status.QUEUED).update(
+                status=Task.Status.RUNNING, locked_by=self.name, locked_at=now, attempts=F('attempts') + 1,
+            )
+        ]
+        return list(Task.objects.filter(pk__in=claimed).order_by('run_after', 'pk'))
+
+    def run(self, task):
+        func = _registry.get(task.name)
+        try:
+            if func is None:
+                raise LookupError(f'No task registered as {task.name!r}')
+            if func.atomic:
+                with transaction.atomic():
+                    func(**task.kwargs)
+            else:
+                func(**task.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            if task.attempts >= task.max_attempts:
+                logger.error('Task %s (%s) failed for good after %d attempts', task.pk, task.name, task.attempts)
+                changes = {'status': Task.Status.DEAD, 'finished_at': timezone.now()}
+            else:
+                delay = backoff(task.attempts)
+                logger.warning('Task %s (%s) failed, retrying in %.0fs', task.pk, task.name, delay)
+                changes = {'status': Task.Status.QUEUED, 'run_after': timezone.now() + timedelta(seconds=delay)}
+            Task.objects.filter(pk=task.pk).update(locked_by='', last_error=error, **changes)
+            return False
+        Task.objects.filter(pk=task.pk).update(status=Task.Status.DONE, locked_by='', finished_at=timezone.now())
+        return True
+
+    def run_batch(self):
+        """Claim and run one batch; returns how many tasks were run."""
+        tasks = self.claim()
+        for claimed in tasks:
+            self.run(claimed)
+        return len(tasks)
+
+
+def recover_stale(timeout=None):
+    """Requeue tasks whose worker stopped without finishing them."""
+    timeout = timeout or getattr(settings, 'TASK_LOCK_TIMEOUT', 300)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Task.objects.filter(status=Task.Status.RUNNING, locked_at__lt=cutoff).update(status=Task.Status.QUEUED, locked_by='')
+
+
+def purge_done(days=None):
+    """Delete tasks that finished successfully more than ``days`` ago (dead ones are kept)."""
+    days = days if days is not None else getattr(settings, 'TASK_RETENTION_DAYS', 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    return Task.objects.filter(status=Task.Status.DONE, finished_at__lt=cutoff).delete()[0]
+
+
+def run_pending(worker=None):
+    """Run every task that is due now; for tests and one-off drains."""
+    worker = worker or Worker()
+    total = 0
+    while True:
+        ran = worker.run_batch()
+        if not ran:
+            return total
+        total += ran
+
+
+def requeue(tasks):
+    """Give dead (or any) tasks a fresh set of attempts."""
+    return tasks.update(status=Task.Status.QUEUED, attempts=0, run_after=timezone.now(), locked_by='', finished_at=None)
@@ -0,0 +1,69 @@
+"""
+Tenant scoping: which rows a user may see.
+
+Staff see everything; everyone else only sees rows of their own company. Project and
+Request carry a copy of the company, so the check is a filter on the initial query and a
+row the user may not see simply isn't found (404); Comment is scoped through its request.
+The user's role and company are read once per request into a Tenant, so checks need no
+extra queries.
+"""
+from django.db import models
+from django.utils.functional import cached_property
+
+
+class Tenant:
+    """The requesting user's role and company."""
+
+    def __init__(self, user):
+        self.user_id = user.pk
+        self.company_id = user.company_id
+        self.is_staff = user.role == 'staff'
+
+    def can_see(self, obj):
+        """Access check for an object already in hand (one with a company_id)."""
+        return self.is_staff or (obj.company_id is not None and obj.company_id == self.company_id)
+
+
+def tenant_of(request):
+    """The Tenant for ``request.user``, resolved on first use and kept for the rest of the request."""
+    tenant = getattr(request, '_tenant', None)
+    if tenant is None or tenant.user_id != request.user.pk:
+        tenant = request._tenant = Tenant(request.user)
+    return tenant
+
+
+def as_tenant(who):
+    """``who`` as a Tenant; accepts a Tenant or a User."""
+    return who if isinstance(who, Tenant) else Tenant(who)
+
+
+class TenantQuerySet(models.QuerySet):
+    # Lookup from the model to its company; overridden by models scoped through a relation
+    tenant_field = 'company'
+
+    def visible_to(self, who):
+        """Rows that ``who`` (a Tenant or a User) may see."""
+        tenant = as_tenant(who)
+        if tenant.is_staff:
+            return self
+        if tenant.company_id is None:
+            return self.none()
+        return self.filter(**{self.tenant_field: tenant.company_id})
+
+
+class CommentQuerySet(TenantQuerySet):
+    tenant_field = 'request__company'
+
+
+class TenantScopedMixin:
+    """
+    Limits get_queryset() to what the user's company may see, so DetailView/UpdateView/
+    DeleteView return 404 for anything else without a second lookup.
+    """
+
+    @cached_property
+    def tenant(self):
+        return tenant_of(self.request)
+
+    def get_queryset(self):
+        return super().get_queryset().visible_to(self.tenant)
@@ -0,0 +1,115 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from requestLogger.models import Comment, Company, Project, Request, User
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class RequestActivityTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Acme', address='1 Test St', contact_email='acme@test.com')
+        other_company = Company.objects.create(name='Globex', address='2 Test St', contact_email='globex@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        self.outsider = User.objects.create_user(username='outsider', password='outsiderpass', role='customer', company=other_company)
+        self.project = Project.objects.create(name='Portal', description='x', owner=self.customer, version='1.0')
+        other_project = Project.objects.create(name='Billing', description='x', owner=self.outsider, version='1.0')
+        self.request = Request.objects.create(subject='Busy', description='x', project=self.project, requester=self.customer)
+        self.quiet = Request.objects.create(subject='Quiet', description='x', project=self.project, requester=self.customer)
+        self.elsewhere = Request.objects.create(subject='Elsewhere', description='x', project=other_project, requester=self.outsider)
+        self.client.force_login(self.customer)
+
+    def test_comments_keep_the_counters(self):
+        submitted = self.request.date_submitted
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('comment_create', args=[self.request.pk]), {'text': 'First'}, HTTP_ACCEPT='application/json')
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "requestLogger_request"')]
+        self.assertEqual(len(updates), 1)
+        first = Comment.objects.get()
+        second = Comment.objects.create(request=self.request, author=self.customer, text='Second')
+
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.comment_count, self.request.last_activity_at), (2, second.created_date))
+        # A comment edit is not new activity
+        first.save()
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.comment_count, self.request.last_activity_at), (2, second.created_date))
+
+        second.delete()
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.comment_count, self.request.last_activity_at), (1, first.created_date))
+        first.delete()
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.comment_count, self.request.last_activity_at), (0, submitted))
+
+    def test_stale_save_keeps_the_counters(self):
+        stale = Request.objects.get(pk=self.request.pk)
+        comment = Comment.objects.create(request=self.request, author=self.customer, text='New')
+        stale.subject = 'Renamed'
+        stale.save()
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.subject, 'Renamed')
+        self.assertEqual((self.request.comment_count, self.request.last_activity_at), (1, comment.created_date))
+
+    def test_comments_change_the_api_request(self):
+        url = reverse('api_request_detail', args=[self.request.pk])
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        comment = Comment.objects.create(request=self.request, author=self.customer, text='New')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment_count'], 1)
+        self.assertEqual(response['Last-Modified'], http_date(comment.created_date.timestamp()))
+
+        etag = response['ETag']
+        comment.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_comments_change_the_request_lists(self):
+        url = reverse('request_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Comment.objects.create(request=self.request, author=self.customer, text='New')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        row = next(request for request in response.context['object_list'] if request.pk == self.request.pk)
+        self.assertEqual(row.comment_count, 1)
+
+    def test_recently_active_list(self):
+        long_ago = timezone.now() - timedelta(days=30)
+        Request.objects.filter(pk=self.quiet.pk).update(date_submitted=long_ago, last_activity_at=long_ago)
+        Request.objects.filter(pk=self.request.pk).update(date_submitted=long_ago, last_activity_at=long_ago)
+        newer = Request.objects.create(subject='Newer', description='x', project=self.project, requester=self.customer)
+        Comment.objects.create(request=self.request, author=self.customer, text='Bump')
+
+        response = self.client.get(reverse('request_list_active'))
+        self.assertContains(response, 'Recently Active Requests')
+        self.assertEqual([request.pk for request in response.context['object_list']], [self.request.pk, newer.pk])
+
+        with self.settings(RECENT_ACTIVITY_DAYS=60):
+            response = self.client.get(reverse('request_list_active'), {'page_size': 2})
+        self.assertEqual([request.pk for request in response.context['object_list']], [self.request.pk, newer.pk])
+        self.assertTrue(response.context['next_cursor'])
+
+    def test_rebuild_command(self):
+        comment = Comment.objects.create(request=self.request, author=self.customer, text='Counted')
+        Request.objects.update(comment_count=7, last_activity_at=timezone.now() + timedelta(days=1))
+        out = StringIO()
+        call_command('rebuild_request_activity', stdout=out)
+        self.assertIn('Rebuilt activity for 3 requests.', out.getvalue())
+        self.request.refresh_from_db()
+        self.quiet.refresh_from_db()
+        self.assertEqual((self.request.comment_count, self.request.last_activity_at), (1, comment.created_date))
+        self.assertEqual((self.quiet.comment_count, self.quiet.last_activity_at), (0, self.quiet.date_submitted))
+
+        call_command('rebuild_request_activity', str(self.quiet.pk), stdout=out)
+        self.assertIn('Rebuilt activity for 1 requests.', out.getvalue())
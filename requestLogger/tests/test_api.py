@@ -0,0 +1,177 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from requestLogger.models import Comment, Company, Project, Request, RequestStatusEvent, User
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class ApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Acme', address='1 Test St', contact_email='acme@test.com')
+        other_company = Company.objects.create(name='Globex', address='2 Test St', contact_email='globex@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        self.outsider = User.objects.create_user(username='outsider', password='outsiderpass', role='customer', company=other_company)
+        self.staff = User.objects.create_user(username='staff', password='staffpass', role='staff')
+        self.project = Project.objects.create(name='Portal', description='x', owner=self.customer, version='1.0')
+        self.other_project = Project.objects.create(name='Billing', description='x', owner=self.outsider, version='1.0')
+        self.request = Request.objects.create(subject='Login broken', description='x', project=self.project, requester=self.customer)
+        self.other_request = Request.objects.create(subject='Invoices', description='x', project=self.other_project, requester=self.outsider)
+        self.client.force_login(self.customer)
+
+    def send(self, method, url, body):
+        return getattr(self.client, method)(url, data=json.dumps(body), content_type='application/json')
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('api_request_list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('detail', response.json())
+
+    def test_lists_are_scoped_to_the_tenant(self):
+        response = self.client.get(reverse('api_request_list'))
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.request.pk])
+        self.assertEqual(response.json()['results'][0]['project_name'], 'Portal')
+        response = self.client.get(reverse('api_project_list'))
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.project.pk])
+        self.assertEqual(self.client.get(reverse('api_request_detail', args=[self.other_request.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_request_comments', args=[self.other_request.pk])).status_code, 404)
+
+    def test_sparse_fields(self):
+        response = self.client.get(reverse('api_request_list'), {'fields': 'id,status,requester_username'})
+        self.assertEqual(response.json()['results'], [
+            {'id': self.request.pk, 'status': 'New', 'requester_username': 'customer'}])
+        response = self.client.get(reverse('api_request_list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_list_is_one_query_per_page(self):
+        for i in range(5):
+            Request.objects.create(subject=f'Request {i}', description='x', project=self.project, requester=self.customer)
+        url = reverse('api_request_list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,project_name,requester_username'})
+        self.assertEqual(len(response.json()['results']), 6)
+        # Session, user, the validators' aggregate and the page itself
+        self.assertEqual(len(queries), 4)
+
+    def test_cursor_pagination(self):
+        for i in range(4):
+            Request.objects.create(subject=f'Request {i}', description='x', project=self.project, requester=self.customer)
+        seen, url = [], reverse('api_request_list') + '?page_size=2&fields=id'
+        while url:
+            body = self.client.get(url).json()
+            seen += [row['id'] for row in body['results']]
+            url = body['next']
+        expected = list(Request.objects.filter(company=self.company).order_by('-last_updated', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_updated_since(self):
+        since = timezone.now()
+        Request.objects.filter(pk=self.request.pk).update(last_updated=since - timedelta(days=1))
+        changed = Request.objects.create(subject='Later', description='x', project=self.project, requester=self.customer)
+        response = self.client.get(reverse('api_request_list'), {'updated_since': since.isoformat(), 'fields': 'id'})
+        self.assertEqual(response.json()['results'], [{'id': changed.pk}])
+        response = self.client.get(reverse('api_request_list'), {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_if_none_match(self):
+        url = reverse('api_request_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Request.objects.create(subject='New one', description='x', project=self.project, requester=self.customer)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        url = reverse('api_request_comments', args=[self.request.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Comment.objects.create(request=self.request, author=self.customer, text='Any news?')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_comment_list_validators_cover_the_page(self):
+        comments = [Comment.objects.create(request=self.request, author=self.customer, text=f'Comment {i}')
+                    for i in range(4)]
+        url = reverse('api_comment_list') + '?page_size=2'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Session, user and the page's keys; no aggregate over every comment
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('COUNT(', queries[-1]['sql'])
+
+        # Deletes beyond the page don't change it while it still has a next page
+        comments[0].delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        comments[2].delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(request=self.request, author=self.customer, text='Newest')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_create_request(self):
+        body = {'subject': 'Export fails', 'request_type': 'Change', 'project': self.project.pk, 'description': 'x'}
+        response = self.send('post', reverse('api_request_list'), body)
+        self.assertEqual(response.status_code, 201)
+        created = Request.objects.get(pk=response.json()['id'])
+        self.assertEqual((created.requester, created.company), (self.customer, self.company))
+
+        # Projects of other companies aren't choices
+        response = self.send('post', reverse('api_request_list'), {**body, 'project': self.other_project.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('project', response.json()['errors'])
+        response = self.send('post', reverse('api_request_list'), {**body, 'requester': self.staff.pk})
+        self.assertEqual(response.status_code, 400)
+
+    def test_patch_request(self):
+        url = reverse('api_request_detail', args=[self.request.pk])
+        response = self.send('patch', url, {'subject': 'Login still broken'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['subject'], 'Login still broken')
+        self.assertEqual(self.send('patch', url, {'status': 'Resolved'}).status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.send('patch', url, {'status': 'Resolved'})
+        self.assertEqual(response.json()['status'], 'Resolved')
+        self.assertIsNotNone(response.json()['date_completed'])
+        self.assertTrue(RequestStatusEvent.objects.filter(request=self.request, to_status='Resolved').exists())
+
+    def test_delete_request(self):
+        response = self.client.delete(reverse('api_request_detail', args=[self.other_request.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.delete(reverse('api_request_detail', args=[self.request.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Request.objects.filter(pk=self.request.pk).exists())
+
+    def test_projects(self):
+        response = self.send('post', reverse('api_project_list'), {'name': 'Mobile', 'description': 'x', 'version': '0.1', 'status': 'Active'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['owner'], self.customer.pk)
+        url = reverse('api_project_detail', args=[response.json()['id']])
+        self.assertEqual(self.send('patch', url, {'version': '0.2'}).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.send('patch', url, {'version': '0.2'}).json()['version'], '0.2')
+
+    def test_comments(self):
+        url = reverse('api_request_comments', args=[self.request.pk])
+        response = self.send('post', url, {'text': 'Any news?'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author_username'], 'customer')
+        self.assertEqual(self.send('post', url, {'text': ''}).status_code, 400)
+        self.assertEqual(self.send('post', reverse('api_request_comments', args=[self.other_request.pk]), {'text': 'Hi'}).status_code, 404)
+
+        Comment.objects.create(request=self.other_request, author=self.outsider, text='Not yours')
+        response = self.client.get(reverse('api_comment_list'), {'fields': 'text'})
+        self.assertEqual(response.json()['results'], [{'text': 'Any news?'}])
+
+    def test_method_not_allowed(self):
+        response = self.client.put(reverse('api_request_list'))
+        self.assertEqual(response.status_code, 405)
+        self.assertIn('POST', response['Allow'])
@@ -0,0 +1,92 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from requestLogger import archive
+from requestLogger.models import (
+    ArchivedComment, ArchivedRequest, Comment, Company, CompanyStats, Project, Request, RequestStatusEvent, User,
+)
+from requestLogger.stats import rebuild_company_stats
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class ArchiveTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Acme', address='1 Test St', contact_email='acme@test.com')
+        other_company = Company.objects.create(name='Globex', address='2 Test St', contact_email='globex@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        self.outsider = User.objects.create_user(username='outsider', password='outsiderpass', role='customer', company=other_company)
+        self.project = Project.objects.create(name='Portal', description='x', owner=self.customer, version='1.0')
+        long_ago = timezone.now() - timedelta(days=400)
+
+        self.old = Request.objects.create(subject='Old and done', description='x', project=self.project, requester=self.customer)
+        self.comment = Comment.objects.create(request=self.old, author=self.customer, text='Thanks, fixed')
+        Request.objects.filter(pk=self.old.pk).update(
+            status=Request.Status.RESOLVED, date_submitted=long_ago, last_updated=long_ago, date_completed=long_ago)
+        self.recent = Request.objects.create(subject='Recently closed', description='x', project=self.project,
+                                             requester=self.customer, status=Request.Status.RESOLVED)
+        self.open = Request.objects.create(subject='Still open', description='x', project=self.project, requester=self.customer)
+        Request.objects.filter(pk=self.open.pk).update(last_updated=long_ago, date_submitted=long_ago)
+        rebuild_company_stats()
+        self.client.force_login(self.customer)
+
+    def test_archives_only_long_closed_requests(self):
+        self.assertEqual(archive.archive_closed(days=365), (1, 1))
+        self.assertEqual(set(Request.objects.values_list('pk', flat=True)), {self.recent.pk, self.open.pk})
+        archived = ArchivedRequest.objects.get()
+        self.assertEqual((archived.pk, archived.subject, archived.company_id), (self.old.pk, 'Old and done', self.company.pk))
+        self.assertEqual(ArchivedComment.objects.get().pk, self.comment.pk)
+        self.assertFalse(Comment.objects.filter(pk=self.comment.pk).exists())
+        # History and counters are untouched
+        self.assertTrue(RequestStatusEvent.objects.filter(request_id=self.old.pk).exists())
+        stats = CompanyStats.objects.get(pk=self.company.pk)
+        self.assertEqual(stats.resolved_count, 2)
+        rebuild_company_stats()
+        self.assertEqual(CompanyStats.objects.get(pk=self.company.pk).resolved_count, 2)
+
+    def test_archives_in_batches(self):
+        for i in range(3):
+            request = Request.objects.create(subject=f'Old {i}', description='x', project=self.project, requester=self.customer)
+            Request.objects.filter(pk=request.pk).update(status=Request.Status.CANCELLED, last_updated=timezone.now() - timedelta(days=500))
+        batches = []
+        archive.archive_closed(days=365, batch_size=2, on_batch=lambda *totals: batches.append(totals))
+        self.assertEqual([requests for requests, _ in batches], [2, 4])
+
+    def test_request_page_shows_archived_requests(self):
+        archive.archive_closed(days=365)
+        url = reverse('request_detail', args=[self.old.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Archived on')
+        self.assertContains(response, 'Thanks, fixed')
+        self.assertNotContains(response, 'id="comment-form"')
+        self.assertEqual(self.client.post(url, {'text': 'Reopen?'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('comment_page', args=[self.old.pk])).status_code, 200)
+        self.assertNotContains(self.client.get(reverse('request_list')), 'Old and done')
+
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_restore(self):
+        before = Request.objects.values('date_submitted', 'last_updated', 'date_completed', 'status').get(pk=self.old.pk)
+        archive.archive_closed(days=365)
+        call_command('restore_requests', str(self.old.pk), stdout=StringIO())
+        self.assertFalse(ArchivedRequest.objects.exists())
+        after = Request.objects.values('date_submitted', 'last_updated', 'date_completed', 'status').get(pk=self.old.pk)
+        self.assertEqual(after, before)
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).text, 'Thanks, fixed')
+        self.assertEqual(self.client.get(reverse('request_detail', args=[self.old.pk])).status_code, 200)
+
+    def test_imports_skip_archived_ids(self):
+        Request.objects.filter(pk__in=[self.recent.pk, self.open.pk]).update(
+            status=Request.Status.RESOLVED, last_updated=timezone.now() - timedelta(days=500))
+        archive.archive_closed(days=365)
+        next_request, next_comment = archive.next_ids()
+        self.assertGreater(next_request, self.open.pk)
+        self.assertGreater(next_comment, self.comment.pk)
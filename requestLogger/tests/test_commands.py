@@ -0,0 +1,269 @@
+import datetime
+import json
+import os
+import tempfile
+from unittest import mock
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+
+from .. import benchmark, search, urls
+from ..imports import reserve_ids
+from ..models import Comment, Company, CompanyDailyRollup, ImportCheckpoint, Project, Request, User
+
+
+class ExplainViewsCommandTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        customer = User.objects.create(username='customer', role='customer', company=company)
+        User.objects.create(username='staffuser', role='staff')
+        project = Project.objects.create(name='Project', description='x', owner=customer, version='1')
+        Request.objects.create(subject='Request', description='x', project=project, requester=customer)
+
+    def test_records_a_plan_per_view_and_role(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'plans.json')
+            call_command('explain_views', output=path, stdout=StringIO())
+            with open(path) as f:
+                plans = json.load(f)['plans']
+            out = StringIO()
+            call_command('explain_views', compare=path, stdout=out)
+
+        self.assertIn('request_list (staff)', plans)
+        self.assertIn('request_detail (customer)', plans)
+        self.assertTrue(all(entry['plan'] for entry in plans.values()))
+        self.assertIn('request_submitted_id_idx', ' '.join(plans['request_list (staff)']['plan']))
+        self.assertNotIn('  + ', out.getvalue())  # nothing changed between the two runs
+
+
+class ExportRequestsCommandTest(TestCase):
+    def test_exports_every_request_to_a_file(self):
+        company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        customer = User.objects.create(username='customer', role='customer', company=company)
+        project = Project.objects.create(name='Project', description='x', owner=customer, version='1')
+        for i in range(5):
+            Request.objects.create(subject='Request %d' % i, description='x', project=project, requester=customer)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'requests.jsonl')
+            call_command('export_requests', output=path, chunk_size=2, stderr=StringIO())
+            with open(path) as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual([row['subject'] for row in rows], ['Request %d' % i for i in range(5)])
+
+
+class ImportRequestsCommandTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.customer = User.objects.create(username='customer', role='customer', company=self.company)
+        self.staff = User.objects.create(username='staffuser', role='staff')
+        self.project = Project.objects.create(name='Project', description='x', owner=self.customer, version='1')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, records):
+        path = os.path.join(self.tmp.name, 'requests.jsonl')
+        with open(path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        return path
+
+    def record(self, i, **extra):
+        return {'subject': 'Imported %d' % i, 'description': 'Legacy ticket', 'project': 'Project',
+                'requester': 'customer', **extra}
+
+    def test_imports_requests_with_comments_and_history(self):
+        path = self.write([
+            self.record(1, status='Resolved', date_submitted='2020-01-02T03:04:05+00:00',
+                        date_completed='2020-01-03T03:04:05+00:00', comments=[
+                {'author': 'staffuser', 'text': 'Fixed in the legacy system', 'created_date': '2020-01-03T00:00:00+00:00'},
+            ]),
+            self.record(2),
+            self.record(3),
+        ])
+        call_command('import_requests', path, batch_size=2, stdout=StringIO())
+
+        request = Request.objects.get(subject='Imported 1')
+        self.assertEqual(request.company, self.company)
+        self.assertEqual(request.date_submitted.year, 2020)
+        self.assertEqual(request.comments.get().created_date.year, 2020)
+        self.assertEqual((request.comment_count, request.last_activity_at), (1, request.comments.get().created_date))
+        self.assertEqual(Request.objects.count(), 3)
+        self.assertEqual((self.company.stats.new_count, self.company.stats.resolved_count), (2, 1))
+        self.assertEqual(search.SearchResults('legacy').count(), 3)
+        # Status history and the analytics rollups for the historical days
+        resolved = CompanyDailyRollup.objects.get(day=datetime.date(2020, 1, 3))
+        self.assertEqual((resolved.resolved, resolved.resolution_seconds_total), (1, 86400))
+
+        # Later inserts carry on from the imported ids
+        later = Request.objects.create(subject='New', description='x', project=self.project, requester=self.customer)
+        self.assertGreater(later.pk, request.pk)
+
+    def test_reserved_ids_are_never_handed_out_again(self):
+        existing = Request.objects.create(subject='Existing', description='x', project=self.project, requester=self.customer)
+        reserved = reserve_ids(Request, 3)
+        self.assertEqual(len(set(reserved)), 3)
+        self.assertGreater(min(reserved), existing.pk)
+        # A row the database numbers itself, as a web request during the import would be
+        later = Request.objects.create(subject='Later', description='x', project=self.project, requester=self.customer)
+        self.assertGreater(later.pk, max(reserved))
+
+    def test_accepts_title_and_body_with_defaults(self):
+        path = self.write([{'request_id': 'abc-1', 'title': 'From the backlog', 'body': 'Details'}])
+        call_command('import_requests', path, project='Project', requester='customer', stdout=StringIO())
+        self.assertEqual(Request.objects.get().description, 'Details')
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write([self.record(1), self.record(2)])
+        out = StringIO()
+        call_command('import_requests', path, dry_run=True, stdout=out)
+        self.assertFalse(Request.objects.exists())
+        self.assertIn('Validated 2 requests', out.getvalue())
+
+    def test_resumes_from_checkpoint_after_a_bad_line(self):
+        checkpoint = os.path.join(self.tmp.name, 'checkpoint.json')
+        path = self.write([self.record(1), self.record(2), self.record(3, project='Missing'), self.record(4)])
+        with self.assertRaisesMessage(CommandError, 'line 3'):
+            call_command('import_requests', path, batch_size=2, checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(Request.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get(name=checkpoint).line, 2)
+
+        path = self.write([self.record(1), self.record(2), self.record(3), self.record(4)])
+        call_command('import_requests', path, batch_size=2, checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(sorted(Request.objects.values_list('subject', flat=True)),
+                         ['Imported 1', 'Imported 2', 'Imported 3', 'Imported 4'])
+
+
+    def test_bad_line_without_checkpoint_reports_what_was_committed(self):
+        path = self.write([self.record(1), self.record(2), self.record(3, project='Missing')])
+        with self.assertRaises(CommandError) as raised:
+            call_command('import_requests', path, batch_size=2, stdout=StringIO())
+        self.assertIn('1 batch with 2 requests committed before this line', str(raised.exception))
+        self.assertNotIn('rerun with', str(raised.exception))
+
+    def test_needs_a_backend_that_can_reserve_ids(self):
+        path = self.write([self.record(1)])
+        with mock.patch('requestLogger.management.commands.import_requests.can_reserve_ids', return_value=False):
+            with self.assertRaisesMessage(CommandError, 'needs PostgreSQL or SQLite'):
+                call_command('import_requests', path, stdout=StringIO())
+        self.assertFalse(Request.objects.exists())
+
+
+class GenerateDataCommandTest(TestCase):
+    options = dict(companies=3, users=8, staff=2, projects=5, requests=40, comments=120, seed=7, stdout=StringIO())
+
+    def test_generates_skewed_consistent_data(self):
+        call_command('generate_data', prefix='one', **self.options)
+
+        self.assertEqual(Company.objects.count(), 3)
+        self.assertEqual(User.objects.filter(role='staff').count(), 2)
+        self.assertEqual(Project.objects.count(), 5)
+        self.assertEqual(Request.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 120)
+        # Denormalised company, counters and the search index are all maintained
+        self.assertFalse(Request.objects.exclude(company=F('requester__company')).exists())
+        for company in Company.objects.all():
+            self.assertEqual(company.stats.project_count, company.projects.count())
+            self.assertEqual(company.stats.new_count, company.requests.filter(status=Request.Status.NEW).count())
+        subject_word = Request.objects.first().subject.split()[0].lower()
+        self.assertGreater(search.SearchResults(subject_word).count(), 0)
+        # The first company gets the most requests
+        sizes = [company.requests.count() for company in Company.objects.order_by('name')]
+        self.assertEqual(max(sizes), sizes[0])
+
+    def test_same_seed_gives_same_data(self):
+        call_command('generate_data', prefix='one', **self.options)
+        first = list(Request.objects.order_by('pk').values_list('subject', 'status'))
+        call_command('generate_data', prefix='two', **self.options)
+        second = list(Request.objects.order_by('pk').values_list('subject', 'status'))[len(first):]
+        self.assertEqual(first, second)
+
+    def test_refuses_an_existing_prefix(self):
+        call_command('generate_data', prefix='one', **self.options)
+        with self.assertRaisesMessage(CommandError, 'already exists'):
+            call_command('generate_data', prefix='one', **self.options)
+
+
+class BenchmarkCommandTest(TestCase):
+    def setUp(self):
+        call_command('generate_data', companies=2, users=4, staff=1, projects=2, requests=10, comments=20,
+                     stdout=StringIO())
+
+    def test_drives_every_url_as_staff_and_customer(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'benchmark.json')
+            call_command('benchmark', iterations=2, warmup=0, output=path, stdout=StringIO())
+            with open(path) as f:
+                report = json.load(f)
+            out = StringIO()
+            call_command('benchmark', iterations=2, warmup=0, compare=path, threshold=1000, stdout=out)
+
+        results = report['results']
+        for pattern in urls.urlpatterns:
+            self.assertIn(f'{pattern.name} (staff)', results)
+            self.assertIn(f'{pattern.name} (customer)', results)
+        self.assertEqual(results['request_list (staff)']['status'], 200)
+        self.assertEqual(results['metrics (customer)']['status'], 404)
+        self.assertTrue(results['metrics (customer)']['error'])
+        self.assertIsNone(results['metrics (customer)']['latency_ms']['p95'])
+        self.assertFalse(results['api_project_detail (staff)']['error'])
+        project, _ = benchmark.sample_objects(User.objects.get(role='staff'))
+        self.assertEqual(results['api_project_detail (staff)']['path'], f'/api/projects/{project.pk}/')
+        self.assertEqual(results['comment_create (customer)']['method'], 'POST')
+        self.assertGreater(results['request_detail (staff)']['queries']['max'], 0)
+        self.assertEqual(report['rows']['Request'], 10)
+        self.assertIn('No regressions', out.getvalue())
+
+    def test_fail_on_error(self):
+        with self.assertRaisesMessage(CommandError, 'metrics (customer)'):
+            call_command('benchmark', iterations=1, warmup=0, read_only=True, fail_on_error=True, stdout=StringIO())
+
+    def test_read_only_skips_writes(self):
+        count = Comment.objects.count()
+        report = benchmark.run(iterations=1, warmup=0, read_only=True)
+        self.assertNotIn('comment_create (staff)', report['results'])
+        self.assertEqual(Comment.objects.count(), count)
+
+    def test_compare_flags_slower_and_chattier_urls(self):
+        def report(p95, queries):
+            return {'results': {'home (staff)': {'status': 200, 'latency_ms': {'p95': p95}, 'queries': {'max': queries}}}}
+
+        regressions = benchmark.compare(report(50.0, 4), report(10.0, 2))
+        self.assertEqual([measure for _, measure, _, _ in regressions], ['p95 ms', 'queries'])
+        self.assertEqual(benchmark.compare(report(10.5, 2), report(10.0, 2)), [])
+
+
+class BenchmarkWritesCommandTest(TransactionTestCase):
+    def test_reports_concurrent_writes_for_both_profiles(self):
+        call_command('generate_data', companies=1, users=1, staff=1, projects=1, requests=5, comments=0, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'writes.json')
+            call_command('benchmark_writes', threads=2, writes=3, baseline=True, output=path, stdout=StringIO())
+            with open(path) as f:
+                runs = json.load(f)
+
+        self.assertEqual(list(runs), ['defaults', 'configured'])
+        for run in runs.values():
+            self.assertEqual(run['writes'], 6)
+            self.assertEqual(run['succeeded'] + run['failed'], 6)
+        self.assertEqual(Comment.objects.count(), runs['defaults']['succeeded'] + runs['configured']['succeeded'])
+
+    def test_needs_data(self):
+        with self.assertRaisesMessage(CommandError, 'generate_data'):
+            call_command('benchmark_writes', stdout=StringIO())
+
+
+class BenchmarkCompressionCommandTest(TestCase):
+    def test_reports_storage_saved(self):
+        user = User.objects.create_user(username='customer', password='pass')
+        project = Project.objects.create(name='Portal', description='x', owner=user, version='1.0')
+        Request.objects.create(subject='Crash', description='Traceback line\n' * 500, project=project, requester=user)
+        report = benchmark.compression_report([100, 100000])
+        self.assertEqual(report['thresholds'][100]['compressed_rows'], 1)
+        self.assertGreater(report['thresholds'][100]['saved_pct'], 90)
+        self.assertEqual(report['thresholds'][100000]['saved_pct'], 0)
+        out = StringIO()
+        call_command('benchmark_compression', '--thresholds', '100', stdout=out)
+        self.assertIn('saved %', out.getvalue())
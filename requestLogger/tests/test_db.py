@@ -0,0 +1,53 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+
+from ..db import close_unhealthy_connections
+
+
+class SqlitePragmaTest(SimpleTestCase):
+    def open(self, **settings_dict):
+        # A second connection wrapper, so the test database connection is left alone
+        default = connections['default']
+        wrapper = default.__class__(dict(default.settings_dict, **settings_dict), alias='pragma_test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal', 'synchronous': 'normal', 'busy_timeout': 1234})
+    def test_new_connections_get_the_configured_pragmas(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wrapper = self.open(NAME=os.path.join(tmp, 'pragmas.sqlite3'))
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+            self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 1234)
+            wrapper.close()
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_no_pragmas_keeps_sqlite_defaults(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wrapper = self.open(NAME=os.path.join(tmp, 'pragmas.sqlite3'))
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'delete')
+            wrapper.close()
+
+
+class ConnectionHealthCheckTest(SimpleTestCase):
+    def test_closes_dead_connections_only_when_enabled(self):
+        for enabled, usable, closed in ((True, False, True), (True, True, False), (False, False, False)):
+            wrapper = mock.Mock(settings_dict={'CONN_HEALTH_CHECKS': enabled}, in_atomic_block=False)
+            wrapper.is_usable.return_value = usable
+            close_unhealthy_connections([wrapper])
+            self.assertEqual(wrapper.close.called, closed)
+
+    def test_leaves_connections_inside_a_transaction(self):
+        wrapper = mock.Mock(settings_dict={'CONN_HEALTH_CHECKS': True}, in_atomic_block=True)
+        wrapper.is_usable.return_value = False
+        close_unhealthy_connections([wrapper])
+        self.assertFalse(wrapper.close.called)
@@ -81,9 +81,12 @@ class UserModelTest(TestCase):
         self.assertEquals(max_length, 20)
 
 
-from django.test import TestCase
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.utils import timezone
-from ..models import Project, User, Company
+from .. import analytics
+from ..models import Project, User, Company, CompanyStats, CompanyDailyRollup, ProjectDailyRollup, RequestStatusEvent
 
 class ProjectModelTest(TestCase):
     @classmethod
@@ -185,3 +188,177 @@ class RequestModelTest(TestCase):
         self.request.save()
         updated_request = Request.objects.get(pk=self.request.pk)
         self.assertEqual(updated_request.status, Request.Status.IN_PROGRESS)
+
+
+class CompanyStatsTest(TestCase):
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Company', address='123 Test St', contact_email='test@test.com')
+        self.other_company = Company.objects.create(name='Other Company', address='456 Test St', contact_email='other@test.com')
+        self.user = User.objects.create(username='testuser', role='customer', company=self.company)
+        self.other_user = User.objects.create(username='otheruser', role='customer', company=self.other_company)
+        self.project = Project.objects.create(name='Test Project', description='A test project', owner=self.user, version='1.0.0')
+
+    def stats(self, company=None):
+        return CompanyStats.objects.get(pk=(company or self.company).pk)
+
+    def create_request(self, **kwargs):
+        kwargs.setdefault('project', self.project)
+        return Request.objects.create(subject='Test Request', requester=self.user, description='Test', **kwargs)
+
+    def test_counts_follow_creates_and_status_changes(self):
+        request = self.create_request()
+        self.create_request(status=Request.Status.RESOLVED)
+        self.assertEqual((self.stats().project_count, self.stats().new_count, self.stats().resolved_count), (1, 1, 1))
+
+        request.status = Request.Status.RESOLVED
+        request.save()
+        self.assertEqual((self.stats().new_count, self.stats().resolved_count), (0, 2))
+
+    def test_counts_follow_deletes(self):
+        request = self.create_request()
+        request.delete()
+        self.assertEqual(self.stats().new_count, 0)
+        self.project.delete()
+        self.assertEqual(self.stats().project_count, 0)
+
+    def test_counts_follow_user_to_new_company(self):
+        request = self.create_request(status=Request.Status.IN_PROGRESS)
+        self.user.company = self.other_company
+        self.user.save()
+        request.refresh_from_db()
+        self.assertEqual(request.company, self.other_company)
+        self.assertEqual((self.stats().project_count, self.stats().in_progress_count), (0, 0))
+        self.assertEqual((self.stats(self.other_company).project_count, self.stats(self.other_company).in_progress_count), (1, 1))
+
+    def test_staff_request_takes_project_company(self):
+        staff = User.objects.create(username='staffuser', role='staff')
+        request = Request.objects.create(subject='Test Request', project=self.project, requester=staff, description='Test')
+        self.assertEqual(request.company, self.company)
+        self.assertEqual(self.project.company, self.company)
+
+    def test_staff_requests_follow_project_to_new_owner_company(self):
+        staff = User.objects.create(username='staffuser', role='staff')
+        staff_request = Request.objects.create(subject='Staff', project=self.project, requester=staff, description='Test')
+        customer_request = self.create_request()
+        self.project.owner = self.other_user
+        self.project.save()
+        staff_request.refresh_from_db()
+        customer_request.refresh_from_db()
+        self.assertEqual(staff_request.company, self.other_company)
+        self.assertEqual(customer_request.company, self.company)
+        self.assertEqual((self.stats().project_count, self.stats().new_count), (0, 1))
+        self.assertEqual((self.stats(self.other_company).project_count, self.stats(self.other_company).new_count), (1, 1))
+
+    def test_rebuild_matches_incremental_counts(self):
+        self.create_request()
+        self.create_request(status=Request.Status.CANCELLED)
+        incremental = CompanyStats.objects.values().get(pk=self.company.pk)
+        CompanyStats.objects.all().delete()
+        call_command('rebuild_company_stats', stdout=StringIO())
+        self.assertEqual(CompanyStats.objects.values().get(pk=self.company.pk), incremental)
+
+
+# Rollup refreshes run inline instead of in the task worker
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class RequestStatusEventTest(TestCase):
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Company', address='123 Test St', contact_email='test@test.com')
+        self.user = User.objects.create(username='testuser', role='customer', company=self.company)
+        self.project = Project.objects.create(name='Test Project', description='A test project', owner=self.user, version='1.0.0')
+        self.request = Request.objects.create(subject='Test Request', project=self.project, requester=self.user, description='Test')
+
+    def rollup(self, model=CompanyDailyRollup, **lookup):
+        lookup = lookup or {'company': self.company}
+        return model.objects.get(day=timezone.localdate(), **lookup)
+
+    def test_logs_creation_and_status_changes(self):
+        self.request.subject = 'Renamed'
+        self.request.save()  # not a status change
+        self.request.status = Request.Status.RESOLVED
+        self.request.save()
+
+        events = list(self.request.status_events.order_by('pk').values_list('from_status', 'to_status'))
+        self.assertEqual(events, [('', Request.Status.NEW), (Request.Status.NEW, Request.Status.RESOLVED)])
+        self.assertIsNotNone(self.request.status_events.get(to_status=Request.Status.RESOLVED).resolution_seconds)
+
+    def test_rollups_follow_each_change(self):
+        self.assertEqual((self.rollup().opened, self.rollup().resolved), (1, 0))
+        self.request.status = Request.Status.RESOLVED
+        self.request.save()
+        rollup = self.rollup(ProjectDailyRollup, project=self.project)
+        self.assertEqual((rollup.opened, rollup.resolved, rollup.resolved_within_sla), (1, 1, 1))
+        self.assertEqual(sum(rollup.resolution_histogram), 1)
+
+        other = Request.objects.create(subject='Second', project=self.project, requester=self.user, description='Test')
+        other.status = Request.Status.REJECTED
+        other.save()
+        self.assertEqual((self.rollup().opened, self.rollup().resolved, self.rollup().rejected), (2, 1, 1))
+
+    def test_history_outlives_deleted_requests(self):
+        pk = self.request.pk
+        self.request.delete()
+        self.assertTrue(RequestStatusEvent.objects.filter(request_id=pk).exists())
+        self.assertEqual(self.rollup().opened, 1)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.request.status = Request.Status.RESOLVED
+        self.request.save()
+        fields = ('opened', 'resolved', 'resolved_within_sla', 'resolution_seconds_total', 'resolution_p90_seconds', 'resolution_histogram')
+        incremental = CompanyDailyRollup.objects.values(*fields).get()
+        CompanyDailyRollup.objects.all().delete()
+        call_command('rollup_request_stats', stdout=StringIO())
+        self.assertEqual(CompanyDailyRollup.objects.values(*fields).get(), incremental)
+
+    def test_histogram_percentile(self):
+        histogram = [0] * (len(analytics.HISTOGRAM_BOUNDS) + 1)
+        histogram[0], histogram[3] = 9, 1
+        self.assertEqual(analytics.histogram_percentile(histogram, 0.90), 3600)
+        self.assertEqual(analytics.histogram_percentile(histogram, 0.99), 8 * 3600)
+        histogram[-1] = 90
+        self.assertIsNone(analytics.histogram_percentile(histogram, 0.90))
+
+
+from django.db import connection
+from ..fields import COMPRESSED_MARKER
+
+
+class CompressedTextFieldTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.project = Project.objects.create(name='Test Project', owner=self.user)
+        self.log = 'ERROR 2024-01-01 worker crashed\n' * 200
+
+    def stored(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT description FROM requestLogger_request WHERE id = %s', [pk])
+            return cursor.fetchone()[0]
+
+    @override_settings(COMPRESSED_TEXT_THRESHOLD=100)
+    def test_long_text_is_stored_compressed(self):
+        request = Request.objects.create(subject='Crash', project=self.project, requester=self.user, description=self.log)
+        self.assertTrue(self.stored(request.pk).startswith(COMPRESSED_MARKER))
+        self.assertLess(len(self.stored(request.pk)), len(self.log) / 10)
+        self.assertEqual(Request.objects.get(pk=request.pk).description, self.log)
+        self.assertEqual(Request.objects.values_list('description', flat=True).get(pk=request.pk), self.log)
+
+        short = Request.objects.create(subject='Short', project=self.project, requester=self.user, description='Short')
+        self.assertEqual(self.stored(short.pk), 'Short')
+        self.assertTrue(Request.objects.filter(description='Short').exists())
+
+    @override_settings(COMPRESSED_TEXT_THRESHOLD=100)
+    def test_updates_compress(self):
+        request = Request.objects.create(subject='Crash', project=self.project, requester=self.user, description='x')
+        Request.objects.filter(pk=request.pk).update(description=self.log)
+        self.assertTrue(self.stored(request.pk).startswith(COMPRESSED_MARKER))
+        request.description = self.log + 'again'
+        Request.objects.bulk_update([request], ['description'])
+        self.assertTrue(self.stored(request.pk).startswith(COMPRESSED_MARKER))
+        self.assertEqual(Request.objects.get(pk=request.pk).description, self.log + 'again')
+
+    def test_text_that_looks_compressed_round_trips(self):
+        text = COMPRESSED_MARKER + 'not really'
+        request = Request.objects.create(subject='Odd', project=self.project, requester=self.user, description=text)
+        self.assertEqual(Request.objects.get(pk=request.pk).description, text)
@@ -0,0 +1,105 @@
+import smtplib
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Company, Notification, Project, Request, Task, User
+from ..notifications import send_digests
+from ..tasks import Worker, run_pending
+
+opened = []
+
+
+class CountingBackend(EmailBackend):
+    def open(self):
+        opened.append(self)
+        return super().open()
+
+
+class NotificationDigestTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name='Acme', address='1 Test St', contact_email='contact@acme.test')
+        self.customer = User.objects.create_user(username='customer', email='customer@acme.test', password='pass', role='customer', company=company)
+        self.staff = User.objects.create_user(username='staff', email='staff@example.test', password='pass', role='staff')
+        project = Project.objects.create(name='Portal', description='x', owner=self.customer, version='1.0')
+        self.request = Request.objects.create(subject='Login broken', description='x', project=project, requester=self.customer)
+
+    def pending(self):
+        return sorted(Notification.objects.filter(sent_at__isnull=True).values_list('email', 'kind'))
+
+    def test_activity_is_collected_per_recipient(self):
+        run_pending()
+        self.client.force_login(self.staff)
+        self.client.post(reverse('comment_create', args=[self.request.pk]), {'text': 'Looking into it'})
+        self.request.status = Request.Status.IN_PROGRESS
+        self.request.save()
+        # Nothing is sent from the request itself
+        self.assertEqual(mail.outbox, [])
+        run_pending()
+        self.assertEqual(self.pending(), [
+            ('contact@acme.test', 'comment'), ('contact@acme.test', 'status'), ('contact@acme.test', 'status'),
+            ('customer@acme.test', 'comment'), ('customer@acme.test', 'status'), ('customer@acme.test', 'status'),
+            # The commenting staff member follows the request from then on, but isn't told of their own comment
+            ('staff@example.test', 'status'),
+        ])
+        # The digest waits for NOTIFICATION_DIGEST_INTERVAL
+        self.assertTrue(Task.objects.filter(name='notifications.send_digests', status=Task.Status.QUEUED).exists())
+
+    @override_settings(EMAIL_BACKEND='requestLogger.tests.test_notifications.CountingBackend')
+    def test_one_digest_per_recipient_over_one_connection(self):
+        run_pending()
+        self.request.status = Request.Status.RESOLVED
+        self.request.save()
+        run_pending()
+        opened.clear()
+
+        self.assertEqual(send_digests(), 2)
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['contact@acme.test', 'customer@acme.test'])
+        body = mail.outbox[0].body
+        self.assertIn('Login broken', body)
+        self.assertIn('New request (New)', body)
+        self.assertIn('Status changed from New to Resolved', body)
+        self.assertIn(f'/request/{self.request.pk}/', body)
+        self.assertEqual(self.pending(), [])
+        self.assertEqual(send_digests(), 0)
+
+    def test_failed_sends_stay_pending(self):
+        run_pending()
+        original = EmailBackend.send_messages
+
+        def send_messages(self, messages):
+            if messages[0].to == ['contact@acme.test']:
+                raise smtplib.SMTPRecipientsRefused({})
+            return original(self, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', send_messages), self.assertLogs('requestLogger.notifications'):
+            self.assertEqual(send_digests(), 1)
+        self.assertEqual(self.pending(), [('contact@acme.test', 'status')])
+
+    def test_a_failed_run_keeps_what_was_sent(self):
+        run_pending()
+        original = EmailBackend.send_messages
+
+        def send_messages(self, messages):
+            if messages[0].to == ['customer@acme.test']:
+                raise RuntimeError('template broke')
+            return original(self, messages)
+
+        digest = Task.objects.get(name='notifications.send_digests')
+        with mock.patch.object(EmailBackend, 'send_messages', send_messages):
+            self.assertFalse(Worker().run(digest))
+        # The contact address was mailed before the failure and isn't mailed again
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.pending(), [('customer@acme.test', 'status')])
+
+    def test_command_sends_pending_digests(self):
+        run_pending()
+        out = StringIO()
+        call_command('send_notification_digests', stdout=out)
+        self.assertIn('Sent 2 digest emails.', out.getvalue())
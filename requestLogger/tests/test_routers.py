@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from requestLogger import routers
+from requestLogger.models import Company, Project, Request, User
+
+
+@override_settings(REPLICA_DATABASES=['replica1', 'replica2'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_go_to_the_primary_by_default(self):
+        with routers.routing_state():
+            self.assertEqual(self.router.db_for_read(Request), 'default')
+        self.assertEqual(self.router.db_for_read(Request), 'default')
+
+    def test_reads_go_to_a_replica_until_something_is_written(self):
+        with routers.routing_state():
+            alias = routers.use_replica()
+            self.assertIn(alias, ['replica1', 'replica2'])
+            self.assertEqual(self.router.db_for_read(Request), alias)
+            self.assertEqual(routers.use_replica(), alias)
+            self.assertEqual(self.router.db_for_write(Request), 'default')
+            self.assertEqual(self.router.db_for_read(Request), 'default')
+        self.assertEqual(self.router.db_for_read(Request), 'default')
+
+    def test_pinned_users_read_from_the_primary(self):
+        with routers.routing_state(pinned=True):
+            self.assertEqual(routers.use_replica(), 'default')
+            self.assertEqual(self.router.db_for_read(Request), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'requestLogger'))
+        self.assertIsNone(self.router.allow_migrate('default', 'requestLogger'))
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaPinMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        company = Company.objects.create(name='Acme', address='1 Test St', contact_email='acme@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=company)
+        self.project = Project.objects.create(name='Portal', description='x', owner=self.customer, version='1.0')
+        self.client.force_login(self.customer)
+
+    def test_a_write_pins_the_user_to_the_primary(self):
+        chosen = []
+        use_replica = routers.use_replica
+
+        def record():
+            chosen.append(use_replica())
+            return chosen[-1]
+
+        with mock.patch.object(routers, 'use_replica', record):
+            self.client.get(reverse('request_list'))
+            response = self.client.post(reverse('request_create'), {
+                'subject': 'Pinned', 'request_type': 'Change', 'project': self.project.pk, 'description': 'x'})
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 5)
+            self.client.get(reverse('request_list'))
+        self.assertEqual(chosen, ['replica1', 'default'])
@@ -0,0 +1,133 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import search
+from ..models import Comment, Company, Project, ProjectDailyRollup, Request, Task, User
+from ..tasks import Worker, enqueue, purge_done, recover_stale, requeue, run_pending, task
+
+calls = []
+
+
+@task('tests.record')
+def record(**kwargs):
+    calls.append(kwargs)
+
+
+@task('tests.fail', max_attempts=2)
+def fail():
+    raise ValueError('always fails')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_queued_tasks_run_in_the_worker(self):
+        enqueue('tests.record', value=1)
+        self.assertEqual(calls, [])
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [{'value': 1}])
+        queued = Task.objects.get()
+        self.assertEqual(queued.status, Task.Status.DONE)
+        self.assertEqual(queued.attempts, 1)
+
+    def test_delayed_tasks_wait(self):
+        enqueue('tests.record', delay=60)
+        self.assertEqual(run_pending(), 0)
+
+    def test_idempotency_key_skips_duplicates_while_queued(self):
+        enqueue('tests.record', key='same', value=1)
+        enqueue('tests.record', key='same', value=2)
+        self.assertEqual(Task.objects.count(), 1)
+        run_pending()
+        # Once the first has run, the key is free again
+        enqueue('tests.record', key='same', value=3)
+        run_pending()
+        self.assertEqual(calls, [{'value': 1}, {'value': 3}])
+
+    def test_failures_are_retried_with_backoff_then_dead(self):
+        enqueue('tests.fail')
+        with self.assertLogs('requestLogger.tasks', 'WARNING'):
+            run_pending()
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.Status.QUEUED)
+        self.assertEqual(failed.attempts, 1)
+        self.assertGreater(failed.run_after, timezone.now())
+        self.assertIn('always fails', failed.last_error)
+
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('requestLogger.tasks', 'ERROR'):
+            run_pending()
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, Task.Status.DEAD)
+        self.assertEqual(failed.attempts, 2)
+
+        requeue(Task.objects.all())
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), (Task.Status.QUEUED, 0))
+
+    def test_claimed_tasks_are_not_claimed_twice(self):
+        enqueue('tests.record')
+        self.assertEqual(len(Worker(name='one').claim()), 1)
+        self.assertEqual(Worker(name='two').claim(), [])
+
+    def test_stale_tasks_are_requeued_and_old_ones_purged(self):
+        enqueue('tests.record')
+        Worker(name='lost').claim()
+        Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(recover_stale(), 1)
+        run_pending()
+        Task.objects.update(finished_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(purge_done(), 1)
+
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        enqueue('tests.record', value=1)
+        self.assertEqual(calls, [{'value': 1}])
+        self.assertFalse(Task.objects.exists())
+
+    def test_run_tasks_once(self):
+        enqueue('tests.record')
+        out = StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertIn('Ran 1 tasks.', out.getvalue())
+
+
+class SideEffectTaskTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.user = User.objects.create_user(username='customer', password='pass', role='customer', company=company)
+        self.project = Project.objects.create(name='Test Project', description='A project', owner=self.user, version='1.0')
+        self.client.force_login(self.user)
+
+    def queued(self):
+        return sorted(Task.objects.filter(status=Task.Status.QUEUED).values_list('name', flat=True))
+
+    def test_request_create_queues_indexing_and_rollups(self):
+        response = self.client.post(reverse('request_create'), {
+            'subject': 'Printer jammed', 'description': 'Again', 'request_type': 'Change', 'project': self.project.pk,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.queued(), ['analytics.refresh_rollups', 'notifications.status_change', 'search.reindex_request'])
+        self.assertFalse(ProjectDailyRollup.objects.exists())
+
+        run_pending()
+        self.assertEqual(ProjectDailyRollup.objects.get().opened, 1)
+        if search.fts_enabled():
+            self.assertEqual(len(search.search_requests('printer', self.user)), 1)
+
+    def test_comment_post_queues_indexing(self):
+        request = Request.objects.create(subject='Request', description='x', project=self.project, requester=self.user)
+        Task.objects.all().delete()
+        self.client.post(reverse('comment_create', args=[request.pk]), {'text': 'Flux capacitor'})
+        self.assertTrue(Comment.objects.exists())
+        if search.fts_enabled():
+            self.assertEqual(self.queued(), ['notifications.comment', 'search.reindex_comment'])
+            self.assertEqual(len(search.search_requests('flux', self.user)), 0)
+            run_pending()
+            self.assertEqual(len(search.search_requests('flux', self.user)), 1)
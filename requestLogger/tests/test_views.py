@@ -1,9 +1,27 @@
-from django.test import TestCase, Client
+import csv
+import io
+import json
+import re
+from collections import defaultdict
+import tempfile
+from urllib.parse import urlencode
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
-from ..models import Company, Project, Request
+from ..fields import COMPRESSED_MARKER
+from ..models import Company, CompanyStats, Notification, Project, Request, Comment, RequestStatusEvent
+from .. import metrics
 from ..views import ProjectListView, ProjectDetailView, ProjectUpdateView, ProjectDeleteView, IndexView, RequestListView, RequestDeleteView, RequestUpdateView, RequestDetailView, RequestCreateView, OpenRequestListView, ProjectCreateView
 from django.contrib.auth import get_user_model
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 
 class IndexViewTest(TestCase):
@@ -134,3 +152,797 @@ class TestProjectDeleteView(TestCase):
         self.assertEqual(response.status_code, 302) # Check if redirected
         self.assertFalse(Project.objects.filter(id=self.project1.id).exists()) # Check if project1 is deleted
 
+
+
+class RequestListViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.other_company = Company.objects.create(name='Other Company', address='2 Test St', contact_email='other@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        self.other_customer = User.objects.create_user(username='other', password='otherpass', role='customer', company=self.other_company)
+        self.staff_user = User.objects.create_user(username='staffuser', password='staffpass', role='staff')
+        self.project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+        self.other_project = Project.objects.create(name='Other Project', description='A project', owner=self.other_customer, version='1.0')
+
+    def create_requests(self, count, **kwargs):
+        kwargs.setdefault('project', self.project)
+        kwargs.setdefault('requester', self.customer)
+        return [
+            Request.objects.create(subject='Request %d' % i, description='Description', **kwargs)
+            for i in range(count)
+        ]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.staff_user)
+        self.create_requests(3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('request_list'))
+        self.create_requests(30)
+        self.create_requests(30, project=self.other_project, requester=self.other_customer)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('request_list'), {'page_size': 50})
+        self.assertEqual(len(response.context['object_list']), 50)
+        self.assertEqual(len(small), len(large))
+
+    def test_cursor_walks_every_row_once(self):
+        self.client.force_login(self.staff_user)
+        created = self.create_requests(7)
+        seen = []
+        params = {'page_size': 3}
+        while True:
+            response = self.client.get(reverse('request_list'), params)
+            seen.extend(request.pk for request in response.context['object_list'])
+            if not response.context['next_cursor']:
+                break
+            params = {'page_size': 3, 'after': response.context['next_cursor']}
+        self.assertEqual(seen, [request.pk for request in reversed(created)])
+
+        # Stepping back from the last page returns the page before it
+        response = self.client.get(reverse('request_list'), {'page_size': 3, 'before': response.context['previous_cursor']})
+        self.assertEqual([request.pk for request in response.context['object_list']], seen[3:6])
+
+    def test_page_links_keep_the_other_parameters(self):
+        self.client.force_login(self.staff_user)
+        self.create_requests(3)
+        response = self.client.get(reverse('request_list'), {'page_size': 2, 'sort': 'oldest'})
+        next_link = urlencode({'page_size': 2, 'sort': 'oldest', 'after': response.context['next_cursor']})
+        self.assertContains(response, 'href="?%s"' % next_link.replace('&', '&amp;'))
+        response = self.client.get(reverse('request_list'), {'page_size': 2, 'sort': 'oldest', 'after': response.context['next_cursor']})
+        self.assertContains(response, 'href="?page_size=2&amp;sort=oldest"')
+        self.assertContains(response, 'href="?page_size=2&amp;sort=oldest&amp;before=')
+
+    def test_empty_row_spans_every_column(self):
+        self.client.force_login(self.staff_user)
+        self.assertContains(self.client.get(reverse('request_list')), 'colspan="10"')
+        self.client.force_login(self.customer)
+        self.assertContains(self.client.get(reverse('request_list')), 'colspan="9"')
+
+    def test_invalid_cursor_returns_404(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('request_list'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_customer_only_sees_own_company(self):
+        self.create_requests(2)
+        self.create_requests(2, project=self.other_project, requester=self.other_customer)
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('request_list'))
+        self.assertEqual({request.requester for request in response.context['object_list']}, {self.customer})
+
+    def test_open_list_excludes_closed_requests(self):
+        open_request, = self.create_requests(1)
+        self.create_requests(1, status=Request.Status.RESOLVED)
+        self.create_requests(1, project=self.other_project, requester=self.other_customer)
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('request_list_open'))
+        self.assertEqual(list(response.context['object_list']), [open_request])
+
+
+class IndexViewCountersTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        self.project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+        self.client.force_login(self.customer)
+
+    def test_counters_cost_the_same_regardless_of_volume(self):
+        Request.objects.create(subject='Request', description='x', project=self.project, requester=self.customer)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('home'))
+        for status in [Request.Status.NEW] * 5 + [Request.Status.RESOLVED] * 3:
+            Request.objects.create(subject='Request', description='x', project=self.project, requester=self.customer, status=status)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(response.context['num_projects'], 1)
+        self.assertEqual(response.context['num_outstanding_requests'], 6)
+        self.assertEqual(response.context['num_resolved_requests'], 3)
+
+
+# Index and rollup updates run inline instead of in the task worker
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class RequestSearchViewTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.other_company = Company.objects.create(name='Other Company', address='2 Test St', contact_email='other@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        self.other_customer = User.objects.create_user(username='other', password='otherpass', role='customer', company=self.other_company)
+        self.project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+        self.other_project = Project.objects.create(name='Other Project', description='A project', owner=self.other_customer, version='1.0')
+        self.client.force_login(self.customer)
+
+    def create_request(self, subject, description='', requester=None, project=None):
+        return Request.objects.create(subject=subject, description=description,
+                                      project=project or self.project, requester=requester or self.customer)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('request_search'), {'q': query, **params})
+        return [request.pk for request in response.context['object_list']]
+
+    def test_subject_matches_rank_above_description_matches(self):
+        in_description = self.create_request('Printer', 'The invoice export keeps failing')
+        in_subject = self.create_request('Invoice export broken', 'Nothing else to add')
+        self.create_request('Unrelated', 'Nothing here')
+        self.assertEqual(self.search('invoice'), [in_subject.pk, in_description.pk])
+
+    def test_comments_are_searchable_and_indexed_on_save(self):
+        request = self.create_request('Printer', 'Out of toner')
+        self.assertEqual(self.search('firmware'), [])
+        Comment.objects.create(request=request, author=self.customer, text='Firmware upgrade needed')
+        self.assertEqual(self.search('firmware'), [request.pk])
+
+        request.subject = 'Scanner'
+        request.save()
+        self.assertEqual(self.search('scanner'), [request.pk])
+        request.delete()
+        self.assertEqual(self.search('scanner firmware'), [])
+
+    def test_results_are_tenant_filtered(self):
+        mine = self.create_request('Database migration')
+        self.create_request('Database migration', requester=self.other_customer, project=self.other_project)
+        self.assertEqual(self.search('database'), [mine.pk])
+
+    def test_results_are_paginated(self):
+        for i in range(5):
+            self.create_request('Backup %d' % i)
+        with self.settings(LIST_PAGE_SIZE=2):
+            response = self.client.get(reverse('request_search'), {'q': 'backup'})
+        self.assertEqual(response.context['paginator'].count, 5)
+        self.assertEqual(len(response.context['object_list']), 2)
+
+    def test_like_fallback_on_other_backends(self):
+        request = self.create_request('Backup', 'Nightly job')
+        Comment.objects.create(request=request, author=self.customer, text='Restore tested')
+        with mock.patch('requestLogger.search.fts_enabled', return_value=False):
+            self.assertEqual(self.search('restore nightly'), [request.pk])
+
+    @override_settings(COMPRESSED_TEXT_THRESHOLD=100)
+    def test_long_text_is_found(self):
+        log = 'ERROR worker crashed\n' * 50
+        request = self.create_request('Crash', log + 'segfault in importer')
+        Comment.objects.create(request=request, author=self.customer, text=log + 'stack trace attached')
+        self.assertTrue(Request.objects.filter(pk=request.pk, description__startswith=COMPRESSED_MARKER).exists())
+        self.assertEqual(self.search('segfault'), [request.pk])
+        self.assertEqual(self.search('attached'), [request.pk])
+
+        # Other backends search with LIKE, so there long text is stored plain
+        with mock.patch('requestLogger.search.fts_enabled', return_value=False), \
+                mock.patch('requestLogger.fields.compression_enabled', return_value=False):
+            request = self.create_request('Crash again', log + 'overflow in exporter')
+            Comment.objects.create(request=request, author=self.customer, text=log + 'core dumped')
+            self.assertFalse(Request.objects.filter(pk=request.pk, description__startswith=COMPRESSED_MARKER).exists())
+            self.assertEqual(self.search('overflow dumped'), [request.pk])
+
+
+class RequestExportViewTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.other_company = Company.objects.create(name='Other Company', address='2 Test St', contact_email='other@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        other_customer = User.objects.create_user(username='other', password='otherpass', role='customer', company=self.other_company)
+        project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+        other_project = Project.objects.create(name='Other Project', description='A project', owner=other_customer, version='1.0')
+        self.request = Request.objects.create(subject='Open, with "quotes"', description='x', project=project, requester=self.customer)
+        Request.objects.create(subject='Done', description='x', project=project, requester=self.customer, status=Request.Status.RESOLVED)
+        Request.objects.create(subject='Not mine', description='x', project=other_project, requester=other_customer)
+        Comment.objects.create(request=self.request, author=self.customer, text='First')
+        Comment.objects.create(request=self.request, author=self.customer, text='Second')
+        self.client.force_login(self.customer)
+
+    def export(self, **params):
+        response = self.client.get(reverse('request_export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_jsonl_export_is_tenant_scoped(self):
+        response, body = self.export(format='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['subject'] for row in rows], ['Open, with "quotes"', 'Done'])
+        self.assertEqual(rows[0]['comment_count'], 2)
+        self.assertEqual(rows[0]['project'], 'Test Project')
+        self.assertEqual(rows[0]['requester'], 'customer')
+
+    def test_csv_export_of_open_requests(self):
+        response, body = self.export(format='csv', open='1')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['subject'] for row in rows], ['Open, with "quotes"'])
+        self.assertEqual(rows[0]['comment_count'], '2')
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('request_export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+
+class RequestDetailFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+        self.request = Request.objects.create(subject='Cached', description='Original description', project=project, requester=self.customer)
+        Comment.objects.create(request=self.request, author=self.customer, text='First comment')
+        self.url = reverse('request_detail', args=[self.request.pk])
+        self.client.force_login(self.customer)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        comment_queries = [q for q in queries if 'FROM "requestLogger_comment"' in q['sql']]
+        return response.content.decode(), comment_queries
+
+    def check_invalidation(self):
+        body, comment_queries = self.get()
+        self.assertIn('First comment', body)
+        self.assertEqual(len(comment_queries), 1)
+
+        body, comment_queries = self.get()
+        self.assertIn('First comment', body)
+        self.assertEqual(comment_queries, [])  # served from the cached fragment
+
+        Comment.objects.create(request=self.request, author=self.customer, text='Second comment')
+        body, comment_queries = self.get()
+        self.assertIn('Second comment', body)
+
+        self.request.description = 'Edited description'
+        self.request.save()
+        body, _ = self.get()
+        self.assertIn('Edited description', body)
+        self.assertNotIn('Original description', body)
+
+    def test_fragments_with_local_memory_cache(self):
+        self.check_invalidation()
+
+    def test_renamed_requester_shows_at_once(self):
+        self.get()
+        self.assertContains(self.client.get(reverse('request_list')), '<td>customer</td>')
+        User.objects.filter(pk=self.customer.pk).update(username='renamed')
+        body, _ = self.get()
+        self.assertIn('<strong>Requester:</strong> renamed', body)
+        response = self.client.get(reverse('request_list'))
+        self.assertContains(response, '<td>renamed</td>')
+
+    def test_thread_fragment_follows_the_database(self):
+        self.get()
+        # Nothing is invalidated in the cache, as on a worker the comment wasn't posted to
+        Comment.objects.create(request=self.request, author=self.customer, text='From elsewhere')
+        body, comment_queries = self.get()
+        self.assertIn('From elsewhere', body)
+        self.assertEqual(len(comment_queries), 1)
+
+    def test_fragments_with_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            with self.settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                self.check_invalidation()
+
+
+@override_settings(COMMENT_PAGE_SIZE=20)
+class CommentThreadPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        other_company = Company.objects.create(name='Other Company', address='2 Test St', contact_email='other@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=company)
+        self.outsider = User.objects.create_user(username='outsider', password='outsiderpass', role='customer', company=other_company)
+        project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+        self.request = Request.objects.create(subject='Long thread', description='x', project=project, requester=self.customer)
+        self.client.force_login(self.customer)
+
+    def add_comments(self, count):
+        base = timezone.now()
+        comments = Comment.objects.bulk_create([
+            Comment(request=self.request, author=self.customer, text=f'Comment {i:03d}') for i in range(count)
+        ])
+        for i, comment in enumerate(comments):
+            Comment.objects.filter(pk=comment.pk).update(created_date=base + timedelta(minutes=i))
+
+    def shown(self, html):
+        return re.findall(r'Comment (\d{3})', html)
+
+    def first_render_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('request_detail', args=[self.request.pk]))
+        return response, len(queries)
+
+    def test_newest_page_first_in_constant_queries(self):
+        self.add_comments(3)
+        _, few = self.first_render_queries()
+        self.add_comments(60)
+        response, many = self.first_render_queries()
+        self.assertEqual(few, many)
+        html = response.content.decode()
+        self.assertEqual(len(self.shown(html)), 20)
+        self.assertEqual(self.shown(html)[0], '059')
+        self.assertIn('Older comments', html)
+
+    def test_older_pages_load_from_the_fragment_endpoint(self):
+        self.add_comments(45)
+        html = self.client.get(reverse('request_detail', args=[self.request.pk])).content.decode()
+        seen = self.shown(html)
+        while 'data-fragment="' in html:
+            url = html.split('data-fragment="')[1].split('"')[0].replace('&amp;', '&')
+            response = self.client.get(url)
+            self.assertNotContains(response, '<html')
+            html = response.content.decode()
+            seen += self.shown(html)
+        self.assertEqual(seen, [f'{i:03d}' for i in reversed(range(45))])
+
+    def test_older_pages_without_javascript(self):
+        self.add_comments(25)
+        html = self.client.get(reverse('request_detail', args=[self.request.pk])).content.decode()
+        older = html.split('class="comments-more" href="')[1].split('"')[0]
+        html = self.client.get(older).content.decode()
+        self.assertEqual(self.shown(html), [f'{i:03d}' for i in reversed(range(5))])
+        self.assertNotIn('No comments yet', html)
+
+    def test_other_companies_get_404(self):
+        self.client.force_login(self.outsider)
+        response = self.client.get(reverse('comment_page', args=[self.request.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentCreateTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        other_company = Company.objects.create(name='Other Company', address='2 Test St', contact_email='other@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=company)
+        self.outsider = User.objects.create_user(username='outsider', password='outsiderpass', role='customer', company=other_company)
+        project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+        self.request = Request.objects.create(subject='Request', description='x', project=project, requester=self.customer)
+        self.url = reverse('comment_create', args=[self.request.pk])
+        self.client.force_login(self.customer)
+
+    def test_form_post_redirects_back_to_request(self):
+        response = self.client.post(self.url, {'text': 'Looks good'})
+        self.assertRedirects(response, reverse('request_detail', args=[self.request.pk]))
+        self.assertEqual(self.request.comments.get().text, 'Looks good')
+        self.assertContains(self.client.get(response.url), 'Looks good')
+
+    def test_json_post_returns_the_new_comment(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'text': 'Via fetch'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['text'], 'Via fetch')
+        self.assertIn('Via fetch', response.json()['html'])
+        writes = [q for q in queries if q['sql'].startswith('INSERT INTO "requestLogger_comment"')]
+        self.assertEqual(len(writes), 1)
+
+    def test_fragment_post_and_validation_errors(self):
+        response = self.client.post(self.url, {'text': 'Fragment'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertContains(response, 'Fragment', status_code=201)
+        response = self.client.post(self.url, {'text': ''}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_other_companies_cannot_comment(self):
+        self.client.force_login(self.outsider)
+        response = self.client.post(self.url, {'text': 'Sneaky'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_anonymous_users_are_sent_to_login(self):
+        self.client.logout()
+        response = self.client.post(self.url, {'text': 'Anonymous'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/login/'))
+
+    def test_detail_view_post_redirects(self):
+        response = self.client.post(reverse('request_detail', args=[self.request.pk]), {'text': 'Old path'})
+        self.assertRedirects(response, reverse('request_detail', args=[self.request.pk]))
+
+    async def test_runs_under_the_async_client(self):
+        await sync_to_async(self.async_client.force_login)(self.customer)
+        response = await self.async_client.post(self.url, 'text=Async', content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(await sync_to_async(Comment.objects.filter(text='Async').exists)())
+
+
+class QueryMetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.staff_user = User.objects.create_user(username='staffuser', password='staffpass', role='staff')
+        company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=company)
+
+    def test_response_reports_query_count_and_timings(self):
+        self.client.force_login(self.staff_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('request_list'))
+        self.assertEqual(response['X-Query-Count'], str(len(queries)))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_staff_report_has_percentiles_per_url_name(self):
+        self.client.force_login(self.staff_user)
+        for _ in range(3):
+            self.client.get(reverse('request_list'))
+        self.client.get(reverse('project_list'))
+        report = self.client.get(reverse('metrics')).json()
+        self.assertEqual(report['request_list']['count'], 3)
+        self.assertEqual(set(report['request_list']['wall_ms']), {'p50', 'p95', 'p99'})
+        self.assertGreater(report['request_list']['template_ms']['p50'], 0)
+        self.assertIn('project_list', report)
+
+        out = StringIO()
+        call_command('view_metrics', stdout=out)
+        self.assertIn('request_list', out.getvalue())
+
+    def test_workers_flushing_together_keep_every_sample(self):
+        metrics.record('request_list', 1, 1, 1, 1)
+        metrics.flush()
+        # A second worker that flushes after reading the same cache state
+        with mock.patch.object(metrics, 'worker_id', return_value='other:2'), \
+                mock.patch.object(metrics, '_windows', {}), mock.patch.object(metrics, '_pending', defaultdict(list)):
+            metrics.record('request_list', 2, 2, 2, 2)
+            metrics.flush()
+        metrics.record('request_list', 3, 3, 3, 3)
+        self.assertEqual(metrics.summary()['request_list']['count'], 3)
+
+        metrics.reset()
+        self.assertEqual(metrics.summary(), {})
+
+    def test_report_is_staff_only(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    def test_percentiles(self):
+        values = list(range(1, 101))
+        self.assertEqual((metrics.percentile(values, 0.5), metrics.percentile(values, 0.95), metrics.percentile(values, 0.99)), (50, 95, 99))
+
+
+class TenantScopingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        other_company = Company.objects.create(name='Other Company', address='2 Test St', contact_email='other@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=company)
+        self.colleague = User.objects.create_user(username='colleague', password='colleaguepass', role='customer', company=company)
+        self.other = User.objects.create_user(username='other', password='otherpass', role='customer', company=other_company)
+        self.staff_user = User.objects.create_user(username='staffuser', password='staffpass', role='staff')
+        self.project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+        self.request = Request.objects.create(subject='Scoped', description='x', project=self.project, requester=self.customer)
+
+    def count_queries(self, user, url):
+        cache.clear()  # render fragments afresh for each user
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response.status_code, len(queries)
+
+    def test_access_check_adds_no_queries(self):
+        for name, pk in (('request_detail', self.request.pk), ('project_detail', self.project.pk), ('request_edit', self.request.pk)):
+            url = reverse(name, args=[pk])
+            staff_status, staff_queries = self.count_queries(self.staff_user, url)
+            customer_status, customer_queries = self.count_queries(self.customer, url)
+            self.assertEqual((staff_status, customer_status), (200, 200), name)
+            self.assertEqual(customer_queries, staff_queries, name)
+
+    def test_other_company_gets_404_from_the_initial_query(self):
+        for name, pk in (('request_detail', self.request.pk), ('project_detail', self.project.pk),
+                         ('request_edit', self.request.pk), ('request_delete', self.request.pk),
+                         ('project_edit', self.project.pk)):
+            status, queries = self.count_queries(self.other, reverse(name, args=[pk]))
+            self.assertEqual(status, 404, name)
+        # Session, user and the one scoped lookup
+        self.assertEqual(queries, 3)
+
+    def test_only_owner_or_staff_can_delete_a_project(self):
+        self.client.force_login(self.colleague)
+        self.assertEqual(self.client.post(reverse('project_delete', args=[self.project.pk])).status_code, 404)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.post(reverse('project_delete', args=[self.project.pk])).status_code, 302)
+        self.assertFalse(Project.objects.exists())
+
+    def test_visible_to(self):
+        self.assertEqual(list(Request.objects.visible_to(self.customer)), [self.request])
+        self.assertEqual(list(Request.objects.visible_to(self.other)), [])
+        self.assertEqual(list(Request.objects.visible_to(self.staff_user)), [self.request])
+        Comment.objects.create(request=self.request, author=self.customer, text='Hello')
+        self.assertEqual(Comment.objects.visible_to(self.colleague).count(), 1)
+        self.assertEqual(Comment.objects.visible_to(self.other).count(), 0)
+        # A customer without a company sees nothing rather than every company-less row
+        orphan = User.objects.create_user(username='orphan', password='orphanpass', role='customer')
+        self.assertEqual(list(Request.objects.visible_to(orphan)), [])
+
+
+# Index and rollup updates run inline instead of in the task worker
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class AnalyticsViewTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name='Test Company', address='1 Test St', contact_email='test@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=company)
+        self.staff_user = User.objects.create_user(username='staffuser', password='staffpass', role='staff')
+        self.project = Project.objects.create(name='Test Project', description='A project', owner=self.customer, version='1.0')
+
+    def create_requests(self, count):
+        for i in range(count):
+            request = Request.objects.create(subject='Request %d' % i, description='x', project=self.project, requester=self.customer)
+            request.status = Request.Status.RESOLVED if i % 2 else Request.Status.REJECTED
+            request.save()
+
+    def get(self):
+        self.client.force_login(self.staff_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('analytics'), {'days': 30})
+        return response, len(queries)
+
+    def test_reports_from_rollups_in_constant_queries(self):
+        self.create_requests(2)
+        response, few = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['overall']['opened'], 2)
+        self.assertEqual((response.context['companies'][0]['resolved'], response.context['companies'][0]['rejected']), (1, 1))
+        self.assertContains(response, 'Test Project')
+
+        self.create_requests(20)
+        response, many = self.get()
+        self.assertEqual(response.context['overall']['opened'], 22)
+        self.assertEqual(many, few)
+
+    def test_staff_only(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse('analytics')).status_code, 404)
+
+    def test_descriptions_are_cut_in_the_database(self):
+        plain = Request.objects.create(subject='Plain', description='p' * 500, project=self.project, requester=self.customer)
+        packed = Request.objects.create(subject='Packed', description='c' * 5000, project=self.project, requester=self.customer)
+        self.assertTrue(Request.objects.filter(pk=packed.pk, description__startswith=COMPRESSED_MARKER).exists())
+        self.client.force_login(self.customer)
+        for name in ('request_list', 'request_list_open'):
+            response = self.client.get(reverse(name))
+            rows = {request.pk: request for request in response.context['object_list']}
+            self.assertEqual(rows[plain.pk].description_preview, 'p' * 121)
+            self.assertEqual(rows[packed.pk].description_preview, 'c' * 5000)
+            self.assertIn('description', rows[plain.pk].get_deferred_fields())
+            self.assertContains(response, 'p' * 119 + '…')
+            self.assertNotContains(response, 'p' * 120)
+            self.assertNotContains(response, 'c' * 120)
+
+        response = self.client.get(reverse('project_list'))
+        self.assertIn('description', response.context['object_list'][0].get_deferred_fields())
+        self.assertContains(response, 'A project')
+
+
+class RequestBulkActionTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', address='1 Test St', contact_email='acme@test.com')
+        self.other_company = Company.objects.create(name='Globex', address='2 Test St', contact_email='globex@test.com')
+        self.staff = User.objects.create_superuser(username='staff', password='staffpass', email='staff@test.com', role='staff')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        other_owner = User.objects.create_user(username='other', password='otherpass', role='customer', company=self.other_company)
+        self.project = Project.objects.create(name='Portal', description='x', owner=self.customer, version='1.0')
+        self.other_project = Project.objects.create(name='Billing', description='x', owner=other_owner, version='1.0')
+        self.requests = [
+            Request.objects.create(subject=f'Request {i}', description='x', project=self.project, requester=self.customer)
+            for i in range(3)
+        ]
+        self.url = reverse('request_bulk_action')
+        self.client.force_login(self.staff)
+
+    def post(self, **data):
+        data.setdefault('requests', [r.pk for r in self.requests])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data, HTTP_ACCEPT='application/json')
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "requestLogger_request"')]
+        return response, updates
+
+    def test_status_change_is_one_update_with_history(self):
+        response, updates = self.post(action='status', status='Resolved')
+        self.assertEqual(response.json(), {'updated': 3})
+        self.assertEqual(len(updates), 1)
+        for request in Request.objects.filter(pk__in=[r.pk for r in self.requests]):
+            self.assertEqual(request.status, 'Resolved')
+            self.assertIsNotNone(request.date_completed)
+        events = RequestStatusEvent.objects.filter(from_status='New', to_status='Resolved')
+        self.assertEqual(events.count(), 3)
+        self.assertTrue(all(event.resolution_seconds is not None for event in events))
+        # Counters match a recount
+        incremental = CompanyStats.objects.values().get(pk=self.company.pk)
+        call_command('rebuild_company_stats', stdout=StringIO())
+        self.assertEqual(CompanyStats.objects.values().get(pk=self.company.pk), incremental)
+
+        # Reopening clears the completion date; unchanged rows are skipped
+        response, _ = self.post(action='status', status='New', requests=[self.requests[0].pk])
+        self.assertEqual(response.json(), {'updated': 1})
+        self.assertIsNone(Request.objects.get(pk=self.requests[0].pk).date_completed)
+        response, _ = self.post(action='status', status='New', requests=[self.requests[0].pk])
+        self.assertEqual(response.json(), {'updated': 0})
+
+    def test_move_to_project_respects_tenants(self):
+        response, updates = self.post(action='project', project=self.other_project.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(updates, [])
+
+        staff_request = Request.objects.create(subject='Staff', description='x', project=self.project, requester=self.staff)
+        response, updates = self.post(action='project', project=self.other_project.pk, requests=[staff_request.pk])
+        self.assertEqual(response.json(), {'updated': 1})
+        self.assertEqual(len(updates), 1)
+        staff_request.refresh_from_db()
+        self.assertEqual((staff_request.project, staff_request.company), (self.other_project, self.other_company))
+        self.assertEqual(CompanyStats.objects.get(pk=self.other_company.pk).new_count, 1)
+
+    def test_form_post_redirects_back_with_a_message(self):
+        next_url = reverse('request_list_open')
+        response = self.client.post(self.url, {'requests': [self.requests[0].pk], 'action': 'status', 'status': 'In Progress', 'next': next_url}, follow=True)
+        self.assertRedirects(response, next_url)
+        self.assertContains(response, 'Updated 1 request.')
+
+    def test_customers_cannot_use_it(self):
+        self.client.force_login(self.customer)
+        response = self.client.post(self.url, {'requests': [self.requests[0].pk], 'action': 'status', 'status': 'Resolved'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Request.objects.get(pk=self.requests[0].pk).status, 'New')
+
+    def test_admin_actions(self):
+        changelist = reverse('admin:requestLogger_request_changelist')
+        ids = [r.pk for r in self.requests]
+        self.client.post(changelist, {'action': 'mark_in_progress', '_selected_action': ids})
+        self.assertEqual(set(Request.objects.filter(pk__in=ids).values_list('status', flat=True)), {'In Progress'})
+        self.assertEqual(RequestStatusEvent.objects.filter(to_status='In Progress').count(), 3)
+
+        other = Project.objects.create(name='Portal 2', description='x', owner=self.customer, version='2.0')
+        self.client.post(changelist, {'action': 'move_to_project', '_selected_action': ids, 'project': other.pk})
+        self.assertEqual(set(Request.objects.filter(pk__in=ids).values_list('project', flat=True)), {other.pk})
+
+    def test_admin_changelists_skip_long_text(self):
+        Project.objects.filter(pk=self.project.pk).update(description='d' * 500)
+        response = self.client.get(reverse('admin:requestLogger_request_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Request 0')
+        self.assertIn('description', response.context['cl'].result_list[0].get_deferred_fields())
+        response = self.client.get(reverse('admin:requestLogger_project_changelist'))
+        self.assertContains(response, 'd' * 119 + '…')
+        self.assertNotContains(response, 'd' * 120)
+        Notification.objects.create(email='customer@test.com', request=self.requests[0], kind='status', message='Moved')
+        response = self.client.get(reverse('admin:requestLogger_notification_changelist'))
+        self.assertContains(response, 'for Portal by customer')
+        for name in ('archivedrequest', 'task'):
+            self.assertEqual(self.client.get(reverse(f'admin:requestLogger_{name}_changelist')).status_code, 200)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Acme', address='1 Test St', contact_email='acme@test.com')
+        other_company = Company.objects.create(name='Globex', address='2 Test St', contact_email='globex@test.com')
+        self.customer = User.objects.create_user(username='customer', password='customerpass', role='customer', company=self.company)
+        self.colleague = User.objects.create_user(username='colleague', password='colleaguepass', role='customer', company=self.company)
+        self.outsider = User.objects.create_user(username='outsider', password='outsiderpass', role='customer', company=other_company)
+        self.project = Project.objects.create(name='Portal', description='x', owner=self.customer, version='1.0')
+        self.other_project = Project.objects.create(name='Billing', description='x', owner=self.outsider, version='1.0')
+        self.request = Request.objects.create(subject='Polled', description='x', project=self.project, requester=self.customer)
+        self.client.force_login(self.customer)
+
+    def revalidate(self, url):
+        """Status of a GET of ``url`` sent with the validators of a first GET."""
+        self.client.get(url)  # the first page with a form sets the CSRF cookie, which is part of the ETag
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/'))
+        return lambda: self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code
+
+    def test_unchanged_request_page_is_not_rendered(self):
+        url = reverse('request_detail', args=[self.request.pk])
+        self.client.get(url)
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response.templates, [])
+        # Session, user and the one validator query
+        self.assertEqual(len(queries), 3)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_request_page_changes(self):
+        url = reverse('request_detail', args=[self.request.pk])
+        status = self.revalidate(url)
+        self.assertEqual(status(), 304)
+        Comment.objects.create(request=self.request, author=self.customer, text='New comment')
+        self.assertEqual(status(), 200)
+
+        status = self.revalidate(url)
+        self.request.description = 'Edited'
+        self.request.save()
+        self.assertEqual(status(), 200)
+
+        status = self.revalidate(url)
+        self.client.force_login(self.colleague)
+        self.assertEqual(status(), 200)
+
+    def test_project_page_follows_its_requests(self):
+        url = reverse('project_detail', args=[self.project.pk])
+        status = self.revalidate(url)
+        self.assertEqual(status(), 304)
+        self.request.status = Request.Status.IN_PROGRESS
+        self.request.save()
+        self.assertEqual(status(), 200)
+
+        status = self.revalidate(url)
+        self.request.delete()
+        self.assertEqual(status(), 200)
+
+    def test_list_state_is_per_tenant(self):
+        for name in ('request_list', 'request_list_open'):
+            status = self.revalidate(reverse(name))
+            self.assertEqual(status(), 304)
+            Request.objects.create(subject='Elsewhere', description='x', project=self.other_project, requester=self.outsider)
+            self.assertEqual(status(), 304)
+            Request.objects.create(subject='Here', description='x', project=self.project, requester=self.customer)
+            self.assertEqual(status(), 200)
+
+        status = self.revalidate(reverse('project_list'))
+        self.assertEqual(status(), 304)
+        self.project.version = '2.0'
+        self.project.save()
+        self.assertEqual(status(), 200)
+
+    def test_list_state_follows_the_database(self):
+        # Changes made by another worker leave nothing in this one's cache
+        url = reverse('request_list')
+        status = self.revalidate(url)
+        comment = Comment.objects.create(request=self.request, author=self.colleague, text='Elsewhere')
+        cache.clear()
+        self.assertEqual(status(), 200)
+
+        status = self.revalidate(url)
+        comment.delete()
+        cache.clear()
+        self.assertEqual(status(), 200)
+
+        status = self.revalidate(url)
+        Project.objects.filter(pk=self.project.pk).update(name='Renamed', last_updated=timezone.now())
+        self.assertEqual(status(), 200)
+
+        status = self.revalidate(url)
+        Request.objects.filter(pk=self.request.pk).delete()
+        cache.clear()
+        self.assertEqual(status(), 200)
+
+    def test_list_state_reads_only_the_page(self):
+        older = Request.objects.create(subject='Older', description='x', project=self.project, requester=self.customer)
+        Request.objects.filter(pk=older.pk).update(date_submitted=timezone.now() - timedelta(days=1))
+        url = reverse('request_list') + '?page_size=1'
+        status = self.revalidate(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(status(), 304)
+        self.assertNotIn('COUNT(', queries[-1]['sql'])
+        self.assertIn('LIMIT 2', queries[-1]['sql'])
+        # Changes to rows on later pages don't touch this one
+        Comment.objects.create(request=older, author=self.customer, text='Further down')
+        self.assertEqual(status(), 304)
+        Comment.objects.create(request=self.request, author=self.customer, text='On the page')
+        self.assertEqual(status(), 200)
+
+    def test_other_tenants_still_get_404(self):
+        self.client.force_login(self.outsider)
+        response = self.client.get(reverse('request_detail', args=[self.request.pk]), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
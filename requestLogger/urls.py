@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import ProjectListView, ProjectDetailView, ProjectUpdateView, ProjectDeleteView, IndexView, RequestListView, RequestDeleteView, RequestUpdateView, RequestDetailView, RequestCreateView, OpenRequestListView, ProjectCreateView
+from . import api
+from .views import ProjectListView, ProjectDetailView, ProjectUpdateView, ProjectDeleteView, IndexView, RequestListView, RequestDeleteView, RequestUpdateView, RequestDetailView, RequestCreateView, RequestBulkActionView, OpenRequestListView, RecentlyActiveRequestListView, ProjectCreateView, RequestSearchView, RequestExportView, comment_create, CommentPageView, MetricsView, AnalyticsView
 
 urlpatterns = [
     path('', IndexView.as_view(), name='home'),
@@ -10,8 +11,22 @@ urlpatterns = [
     path('project/<int:pk>/delete/', ProjectDeleteView.as_view(), name='project_delete'),
     path('request/', RequestListView.as_view(), name='request_list'),
     path('request/open', OpenRequestListView.as_view(), name='request_list_open'),
+    path('request/active', RecentlyActiveRequestListView.as_view(), name='request_list_active'),
+    path('request/bulk/', RequestBulkActionView.as_view(), name='request_bulk_action'),
     path('request/<int:pk>/', RequestDetailView.as_view(), name='request_detail'),
+    path('request/<int:pk>/comments/', comment_create, name='comment_create'),
+    path('request/<int:pk>/comments/page/', CommentPageView.as_view(), name='comment_page'),
     path('request/<int:pk>/edit/', RequestUpdateView.as_view(), name='request_edit'),
     path('request/<int:pk>/delete/', RequestDeleteView.as_view(), name='request_delete'),
     path('request/new/', RequestCreateView.as_view(), name='request_create'),
+    path('request/search/', RequestSearchView.as_view(), name='request_search'),
+    path('request/export/', RequestExportView.as_view(), name='request_export'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('api/projects/', api.ProjectCollectionView.as_view(), name='api_project_list'),
+    path('api/projects/<int:pk>/', api.ProjectItemView.as_view(), name='api_project_detail'),
+    path('api/requests/', api.RequestCollectionView.as_view(), name='api_request_list'),
+    path('api/requests/<int:pk>/', api.RequestItemView.as_view(), name='api_request_detail'),
+    path('api/requests/<int:pk>/comments/', api.RequestCommentsView.as_view(), name='api_request_comments'),
+    path('api/comments/', api.CommentCollectionView.as_view(), name='api_comment_list'),
 ]
@@ -1,16 +1,43 @@
-from django.http import Http404, HttpResponseForbidden
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.shortcuts import render, redirect, get_list_or_404, get_object_or_404
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from .models import Project, Request, Comment
+from .models import Project, Request, Comment, CompanyStats, CompanyDailyRollup, ProjectDailyRollup
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .forms import RequestForm, ProjectForm, CommentForm
+from .forms import RequestForm, ProjectForm, CommentForm, RequestBulkActionForm
+from .pagination import KeysetPage, KeysetPaginationMixin
+from .tenancy import TenantScopedMixin, tenant_of
+from .routers import ReplicaReadMixin
+from .search import search_requests
+from .conditional import ConditionalGetMixin, latest
+from . import analytics, bulk, exports, metrics
+from .archive import find_request
+from .stats import rebuild_company_stats
+from .fields import text_preview
 from django.views import generic
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.conf import settings
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils import timezone
+from datetime import datetime, timedelta
 
 
 
-class IndexView(LoginRequiredMixin, generic.TemplateView):
+# Columns the list tables show. List views load only these, and a database-cut
+# description_preview in place of the description (see fields.text_preview)
+PROJECT_LIST_COLUMNS = ('name', 'owner', 'owner__username', 'created_at', 'last_updated', 'version', 'status')
+REQUEST_LIST_COLUMNS = ('request_type', 'status', 'date_submitted', 'last_updated', 'comment_count', 'last_activity_at',
+                        'project', 'project__name', 'project__last_updated', 'requester', 'requester__username')
+LIST_CONTEXT = {'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT, 'preview_chars': settings.LIST_PREVIEW_CHARS}
+
+
+class IndexView(LoginRequiredMixin, ReplicaReadMixin, generic.TemplateView):
     template_name = 'index.html'
 
     login_url = '/login/'  # URL to redirect to if the user is not logged in
@@ -19,22 +46,22 @@ class IndexView(LoginRequiredMixin, generic.TemplateView):
         context = super().get_context_data(**kwargs)
 
         user = self.request.user
-        user_company = user.company
-        
-        # Get the number of projects owned by the user's company
-        context['num_projects'] = Project.objects.filter(owner__company=user_company).count()
-
-        # Get the number of outstanding requests related to projects owned by the user's company
-        context['num_outstanding_requests'] = Request.objects.filter(
-            project__owner__company=user_company,
-            status='New'
-        ).count()
-
-        # Get the number of resolved requests related to projects owned by the user's company
-        context['num_resolved_requests'] = Request.objects.filter(
-            project__owner__company=user_company,
-            status='Resolved'
-        ).count()
+
+        # Counters are maintained per company by signals, so this is a single primary key lookup
+        stats = None
+        if user.company_id:
+            stats = CompanyStats.objects.filter(pk=user.company_id).first()
+            if stats is None:
+                rebuild_company_stats([user.company_id])
+                stats = CompanyStats.objects.filter(pk=user.company_id).first()
+        stats = stats or CompanyStats()
+
+        # Number of projects owned by the user's company
+        context['num_projects'] = stats.project_count
+
+        # Number of outstanding and resolved requests belonging to the user's company
+        context['num_outstanding_requests'] = stats.new_count
+        context['num_resolved_requests'] = stats.resolved_count
 
         # Add the current user to the context
         context['user'] = user
@@ -42,17 +69,43 @@ class IndexView(LoginRequiredMixin, generic.TemplateView):
         return context
 
 
-class ProjectListView(LoginRequiredMixin, ListView):
+class TenantListStateMixin:
+    """
+    Conditional GET state for a list view from the rows of the page being served and the
+    cursors around it, read on the same index as the page itself. Every worker answers from
+    the database, and a poll costs no more than the page query however long the list is.
+    """
+    list_kind = 'requests'
+    # Per row: its id, then the columns shown that can change (the times first)
+    state_fields = {
+        'projects': ('id', 'last_updated', 'owner__username'),
+        'requests': ('id', 'last_updated', 'last_activity_at', 'project__last_updated', 'comment_count',
+                     'requester__username'),
+    }
+
+    def get_conditional_state(self):
+        fields = self.state_fields[self.list_kind]
+        # values() keeps annotations such as description_preview out of the query
+        if isinstance(self, KeysetPaginationMixin):
+            page = self.get_keyset_page(self.get_queryset().values(*fields, *self.keyset_fields))
+            rows, cursors = list(page), [page.next_cursor, page.previous_cursor]
+        else:
+            # Unpaginated (the project list): the page is every row
+            rows, cursors = list(self.get_queryset().values(*fields).order_by('pk')), []
+        rows = [tuple(row[field] for field in fields) for row in rows]
+        times = [moment for row in rows for moment in row[1:] if isinstance(moment, datetime)]
+        # A row going missing on a delete changes the ids, or the cursors when it was off the page
+        return latest(*times), [rows, *cursors]
+
+
+class ProjectListView(LoginRequiredMixin, ReplicaReadMixin, TenantScopedMixin, TenantListStateMixin, ConditionalGetMixin, ListView):
     model = Project
     template_name = 'requestLogger/project_list.html'
     login_url = '/login/'  # URL to redirect to if the user is not logged in
-
-
-    def get_queryset(self):
-        user = self.request.user
-        if user.role == 'staff':
-            return Project.objects.all()
-        return Project.objects.filter(owner__company=user.company)
+    extra_context = LIST_CONTEXT
+    queryset = (Project.objects.select_related('owner').only(*PROJECT_LIST_COLUMNS)
+                .annotate(description_preview=text_preview(Project, 'description')))
+    list_kind = 'projects'
 
 class ProjectCreateView(LoginRequiredMixin, CreateView):
     model = Project
@@ -71,88 +124,188 @@ class ProjectCreateView(LoginRequiredMixin, CreateView):
     def get_absolute_url(self):
         return reverse('project_detail', kwargs={'pk': self.pk})
 
-class ProjectDetailView(LoginRequiredMixin, DetailView):
+class ProjectDetailView(LoginRequiredMixin, TenantScopedMixin, ConditionalGetMixin, DetailView):
     model = Project
     template_name = 'requestLogger/project_detail.html'
     login_url = '/login/'  # URL to redirect to if the user is not logged in
+    queryset = Project.objects.select_related('owner')
+
+    def get_conditional_state(self):
+        row = (Project.objects.visible_to(self.tenant).filter(pk=self.kwargs['pk'])
+               .annotate(requests_updated=Max('requests__last_updated'), request_count=Count('requests'))
+               .values_list('last_updated', 'requests_updated', 'request_count').first())
+        if row is None:
+            return None
+        # The request count drops when one of the requests is deleted
+        return latest(row[0], row[1]), list(row)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['requests'] = Request.objects.filter(project=self.object)
+        # Only the columns the table shows; descriptions can be long and compressed (fields.py)
+        context['requests'] = Request.objects.filter(project=self.object).only(
+            'subject', 'request_type', 'status', 'date_submitted', 'last_updated')
         return context
 
-    def get_object(self):
-        obj = super().get_object()
-        user = self.request.user
-        if user.role == 'staff' or obj.owner.company == user.company:
-            return obj
-        else:
-            return get_object_or_404(Project, id=-1)  # Raises 404 as this user does not belong to the same organisation as the request
-
 
-class ProjectUpdateView(LoginRequiredMixin, UpdateView):
+class ProjectUpdateView(LoginRequiredMixin, TenantScopedMixin, UpdateView):
     model = Project
     form_class = ProjectForm
     template_name = 'requestLogger/project_form.html'
     login_url = '/login/'  # URL to redirect to if the user is not logged in
 
     def form_valid(self, form):
-        user = self.request.user
-        if not user.role == 'staff':
+        if not self.tenant.is_staff:
             raise Http404("You don't have permission to edit this project.")
         return super().form_valid(form)
 
 
-class ProjectDeleteView(LoginRequiredMixin, DeleteView):
+class ProjectDeleteView(LoginRequiredMixin, TenantScopedMixin, DeleteView):
     model = Project
     template_name = 'requestLogger/project_delete.html'
     success_url = reverse_lazy('project_list')
     login_url = '/login/'  # URL to redirect to if the user is not logged in
 
-    def get_object(self):
-        obj = super().get_object()
-        user = self.request.user
-        if user.role == 'staff' or obj.requester == user:
-            return obj
-        else:
-            return get_object_or_404(Project, id=-1)  # Will always raise Http404
-        
+    def get_queryset(self):
+        # Staff can delete any project; customers only the ones they own
+        queryset = super().get_queryset()
+        if self.tenant.is_staff:
+            return queryset
+        return queryset.filter(owner=self.tenant.user_id)
+
 
-class RequestDetailView(LoginRequiredMixin, DetailView):
+class RequestDetailView(LoginRequiredMixin, TenantScopedMixin, ConditionalGetMixin, DetailView):
     model = Request
     template_name = 'requestLogger/request_detail.html'
     login_url = '/login/'  # URL to redirect to if the user is not logged in
 
+    queryset = Request.objects.select_related('project', 'requester')
+
+    def get_conditional_state(self):
+        row = (Request.objects.visible_to(self.tenant).filter(pk=self.kwargs['pk'])
+               .values_list('last_updated', 'project__last_updated', 'last_activity_at', 'comment_count').first())
+        if row is None:
+            return None
+        # The comment count also moves when a comment is deleted
+        return latest(*row[:3]), list(row)
+
+    def get_object(self, queryset=None):
+        # Archived requests are shown read-only from the archive tables (archive.py)
+        return find_request(self.tenant, self.kwargs['pk'], self.queryset)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['comment_form'] = CommentForm()
-        context['comments'] = Comment.objects.filter(request=self.object).order_by('-created_date')
+        # ?after= shows older comments when scripts are off; otherwise they load via CommentPageView
+        context.update(comment_thread_context(self.object, self.request.GET.get('after')))
         return context
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
+        if self.object.is_archived:
+            raise Http404("Archived requests can't be commented on.")
         form = CommentForm(request.POST)
         if form.is_valid():
             comment = form.save(commit=False)
             comment.request = self.object
             comment.author = request.user
-            # Check if the logged in user is a staff member or belongs to the same organisation as the request
-            if (not self.request.user.role == 'staff') and self.request.user.company != self.object.requester.company:
-                return HttpResponseForbidden("You don't have permission to comment on this request.")
-            comment.save()
-            return self.get(self, request, *args, **kwargs)  # redirects back to the detail view
+            with transaction.atomic():
+                comment.save()
+            return redirect(self.object)  # Post/Redirect/Get, so a refresh doesn't resubmit the comment
 
         context = self.get_context_data(**kwargs)
         context['comment_form'] = form
         return render(request, self.template_name, context)
-    
-    def get_object(self):
-        obj = super().get_object()
-        user = self.request.user
-        if user.role == 'staff' or obj.requester.company == user.company:
-            return obj
-        else:
-            return get_object_or_404(Project, id=-1)  # Will always raise Http404
+
+
+def comment_thread_context(request_obj, after=None):
+    """
+    Template context for one page of a request's comments, newest first. The page is
+    only queried when its cached fragment is missing or stale, with the authors joined in.
+    Fragments are keyed on the request's comment_count and last_activity_at, which every
+    comment insert and delete changes in the database, so all workers see a new thread.
+    """
+    comments = request_obj.comments.select_related('author')
+    return {
+        'thread_request': request_obj,
+        'comment_page': KeysetPage(comments, ('created_date', 'id'), settings.COMMENT_PAGE_SIZE, after=after),
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    }
+
+
+class CommentPageView(LoginRequiredMixin, generic.TemplateView):
+    """An older page of a request's comment thread, as an HTML fragment for the request page."""
+    template_name = 'requestLogger/comment_page.html'
+    login_url = '/login/'  # URL to redirect to if the user is not logged in
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        request_obj = find_request(tenant_of(self.request), self.kwargs['pk'], Request.objects.only('date_submitted', 'comment_count', 'last_activity_at'))
+        context.update(comment_thread_context(request_obj, self.request.GET.get('after')))
+        return context
+
+
+def save_comment(request, pk, data=None):
+    """
+    Validate and insert a comment on request ``pk`` from ``data`` (the POST by default);
+    returns ``(comment, form)``.
+
+    Only the request's company is loaded, to check it against the user's, so a successful
+    post costs one SELECT, one INSERT and one UPDATE of the request's comment count and last
+    activity (stats.count_comment), plus the rows for its queued tasks.
+    """
+    user = request.user
+    request_obj = Request.objects.filter(pk=pk).visible_to(tenant_of(request)).only('company').first()
+    if request_obj is None:
+        raise Http404("No request found matching the query")
+
+    form = CommentForm(request.POST if data is None else data)
+    if not form.is_valid():
+        return None, form
+    comment = form.save(commit=False)
+    comment.request = request_obj
+    comment.author = user
+    # Together with the tasks queued by its post_save signals
+    with transaction.atomic():
+        comment.save()
+    return comment, form
+
+
+async def comment_create(request, pk):
+    """
+    Comment endpoint for the request detail page; runs natively under ASGI (changeManager.asgi).
+
+    Script clients get the new comment back (JSON when they accept it, otherwise an HTML
+    fragment); plain form posts are redirected back to the request.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return redirect_to_login(request.get_full_path(), '/login/')
+
+    comment, form = await sync_to_async(save_comment)(request, pk)
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    is_script = wants_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+    if comment is None:
+        if wants_json:
+            return JsonResponse({'errors': form.errors}, status=400)
+        if is_script:
+            return HttpResponse(form.errors.as_ul(), status=400)
+        return redirect('request_detail', pk=pk)
+
+    if wants_json:
+        return JsonResponse({
+            'id': comment.pk,
+            'author': str(comment.author),
+            'text': comment.text,
+            'created_date': comment.created_date.isoformat(),
+            'html': render_to_string('requestLogger/comment.html', {'comment': comment}),
+        }, status=201)
+    if is_script:
+        html = render_to_string('requestLogger/comment.html', {'comment': comment})
+        return HttpResponse(html, status=201)
+    return redirect('request_detail', pk=pk)
 
 
 class RequestCreateView(LoginRequiredMixin, CreateView):
@@ -163,7 +316,9 @@ class RequestCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.requester = self.request.user
-        return super().form_valid(form)
+        # The request and the tasks its signals queue are committed together
+        with transaction.atomic():
+            return super().form_valid(form)
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -173,7 +328,7 @@ class RequestCreateView(LoginRequiredMixin, CreateView):
     def get_absolute_url(self):
         return reverse('request_detail', kwargs={'pk': self.pk})
 
-class RequestUpdateView(LoginRequiredMixin, UpdateView):
+class RequestUpdateView(LoginRequiredMixin, TenantScopedMixin, UpdateView):
     model = Request
     form_class = RequestForm
     template_name = 'requestLogger/request_form.html'
@@ -185,51 +340,178 @@ class RequestUpdateView(LoginRequiredMixin, UpdateView):
         return kwargs
 
     def form_valid(self, form):
-        if form.instance.requester.company != self.request.user.company and not self.request.user.role == 'staff':
-            raise Http404("You don't have permission to edit this request.")
-        return super().form_valid(form)
+        with transaction.atomic():
+            return super().form_valid(form)
 
     def get_absolute_url(self):
         return reverse('request_detail', kwargs={'pk': self.pk})
     
 
-class RequestDeleteView(LoginRequiredMixin, DeleteView):
+class RequestDeleteView(LoginRequiredMixin, TenantScopedMixin, DeleteView):
     model = Request
     template_name = 'requestLogger/request_delete.html'
     success_url = reverse_lazy('request_list')
     login_url = '/login/'  # URL to redirect to if the user is not logged in
 
-    def get_object(self):
-        obj = super().get_object()
-        user = self.request.user
-        if user.role == 'staff' or obj.requester.company == user.company:
-            return obj
-        else:
-            return get_object_or_404(Request, id=-1)  # Raises 404 as this user does not belong to the same organisation as the request
 
+class RequestBulkActionView(LoginRequiredMixin, generic.FormView):
+    """
+    Staff triage: change the status of, or move to another project, every request ticked
+    on a request list, in one UPDATE (see bulk.py). Redirects back to ``next``; script
+    clients asking for JSON get ``{"updated": n}`` or the form errors.
+    """
+    form_class = RequestBulkActionForm
+    http_method_names = ['post']
+    login_url = '/login/'  # URL to redirect to if the user is not logged in
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated and not tenant_of(request).is_staff:
+            raise Http404("You don't have permission to change requests in bulk.")
+        return super().dispatch(request, *args, **kwargs)
 
-class RequestListView(LoginRequiredMixin, ListView):
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs.update({'user': self.request.user})
+        return kwargs
+
+    def get_success_url(self):
+        url = self.request.POST.get('next')
+        if url and url_has_allowed_host_and_scheme(url, allowed_hosts={self.request.get_host()}):
+            return url
+        return reverse('request_list')
+
+    def wants_json(self):
+        return 'application/json' in self.request.headers.get('Accept', '')
+
+    def form_valid(self, form):
+        requests = form.cleaned_data['requests']
+        try:
+            if form.cleaned_data['action'] == 'status':
+                updated = bulk.change_status(requests, form.cleaned_data['status'])
+            else:
+                updated = bulk.move_to_project(requests, form.cleaned_data['project'])
+        except ValidationError as e:
+            form.add_error(None, e)
+            return self.form_invalid(form)
+        if self.wants_json():
+            return JsonResponse({'updated': updated})
+        messages.success(self.request, f'Updated {updated} request{"s" if updated != 1 else ""}.')
+        return redirect(self.get_success_url())
+
+    def form_invalid(self, form):
+        if self.wants_json():
+            return JsonResponse({'errors': form.errors}, status=400)
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(self.request, error)
+        return redirect(self.get_success_url())
+
+
+class RequestListView(LoginRequiredMixin, ReplicaReadMixin, TenantScopedMixin, TenantListStateMixin, ConditionalGetMixin, KeysetPaginationMixin, ListView):
     model = Request
     template_name = 'requestLogger/request_list.html'
     login_url = '/login/'  # URL to redirect to if the user is not logged in
+    extra_context = {**LIST_CONTEXT, 'statuses': Request.Status.choices}
+    queryset = (Request.objects.select_related('project', 'requester').only(*REQUEST_LIST_COLUMNS)
+                .annotate(description_preview=text_preview(Request, 'description')))
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.role == 'staff':
-            return Request.objects.all()
-        return Request.objects.filter(requester__company=user.company)
+class OpenRequestListView(LoginRequiredMixin, ReplicaReadMixin, TenantScopedMixin, TenantListStateMixin, ConditionalGetMixin, KeysetPaginationMixin, ListView):
+    model = Request
+    template_name = 'requestLogger/request_list.html'
+    login_url = '/login/'  # URL to redirect to if the user is not logged in
+    extra_context = {**LIST_CONTEXT, 'statuses': Request.Status.choices}
+    queryset = RequestListView.queryset.filter(status__in=Request.OPEN_STATUSES)
 
-class OpenRequestListView(LoginRequiredMixin, ListView):
+class RecentlyActiveRequestListView(LoginRequiredMixin, ReplicaReadMixin, TenantScopedMixin, TenantListStateMixin, ConditionalGetMixin, KeysetPaginationMixin, ListView):
     model = Request
     template_name = 'requestLogger/request_list.html'
     login_url = '/login/'  # URL to redirect to if the user is not logged in
+    extra_context = {**LIST_CONTEXT, 'statuses': Request.Status.choices, 'list_title': 'Recently Active Requests'}
+    queryset = RequestListView.queryset
+    # Walks request_company_activity_idx (request_activity_id_idx for staff); no comment aggregates
+    keyset_fields = ('last_activity_at', 'id')
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'staff':
-            return Request.objects.filter(Q(status='New') | Q(status='In Progress'))
-        
-        return Request.objects.filter(requester__company=user.company and Q(status='New') | Q(status='In Progress'))
+        since = timezone.now() - timedelta(days=settings.RECENT_ACTIVITY_DAYS)
+        return super().get_queryset().filter(last_activity_at__gte=since)
+
+
+class RequestSearchView(LoginRequiredMixin, ReplicaReadMixin, ListView):
+    model = Request
+    template_name = 'requestLogger/request_search.html'
+    login_url = '/login/'  # URL to redirect to if the user is not logged in
+
+    def get_paginate_by(self, queryset):
+        return settings.LIST_PAGE_SIZE
+
+    def get_queryset(self):
+        # Ranked by relevance and limited to the user's company (staff see everything)
+        return search_requests(self.request.GET.get('q', ''), tenant_of(self.request))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        return context
+
+
+class RequestExportView(LoginRequiredMixin, ReplicaReadMixin, generic.View):
+    login_url = '/login/'  # URL to redirect to if the user is not logged in
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in exports.FORMATS:
+            raise Http404('Unknown export format.')
+        queryset = exports.export_queryset(tenant_of(request), open_only=bool(request.GET.get('open')))
+        # Streamed after the view returns, so the database is chosen here rather than by the router
+        queryset = queryset.using(self.read_alias)
+        response = StreamingHttpResponse(exports.export_lines(queryset, fmt), content_type=exports.FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="requests.{fmt}"'
+        return response
+
+
+class MetricsView(LoginRequiredMixin, generic.View):
+    login_url = '/login/'  # URL to redirect to if the user is not logged in
+
+    def get(self, request, *args, **kwargs):
+        if not tenant_of(request).is_staff:
+            raise Http404("You don't have permission to view metrics.")
+        return JsonResponse(metrics.summary())
+
+
+class AnalyticsView(LoginRequiredMixin, ReplicaReadMixin, generic.TemplateView):
+    template_name = 'requestLogger/analytics.html'
+    login_url = '/login/'  # URL to redirect to if the user is not logged in
+    default_days = 90
+    max_days = 3660
+    top_projects = 25
+
+    def get(self, request, *args, **kwargs):
+        if not tenant_of(request).is_staff:
+            raise Http404("You don't have permission to view analytics.")
+        return super().get(request, *args, **kwargs)
+
+    def get_days(self):
+        try:
+            days = int(self.request.GET.get('days', self.default_days))
+        except ValueError:
+            days = self.default_days
+        return min(max(days, 1), self.max_days)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Reads only the daily rollups: at most one row per day and company or project
+        days = self.get_days()
+        start = timezone.localdate() - timedelta(days=days - 1)
+        companies = analytics.report(CompanyDailyRollup.objects.filter(day__gte=start), 'company')
+        context.update({
+            'days': days,
+            'start': start,
+            'sla_hours': settings.REQUEST_SLA_HOURS,
+            'overall': analytics.overall(companies),
+            'companies': companies,
+            'projects': analytics.report(ProjectDailyRollup.objects.filter(day__gte=start), 'project')[:self.top_projects],
+        })
+        return context
 
 
 class CommentCreateView(LoginRequiredMixin, CreateView):
@@ -240,11 +522,6 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.author = self.request.user
-        request = get_object_or_404(Request, id=self.kwargs['request_id'])
-
-        # Check if the logged in user is a staff member or belongs to the same organisation as the request
-        if not self.request.user.role == 'staff' and self.request.user.company != request.requester.company:
-            return HttpResponseForbidden("You don't have permission to comment on this request.")
-
-        form.instance.request = request
+        # Only requests the user's company can see are found at all
+        form.instance.request = get_object_or_404(Request.objects.visible_to(tenant_of(self.request)), id=self.kwargs['request_id'])
         return super().form_valid(form)
\ No newline at end of file